@@ -0,0 +1,78 @@
+"""
+Compares the memory held by the price records with the previous layout,
+a regular object with a datetime, a Decimal and two strings.
+
+Usage:
+    python benchmarks/bench_memory.py [--records 1000000] [--symbols 250]
+"""
+
+import argparse
+import random
+import sys
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from alens.pricedl.price_flat_file import _parse_line  # noqa: E402
+
+
+class LegacyPriceRecord:
+    """The record layout before the compact representation."""
+
+    def __init__(self, datetime_val, symbol, value, currency):
+        self.datetime = datetime_val
+        self.symbol = symbol
+        self.value = value
+        self.currency = currency
+
+
+def generate(records: int, symbols: int):
+    """Yields the fields of the synthetic price lines."""
+    names = [f"SYM{i:04d}" for i in range(symbols)]
+    start = date(2000, 1, 1)
+    rnd = random.Random(42)
+    for i in range(records):
+        day = start + timedelta(days=i // symbols)
+        yield day.isoformat(), names[i % symbols], str(rnd.randint(100, 100_000) / 100)
+
+
+def measure(build, lines) -> int:
+    """The bytes still allocated after building the records."""
+    tracemalloc.start()
+    records = [build(*fields) for fields in lines]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--symbols", type=int, default=250)
+    args = parser.parse_args()
+
+    lines = list(generate(args.records, args.symbols))
+
+    legacy = measure(
+        lambda day, symbol, value: LegacyPriceRecord(
+            datetime.fromisoformat(day), symbol, Decimal(value), "EUR"
+        ),
+        lines,
+    )
+    compact = measure(
+        lambda day, symbol, value: _parse_line(f"P {day} {symbol} {value} EUR"),
+        lines,
+    )
+
+    print(f"records: {args.records:,}")
+    print(f"legacy:  {legacy / 1e6:,.1f} MB ({legacy / args.records:.0f} B/record)")
+    print(f"compact: {compact / 1e6:,.1f} MB ({compact / args.records:.0f} B/record)")
+    print(f"saving:  {1 - compact / legacy:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Measures the throughput of loading a price file.
+Generates a synthetic file in Ledger format and times `PriceFlatFile.load`.
+
+Usage:
+    python benchmarks/bench_parse.py [--lines 1000000] [--symbols 250]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from alens.pricedl.price_flat_file import PriceFlatFile  # noqa: E402
+
+
+def generate(path: Path, lines: int, symbols: int):
+    """Writes `lines` price lines, one per symbol per day."""
+    names = [f"SYM{i:04d}" for i in range(symbols)]
+    start = date(2000, 1, 1)
+    rnd = random.Random(42)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            day = start + timedelta(days=i // symbols)
+            price = rnd.randint(100, 100_000) / 100
+            f.write(f"P {day.isoformat()} {names[i % symbols]} {price} EUR\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--symbols", type=int, default=250)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "prices.txt"
+        generate(path, args.lines, args.symbols)
+        size_mb = path.stat().st_size / 1_000_000
+
+        started = time.perf_counter()
+        prices = PriceFlatFile.load(path)
+        elapsed = time.perf_counter() - started
+
+    print(f"lines:      {args.lines:,} ({size_mb:.1f} MB)")
+    print(f"records:    {len(prices.history):,}")
+    print(f"elapsed:    {elapsed:.2f} s")
+    print(f"throughput: {args.lines / elapsed:,.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main()
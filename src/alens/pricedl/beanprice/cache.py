@@ -0,0 +1,166 @@
+"""
+Shared state for the bean-price sources.
+
+bean-price calls the sources from a thread pool, one date and ticker at a time.
+The sources share, per process:
+- one downloader per provider, with a pooled HTTP session and rate limiter,
+- a cache of the downloaded values. Concurrent requests for the same value wait
+  for the one download in flight instead of starting their own.
+
+The full series of a ticker is downloaded on the first historical request and
+kept for the rest of the process, so that the other dates are looked up without
+another download. The latest prices are kept for a short time only.
+"""
+
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Callable, Dict, Generic, Hashable, List, Tuple, TypeVar
+
+from beanprice import source
+
+from alens.pricedl.model import Price
+from alens.pricedl.quote import Downloader, DownloaderRegistry
+
+# Seconds for which a latest price is reused.
+LATEST_TTL = 300.0
+
+T = TypeVar("T")
+
+_registry: DownloaderRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_downloader(updater: str) -> Downloader:
+    """The downloader for the updater, shared by all the sources and threads."""
+    global _registry
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = DownloaderRegistry()
+        registry = _registry
+    return registry.get(updater)
+
+
+def to_source_price(price: Price) -> source.SourcePrice:
+    """The price for bean-price, at midnight local time on the price date."""
+    time_val = datetime.combine(price.date, datetime.min.time())
+    # The datetime must be timezone aware.
+    return source.SourcePrice(price.value, time_val.astimezone(), price.currency)
+
+
+class _Flight:
+    """A load in progress, awaited by the other requests for the same key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: BaseException | None = None
+
+
+class SharedCache(Generic[T]):
+    """
+    Thread-safe cache of loaded values, optionally expiring after `ttl` seconds.
+    Only one load runs per key at a time. Failed loads are not cached.
+    """
+
+    def __init__(
+        self, ttl: float | None = None, clock: Callable[[], float] = time.monotonic
+    ):
+        self.ttl = ttl
+        self._clock = clock
+        # key -> (expiry or None, value)
+        self._values: Dict[Hashable, Tuple[float | None, T]] = {}
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, load: Callable[[], T]) -> T:
+        """The value for the key, loaded with `load` if missing or expired."""
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > self._clock()):
+                return entry[1]
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = load()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            flight.value = value
+            expiry = self._clock() + self.ttl if self.ttl is not None else None
+            with self._lock:
+                self._values[key] = (expiry, value)
+            return value
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def clear(self):
+        """Drops the cached values."""
+        with self._lock:
+            self._values.clear()
+
+
+class SeriesCache:
+    """The daily price series per ticker, downloaded once."""
+
+    def __init__(self):
+        self._cache: SharedCache[Tuple[List[date], List[source.SourcePrice]]] = (
+            SharedCache()
+        )
+
+    def get(
+        self, ticker: str, download: Callable[[], List[Price]]
+    ) -> Tuple[List[date], List[source.SourcePrice]]:
+        """
+        The dates and prices of the ticker, sorted by date. The series is
+        downloaded with `download` on the first call for the ticker.
+        """
+
+        def load():
+            prices = sorted(download(), key=lambda price: price.date)
+            return (
+                [price.date for price in prices],
+                [to_source_price(price) for price in prices],
+            )
+
+        return self._cache.get(ticker, load)
+
+    def as_of(
+        self, ticker: str, time_val: datetime, download: Callable[[], List[Price]]
+    ) -> source.SourcePrice | None:
+        """The latest price on or before the date of `time_val`."""
+        dates, prices = self.get(ticker, download)
+        index = bisect_right(dates, time_val.date())
+        return prices[index - 1] if index else None
+
+    def between(
+        self,
+        ticker: str,
+        time_begin: datetime,
+        time_end: datetime,
+        download: Callable[[], List[Price]],
+    ) -> List[source.SourcePrice]:
+        """The prices from the date of `time_begin` to the date of `time_end`."""
+        dates, prices = self.get(ticker, download)
+        start = bisect_left(dates, time_begin.date())
+        end = bisect_right(dates, time_end.date())
+        return prices[start:end]
+
+    def clear(self):
+        """Drops the cached series."""
+        self._cache.clear()
@@ -0,0 +1,182 @@
+"""
+Bean-price-compatible price source that reads the local price file first.
+
+The ticker is the symbol from the symbols list, with the namespace. The price
+is looked up in the price file through its index, and downloaded with the
+symbol's updater (Yahoo Finance or Vanguard AU) only when the file has no
+current price.
+
+Use:
+
+    bean-price -e "AUD:alens.pricedl.beanprice.local/ASX:VHY"
+"""
+
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+from beanprice import source
+from loguru import logger
+
+from alens.pricedl.beanprice import vanguard_au_detail, yahoo
+from alens.pricedl.beanprice.cache import SharedCache
+from alens.pricedl.direct_dl import (
+    get_download_symbol,
+    get_ledger_symbol,
+    get_paths,
+    load_symbols,
+)
+from alens.pricedl.model import SymbolMetadata
+from alens.pricedl.price_flat_file import PriceRecord
+from alens.pricedl.price_index import PriceIndex, end_of_day
+from alens.pricedl.trading_calendar import (
+    get_market,
+    has_session_since,
+    last_session,
+    market_today,
+)
+
+# The network sources per updater.
+FALLBACK_SOURCES = {
+    "yahoo_finance": yahoo,
+    "vanguard_au": vanguard_au_detail,
+}
+
+# The paths and the symbols list, read once per process.
+_setup_cache: SharedCache[Tuple[Path, Dict[str, SymbolMetadata]]] = SharedCache()
+# The price file index, for the current state of the file.
+_index: Tuple[Tuple[Path, int, int], PriceIndex] | None = None
+_index_lock = threading.Lock()
+
+
+def _load_setup() -> Tuple[Path, Dict[str, SymbolMetadata]]:
+    symbols_path, prices_path = get_paths()
+    securities = {
+        f"{sec.namespace or ''}:{sec.symbol}".upper(): sec
+        for sec in load_symbols(symbols_path)
+    }
+    return prices_path, securities
+
+
+def _get_index(prices_path: Path) -> PriceIndex:
+    """The index of the price file. Replaced when the file changes."""
+    global _index
+
+    stat = prices_path.stat()
+    key = (prices_path, stat.st_mtime_ns, stat.st_size)
+    with _index_lock:
+        if _index is None or _index[0] != key:
+            _index = (key, PriceIndex.open(prices_path))
+        return _index[1]
+
+
+def find_security(ticker: str) -> SymbolMetadata | None:
+    """The security in the symbols list for the ticker, i.e. "ASX:VHY"."""
+    _, securities = _setup_cache.get("setup", _load_setup)
+    key = ticker.upper() if ":" in ticker else f":{ticker}".upper()
+    return securities.get(key)
+
+
+def is_current(record: PriceRecord, sec: SymbolMetadata, on: date) -> bool:
+    """
+    Whether the stored price is the price for the day: there was no trading
+    session after it, up to the day. Without a calendar, the date must match.
+    """
+    price_date = record.datetime.date()
+    market = get_market(sec.namespace)
+    if market is None:
+        return price_date == on
+    return not has_session_since(market, price_date, on)
+
+
+def _to_source_price(record: PriceRecord) -> source.SourcePrice:
+    # The datetime must be timezone aware.
+    return source.SourcePrice(
+        record.value, record.datetime.astimezone(), record.currency
+    )
+
+
+def _fallback(sec: SymbolMetadata) -> Tuple[source.Source, str] | None:
+    """The network source and its ticker for the security."""
+    module = FALLBACK_SOURCES.get((sec.updater or "").lower())
+    if module is None:
+        return None
+    symbol = get_download_symbol(sec)
+    ticker = str(symbol) if module is yahoo else symbol.mnemonic
+    return module.Source(), ticker
+
+
+class Source(source.Source):
+    """
+    Local-first price source.
+    ticker: NAMESPACE:SYMBOL, as in the symbols list
+    """
+
+    def get_latest_price(self, ticker) -> source.SourcePrice | None:
+        '''
+        The latest price from the price file, if it is current, or else
+        downloaded.
+        '''
+        return self._get_price(
+            ticker,
+            None,
+            lambda network_source, network_ticker: network_source.get_latest_price(
+                network_ticker
+            ),
+        )
+
+    def get_historical_price(
+        self, ticker: str, time: datetime
+    ) -> source.SourcePrice | None:
+        '''
+        The price on the date from the price file, or else downloaded.
+        '''
+        return self._get_price(
+            ticker,
+            time.date(),
+            lambda network_source, network_ticker: (
+                network_source.get_historical_price(network_ticker, time)
+            ),
+        )
+
+    def _get_price(
+        self,
+        ticker: str,
+        on: date | None,
+        download: Callable[[source.Source, str], source.SourcePrice | None],
+    ) -> source.SourcePrice | None:
+        """
+        The stored price for the day (default: the latest session), or else the
+        price from the network source of the security.
+        """
+        try:
+            sec = find_security(ticker)
+            if sec is None:
+                logger.warning(f"{ticker} is not in the symbols list")
+                return None
+
+            if on is None:
+                market = get_market(sec.namespace)
+                on = (
+                    last_session(market, market_today(market))
+                    if market
+                    else date.today()
+                )
+
+            prices_path, _ = _setup_cache.get("setup", _load_setup)
+            record = _get_index(prices_path).as_of(
+                get_ledger_symbol(sec), end_of_day(on)
+            )
+            if record is not None and is_current(record, sec, on):
+                return _to_source_price(record)
+
+            fallback = _fallback(sec)
+            if fallback is None:
+                logger.debug(f"No current price for {ticker} in {prices_path}")
+                return None
+            logger.debug(f"No current price for {ticker}, downloading")
+            return download(*fallback)
+        except Exception as e:
+            logger.error(e)
+            return None
@@ -6,14 +6,40 @@ Use:
     bean-price -e "AUD:pricedl.beanprice.vanguard_au_detail/HY"
 """
 
-from datetime import datetime
+from datetime import date, datetime
+from typing import List
 
 # type: ignore
 from beanprice import source
 from loguru import logger
 
-from alens.pricedl.model import SecuritySymbol
-from alens.pricedl.quotes.vanguard_au_2023_detail import VanguardAu3Downloader
+from alens.pricedl.beanprice.cache import (
+    LATEST_TTL,
+    SeriesCache,
+    SharedCache,
+    get_downloader,
+    to_source_price,
+)
+from alens.pricedl.model import Price, SecuritySymbol
+
+# The daily series per ticker, downloaded once per process.
+_series_cache = SeriesCache()
+# The latest price per ticker, reused for a short time.
+_latest_cache: SharedCache[source.SourcePrice] = SharedCache(ttl=LATEST_TTL)
+
+
+def download_series(ticker: str) -> List[Price]:
+    """Downloads all the fund prices in one request (limit=-1)."""
+    sec_symbol = SecuritySymbol("VANGUARD", ticker)
+    return get_downloader("vanguard_au").download_history(
+        sec_symbol, "", date.min, date.max
+    )
+
+
+def download_latest(ticker: str) -> source.SourcePrice:
+    """Downloads the latest price with the shared downloader."""
+    sec_symbol = SecuritySymbol("VANGUARD", ticker)
+    return to_source_price(get_downloader("vanguard_au").download(sec_symbol, ""))
 
 
 class Source(source.Source):
@@ -27,30 +53,32 @@ class Source(source.Source):
         Downloads the latest price for the ticker.
         '''
         try:
-            symbol = ticker
-
-            sec_symbol = SecuritySymbol("VANGUARD", symbol)
-            v_price = VanguardAu3Downloader().download(sec_symbol, "")
-
-            price = v_price.value
-
-            min_time = datetime.min.time()
-            time = datetime.combine(v_price.date, min_time)
-            # The datetime must be timezone aware.
-            time = time.astimezone()
-
-            quote_currency = v_price.currency
-
-            return source.SourcePrice(price, time, quote_currency)
+            return _latest_cache.get(ticker, lambda: download_latest(ticker))
         except Exception as e:
             logger.error(e)
             return None
 
     def get_historical_price(self, ticker: str, time: datetime) -> source.SourcePrice | None:
         '''
-        Downloads the historical price for the ticker.
+        The latest price on or before the date. The series of the ticker is
+        downloaded on the first call.
         '''
-        # todo: return VanguardAu3Downloader().get_historical_price(ticker, time)
-        return None
+        try:
+            return _series_cache.as_of(ticker, time, lambda: download_series(ticker))
+        except Exception as e:
+            logger.error(e)
+            return None
 
-    # def get_prices_series
+    def get_prices_series(
+        self, ticker: str, time_begin: datetime, time_end: datetime
+    ) -> List[source.SourcePrice] | None:
+        '''
+        The daily prices between the dates, inclusive.
+        '''
+        try:
+            return _series_cache.between(
+                ticker, time_begin, time_end, lambda: download_series(ticker)
+            )
+        except Exception as e:
+            logger.error(e)
+            return None
@@ -6,13 +6,54 @@ Use:
     bean-price -e "AUD:pricedl.beanprice.yahoo/ASX:VHY"
 """
 
-from datetime import datetime
+from datetime import date, datetime
+from typing import List
 
 from beanprice import source
 from loguru import logger
 
-from alens.pricedl.model import SecuritySymbol
-from alens.pricedl.quotes.yahoo_finance_downloader import YahooFinanceDownloader
+from alens.pricedl.beanprice.cache import (
+    LATEST_TTL,
+    SeriesCache,
+    SharedCache,
+    get_downloader,
+    to_source_price,
+)
+from alens.pricedl.model import Price, SecuritySymbol
+
+# The first date of the downloaded series.
+HISTORY_START = date(1970, 1, 1)
+
+# The daily series per ticker, downloaded once per process.
+_series_cache = SeriesCache()
+# The latest price per ticker, reused for a short time.
+_latest_cache: SharedCache[source.SourcePrice] = SharedCache(ttl=LATEST_TTL)
+
+
+def parse_ticker(ticker: str) -> SecuritySymbol | None:
+    """The symbol for the ticker, i.e. "ASX:VHY" or "ANGL"."""
+    symbol = ticker.split(':')
+
+    if len(symbol) == 2:
+        return SecuritySymbol(symbol[0], symbol[1])
+    if len(symbol) == 1:
+        return SecuritySymbol('', symbol[0])
+    return None
+
+
+def download_series(ticker: str) -> List[Price]:
+    """Downloads all the daily prices of the ticker in one chart request."""
+    sec_symbol = parse_ticker(ticker)
+    if sec_symbol is None:
+        return []
+    return get_downloader("yahoo_finance").download_history(
+        sec_symbol, '', HISTORY_START, date.today()
+    )
+
+
+def download_latest(sec_symbol: SecuritySymbol) -> source.SourcePrice:
+    """Downloads the latest price with the shared downloader."""
+    return to_source_price(get_downloader("yahoo_finance").download(sec_symbol, ''))
 
 
 class Source(source.Source):
@@ -25,35 +66,40 @@ class Source(source.Source):
         Downloads the latest price for the ticker.
         '''
         try:
-            symbol = ticker.split(':')
-
-            if len(symbol) == 2:
-                sec_symbol = SecuritySymbol(symbol[0], symbol[1])
-            elif len(symbol) == 1:
-                sec_symbol = SecuritySymbol('', symbol[0])
-            else:
+            sec_symbol = parse_ticker(ticker)
+            if sec_symbol is None:
                 return None
 
-            dl = YahooFinanceDownloader()
-            response = dl.download(sec_symbol, '')
-
-            price = response.value
-
-            min_time = datetime.min.time()
-            time = datetime.combine(response.date, min_time)
-            # The datetime must be timezone aware.
-            time = time.astimezone()
-
-            quote_currency = response.currency
+            return _latest_cache.get(
+                str(sec_symbol), lambda: download_latest(sec_symbol)
+            )
+        except Exception as e:
+            logger.error(e)
+            return None
 
-            return source.SourcePrice(price, time, quote_currency)
+    def get_historical_price(
+        self, ticker: str, time: datetime
+    ) -> source.SourcePrice | None:
+        '''
+        The latest price on or before the date. The series of the ticker is
+        downloaded on the first call.
+        '''
+        try:
+            return _series_cache.as_of(ticker, time, lambda: download_series(ticker))
         except Exception as e:
             logger.error(e)
             return None
 
-    def get_historical_price(self, ticker, time):
+    def get_prices_series(
+        self, ticker: str, time_begin: datetime, time_end: datetime
+    ) -> List[source.SourcePrice] | None:
         '''
-        Downloads the historical price for the ticker.
+        The daily prices between the dates, inclusive.
         '''
-        # todo: implement
-        return None
+        try:
+            return _series_cache.between(
+                ticker, time_begin, time_end, lambda: download_series(ticker)
+            )
+        except Exception as e:
+            logger.error(e)
+            return None
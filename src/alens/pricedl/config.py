@@ -70,11 +70,30 @@ class PriceDbConfig:
     #     self.config_data["prices_path"] = value
     #     self.save_config()
 
+    @property
+    def price_database_path(self) -> Optional[str]:
+        """
+        Path to the SQLite price database. When not set, or ":memory:",
+        the prices are kept in the prices file only.
+        """
+        path = self.config_data.get("price_database_path")
+        return path if path and path != ":memory:" else None
+
     @property
     def symbols_path(self) -> Optional[str]:
         """Path to the symbols file."""
         return self.config_data.get("symbols_path")
 
+    def get_updater_config(self, updater: str) -> Dict[str, Any]:
+        """
+        Settings for a price updater, from the [updaters.<name>] table, i.e.
+
+        [updaters.yahoo_finance]
+        batch_size = 50
+        """
+        updaters = self.config_data.get("updaters") or {}
+        return updaters.get(updater) or {}
+
     def get_value(self, key: str) -> Any:
         """Get a value from the configuration."""
         return self.config_data.get(key)
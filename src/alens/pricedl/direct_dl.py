@@ -2,17 +2,47 @@
 The price downloader that downloads the prices directly into the list.
 """
 
+import asyncio
+import time
+from datetime import date, datetime
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 import csv
 import asyncclick as click
 from loguru import logger
 
 from alens.pricedl.config import PriceDbConfig
+from alens.pricedl.failed_symbols import (
+    get_failed_symbols_path,
+    load_failed_symbols,
+    save_failed_symbols,
+    symbol_key,
+)
+from alens.pricedl.freshness import FreshnessPolicy
 from alens.pricedl.price_flat_file import PriceFlatFile, PriceRecord
-from alens.pricedl.quote import Quote
+from alens.pricedl.price_index import end_of_day, get_price
+from alens.pricedl.price_snapshot import SnapshotPriceFile
+from alens.pricedl.price_store import PriceStore
+from alens.pricedl.sqlite_store import SqlitePriceStore
+from alens.pricedl.quote import DownloaderRegistry, Quote
+from alens.pricedl.retry import CircuitOpenError
+from alens.pricedl.trading_calendar import (
+    get_market,
+    is_price_current,
+    last_session,
+    market_now,
+    market_today,
+    session_gaps,
+)
 from alens.pricedl.model import Price, SecurityFilter, SecuritySymbol, SymbolMetadata
 
+# The default number of downloads running at the same time.
+DEFAULT_CONCURRENCY = 8
+# The updaters for exchange-traded securities, which follow the trading calendar.
+CALENDAR_UPDATERS = ("yahoo_finance", "vanguard_au")
+# The updaters that fetch the symbols of several exchanges in one request.
+MULTI_EXCHANGE_UPDATERS = ("yahoo_finance",)
+
 
 def get_securities(
     symbols_path: Path, security_filter: SecurityFilter
@@ -56,12 +86,126 @@ def get_paths() -> Tuple[Path, Path]:
     return symbols_path, prices_path
 
 
-def dl_quotes(security_filter: SecurityFilter):
+def open_price_store(
+    config: PriceDbConfig,
+    prices_path: Path,
+    append: bool = False,
+    symbols: List[str] | None = None,
+) -> PriceStore:
+    """
+    Opens the configured price store: the SQLite database, if
+    `price_database_path` is set, or else the prices file, through its snapshot.
+    A new database is filled from the prices file.
+    With `append`, the prices file is never rewritten, so only the latest prices
+    of the `symbols` are read, from the end of the file.
+    """
+    if config.price_database_path is None:
+        if append:
+            return PriceFlatFile.load_latest(prices_path, symbols)
+        return SnapshotPriceFile.load(prices_path)
+
+    database_path = Path(config.price_database_path)
+    is_new = not database_path.exists()
+    store = SqlitePriceStore(database_path)
+    if is_new and prices_path.exists():
+        count = store.import_file(prices_path)
+        logger.info(f"Imported {count} prices from {prices_path} into {database_path}")
+    return store
+
+
+class Checkpoint:
+    """
+    Decides when the downloaded prices should be written to the price file.
+    By default, the file is written only once, at the end of the run.
+    A checkpoint can be requested every `every` prices and/or every `seconds`.
+    """
+
+    def __init__(self, every: int | None = None, seconds: float | None = None):
+        if every is not None and every < 1:
+            raise ValueError(f"Checkpoint count must be at least 1, got {every}")
+        if seconds is not None and seconds <= 0:
+            raise ValueError(f"Checkpoint interval must be positive, got {seconds}")
+
+        self.every = every
+        self.seconds = seconds
+        self.pending = 0
+        self._last_save = time.monotonic()
+
+    def record(self) -> bool:
+        """Registers a new price. Returns True when a checkpoint is due."""
+        self.pending += 1
+
+        if self.every is not None and self.pending >= self.every:
+            return True
+        if self.seconds is not None:
+            return time.monotonic() - self._last_save >= self.seconds
+        return False
+
+    def reset(self):
+        """Marks the pending prices as saved."""
+        self.pending = 0
+        self._last_save = time.monotonic()
+
+
+def dl_quotes(
+    security_filter: SecurityFilter,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    checkpoint: Checkpoint | None = None,
+    retry_failed: bool = False,
+    max_age: str | None = None,
+    use_calendar: bool = True,
+    append: bool | None = None,
+) -> List[SymbolMetadata]:
+    """
+    Download directly into the price file in ledger format.
+    Synchronous entry point for `dl_quotes_async`.
+    """
+    return asyncio.run(
+        dl_quotes_async(
+            security_filter,
+            concurrency,
+            checkpoint,
+            retry_failed,
+            max_age,
+            use_calendar,
+            append,
+        )
+    )
+
+
+async def dl_quotes_async(
+    security_filter: SecurityFilter,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    checkpoint: Checkpoint | None = None,
+    retry_failed: bool = False,
+    max_age: str | None = None,
+    use_calendar: bool = True,
+    append: bool | None = None,
+) -> List[SymbolMetadata]:
     """
     Download directly into the price file in ledger format.
     Maintains the latest prices in the price file by updating the prices for
     existing symbols and adding any new ones.
+    Up to `concurrency` downloads run at the same time. The prices are merged into
+    the price file in the order in which the downloads complete.
+    The price file is written at the end of the run, and at the checkpoints,
+    if requested.
+    A failed download does not stop the run. The failed symbols are saved, and
+    can be downloaded again with `retry_failed`, which skips all the others.
+    The symbols with a stored price younger than `max_age` (i.e. "12h"), or
+    the age configured for their exchange or updater, are not downloaded.
+    With `use_calendar`, the exchange-traded symbols are skipped if the stored
+    price is the closing price of the last completed session at their exchange.
+    With `append` (default: the `append_only` setting), the new prices are
+    appended to the end of the file as they arrive, instead of rewriting the
+    file. Run `compact` to sort the file afterwards.
+    With `price_database_path` set, the prices are stored in the SQLite database
+    instead. Run `export` to write them into the price file.
+    Returns the securities that failed.
     """
+    if concurrency < 1:
+        raise ValueError(f"Concurrency must be at least 1, got {concurrency}")
+
     symbols_path, prices_path = get_paths()
     logger.debug(f"Symbols path: {symbols_path}")
     logger.debug(f"Prices path: {prices_path}")
@@ -69,38 +213,451 @@ def dl_quotes(security_filter: SecurityFilter):
     # load the symbols table for mapping
     securities = get_securities(symbols_path, security_filter)
 
-    # load prices file
-    prices_file = PriceFlatFile.load(prices_path)
+    config = PriceDbConfig()
+    if append is None:
+        append = bool(config.get_value("append_only"))
+    failed_path = get_failed_symbols_path(config)
+    previously_failed = load_failed_symbols(failed_path)
+    if retry_failed:
+        securities = [sec for sec in securities if symbol_key(sec) in previously_failed]
+        logger.debug(f"Retrying {len(securities)} failed symbols")
+    attempted = {symbol_key(sec) for sec in securities}
+
+    store = open_price_store(
+        config, prices_path, append, [get_ledger_symbol(sec) for sec in securities]
+    )
+
+    securities = skip_fresh(
+        securities, store, FreshnessPolicy.from_config(config, max_age)
+    )
+    if use_calendar:
+        securities = skip_closed_markets(securities, store)
+
+    # One downloader, with its connection pool, per updater.
+    registry = DownloaderRegistry(config)
+    batches = plan_batches(securities, registry)
+    logger.debug(f"Downloading {len(securities)} symbols in {len(batches)} batches")
+
+    checkpoint = checkpoint or Checkpoint()
+    semaphore = asyncio.Semaphore(concurrency)
+    # Securities that were not downloaded, with the reason.
+    failures: List[Tuple[SymbolMetadata, str]] = []
+
+    async def fetch(
+        batch: List[SymbolMetadata],
+    ) -> Tuple[List[SymbolMetadata], List[Tuple[SymbolMetadata, Price]]]:
+        async with semaphore:
+            try:
+                results = await download_batch_async(batch, registry)
+            except CircuitOpenError as error:
+                logger.warning(f"Skipping {len(batch)} symbols: {error}")
+                failures.extend((sec, str(error)) for sec in batch)
+                return batch, []
+            except Exception as error:
+                logger.error(f"Error downloading {describe_batch(batch)}: {error}")
+                failures.extend((sec, str(error)) for sec in batch)
+                return batch, []
+
+        received = {id(sec) for sec, _ in results}
+        for sec in batch:
+            if id(sec) not in received:
+                failures.append((sec, "No price downloaded"))
+        return batch, results
+
+    tasks = [asyncio.create_task(fetch(batch)) for batch in batches]
 
     # progress bar
-    with click.progressbar(length=len(securities), label="Downloading prices") as progress:
+    try:
+        with click.progressbar(
+            length=len(securities), label="Downloading prices"
+        ) as progress:
+            for completed in asyncio.as_completed(tasks):
+                batch, results = await completed
+                records = []
+                for sec, price in results:
+                    logger.debug(f"Price: {price}")
+
+                    try:
+                        records.append(to_price_record(sec, price))
+                    except ValueError as error:
+                        logger.error(f"Invalid price for {sec.symbol}: {error}")
+                        failures.append((sec, str(error)))
+
+                if append:
+                    store.append(records)
+                else:
+                    store.add(records)
+
+                    checkpoint_due = False
+                    for _ in records:
+                        checkpoint_due = checkpoint.record() or checkpoint_due
+                    if checkpoint_due:
+                        logger.debug(f"Checkpoint: saving {checkpoint.pending} prices")
+                        store.save()
+                        checkpoint.reset()
+
+                # update progress bar
+                progress.update(len(batch))
+
+        report_failures(failures)
+
+        # Keep the earlier failures for the symbols that were not selected now.
+        # The skipped symbols have a current price and no longer count as failed.
+        save_failed_symbols(
+            failed_path,
+            (previously_failed - attempted) | {symbol_key(sec) for sec, _ in failures},
+        )
+    finally:
+        # Do not leave downloads running if the run is aborted.
+        for task in tasks:
+            task.cancel()
+
+        registry.close()
+
+        # Keep whatever has been downloaded so far.
+        if checkpoint.pending:
+            store.save()
+            checkpoint.reset()
+        store.close()
+
+    return [sec for sec, _ in failures]
+
+
+def backfill(
+    security_filter: SecurityFilter,
+    start: date,
+    end: date,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[SymbolMetadata]:
+    """
+    Download the historical prices into the price store.
+    Synchronous entry point for `backfill_async`.
+    """
+    return asyncio.run(backfill_async(security_filter, start, end, concurrency))
+
+
+async def backfill_async(
+    security_filter: SecurityFilter,
+    start: date,
+    end: date,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[SymbolMetadata]:
+    """
+    Download the daily prices from `start` to `end`, inclusive, with one range
+    request per symbol, and merge them into the price store in a single write.
+    The existing prices for the same dates are replaced.
+    Returns the securities that failed.
+    """
+    if start > end:
+        raise ValueError(f"The start date {start} is after the end date {end}")
+
+    symbols_path, prices_path = get_paths()
+    securities = get_securities(symbols_path, security_filter)
+
+    return await download_ranges_async(
+        prices_path, [(sec, start, end) for sec in securities], concurrency
+    )
+
+
+def find_gaps(
+    security_filter: SecurityFilter,
+    start: date | None = None,
+    end: date | None = None,
+) -> List[Tuple[SymbolMetadata, List[Tuple[date, date]]]]:
+    """
+    The missing prices of the exchange-traded securities, as ranges of trading
+    sessions per security. The history is checked from `start` (default: the
+    first stored price of each security) to `end` (default: the latest session).
+    Securities without a trading calendar or without prices are skipped.
+    """
+    symbols_path, prices_path = get_paths()
+    securities = get_securities(symbols_path, security_filter)
+    config = PriceDbConfig()
+
+    result = []
+    with open_price_store(config, prices_path) as store:
         for sec in securities:
-            logger.debug(f"Processing symbol: {sec.symbol}, {sec.updater_symbol}")
-            # Use the Updater Symbol, if specified. This is provider-specific.
-            mnemonic = sec.updater_symbol if sec.updater_symbol else sec.symbol
-            symbol = SecuritySymbol(sec.namespace or "", mnemonic)
-            logger.debug(f"Fetching price for symbol {symbol}")
+            market = get_market(sec.namespace)
+            if market is None:
+                logger.debug(f"No trading calendar for {symbol_key(sec)}")
+                continue
+            days = store.dates(get_ledger_symbol(sec))
+            if not days:
+                continue
+
+            first = start or days[0]
+            last = end or last_session(market, market_today(market))
+            gaps = session_gaps(market, days, first, last)
+            if gaps:
+                result.append((sec, gaps))
+    return result
 
-            # todo update progress bar
 
-            price = download_price(
-                symbol, currency=sec.currency, agent=sec.updater
-            )
-            logger.debug(f"Price: {price}")
+async def fill_gaps_async(
+    gaps: List[Tuple[SymbolMetadata, List[Tuple[date, date]]]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[SymbolMetadata]:
+    """
+    Download the missing ranges found by `find_gaps`, one request per range,
+    and merge them into the price store in a single write.
+    Returns the securities that failed.
+    """
+    _, prices_path = get_paths()
+    ranges = [
+        (sec, first, last) for sec, sec_gaps in gaps for first, last in sec_gaps
+    ]
+    return await download_ranges_async(prices_path, ranges, concurrency)
 
-            # Convert the price to ledger format record.
-            price_record = PriceRecord.from_price_model(price)
-            # Use ledger symbol.
-            price_record.symbol = sec.ledger_symbol or sec.symbol
 
-            # Appent to the price file. The symbol is used as the key.
-            prices_file.prices[price_record.symbol] = price_record
+async def download_ranges_async(
+    prices_path: Path,
+    ranges: List[Tuple[SymbolMetadata, date, date]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[SymbolMetadata]:
+    """
+    Download the daily prices for the (security, start, end) ranges, up to
+    `concurrency` requests at the same time, and merge them all into the price
+    store with one write.
+    Returns the securities that failed.
+    """
+    if concurrency < 1:
+        raise ValueError(f"Concurrency must be at least 1, got {concurrency}")
 
-            # Save the price file after every price fetch.
-            prices_file.save()
+    config = PriceDbConfig()
+    # One downloader, with its connection pool, per updater.
+    registry = DownloaderRegistry(config)
+    semaphore = asyncio.Semaphore(concurrency)
+    # Securities that were not downloaded, with the reason.
+    failures: List[Tuple[SymbolMetadata, str]] = []
+    records: List[PriceRecord] = []
+
+    async def fetch(
+        sec: SymbolMetadata, start: date, end: date
+    ) -> Tuple[SymbolMetadata, List[Price]]:
+        quote = Quote(registry=registry)
+        if sec.updater:
+            quote.set_source(sec.updater)
+        if sec.currency:
+            quote.set_currency(sec.currency)
+        symbol = get_download_symbol(sec)
+
+        async with semaphore:
+            try:
+                prices = await quote.fetch_history_async(
+                    symbol.namespace, symbol.mnemonic, start, end
+                )
+            except Exception as error:
+                logger.error(f"Error downloading the history of {sec.symbol}: {error}")
+                failures.append((sec, str(error)))
+                return sec, []
+
+        if not prices:
+            failures.append((sec, f"No prices from {start} to {end}"))
+        return sec, prices
+
+    tasks = [asyncio.create_task(fetch(*entry)) for entry in ranges]
+
+    try:
+        with click.progressbar(
+            length=len(ranges), label="Downloading history"
+        ) as progress:
+            for completed in asyncio.as_completed(tasks):
+                sec, prices = await completed
+                for price in prices:
+                    try:
+                        records.append(to_price_record(sec, price))
+                    except ValueError as error:
+                        logger.error(f"Invalid price for {sec.symbol}: {error}")
+                progress.update(1)
+    finally:
+        for task in tasks:
+            task.cancel()
+        registry.close()
+
+    report_failures(failures, retry_hint=False)
+
+    if records:
+        # All the prices are merged and saved in one write.
+        with open_price_store(config, prices_path) as store:
+            store.add(records)
+            store.save()
+        logger.info(f"Stored {len(records)} prices")
+
+    return list({id(sec): sec for sec, _ in failures}.values())
+
+
+def compact_prices(prices_path: Path) -> int:
+    """
+    Sort the price file and remove the duplicate records.
+    Returns the number of records in the file.
+    """
+    prices_file = PriceFlatFile(prices_path)
+    prices_file.compact()
+    return len(prices_file.history)
 
-            # update progress bar
-            progress.update(1)
+
+def export_prices(prices_path: Path) -> int:
+    """
+    Write all the prices from the SQLite database into the price file.
+    Returns the number of records.
+    """
+    config = PriceDbConfig()
+    if config.price_database_path is None:
+        raise ValueError("Price database path not set in config")
+
+    with SqlitePriceStore(Path(config.price_database_path)) as store:
+        return store.export(prices_path)
+
+
+def lookup_price(symbol: str, on: date | None = None) -> PriceRecord | None:
+    """
+    The price of the symbol in effect on the given day, or the latest price.
+    Read from the price database, if configured, or else the indexed price file.
+    """
+    config = PriceDbConfig()
+    if config.price_database_path is not None:
+        with SqlitePriceStore(Path(config.price_database_path)) as store:
+            if on is None:
+                return store.prices.get(symbol)
+            return store.as_of(symbol, end_of_day(on))
+
+    _, prices_path = get_paths()
+    return get_price(prices_path, symbol, on)
+
+
+def skip_fresh(
+    securities: List[SymbolMetadata],
+    store: PriceStore,
+    policy: FreshnessPolicy,
+) -> List[SymbolMetadata]:
+    """Remove the securities whose stored price is still fresh."""
+    now = datetime.now().astimezone()
+    result = [
+        sec
+        for sec in securities
+        if not policy.is_fresh(sec, store.prices.get(get_ledger_symbol(sec)), now)
+    ]
+
+    skipped = len(securities) - len(result)
+    if skipped:
+        logger.info(f"Skipping {skipped} symbols with fresh prices")
+
+    return result
+
+
+def skip_closed_markets(
+    securities: List[SymbolMetadata], store: PriceStore
+) -> List[SymbolMetadata]:
+    """
+    Remove the securities whose stored price is the closing price of the last
+    completed session at their exchange. Their price can not have changed.
+    A price taken during a session, or any price while a session is pending or
+    in progress, is downloaded again.
+    """
+    result = []
+    for sec in securities:
+        market = get_market(sec.namespace)
+        record = store.prices.get(get_ledger_symbol(sec))
+
+        if (
+            market is not None
+            and record is not None
+            and (sec.updater or "").lower() in CALENDAR_UPDATERS
+        ):
+            if is_price_current(market, record.datetime, market_now(market)):
+                logger.debug(
+                    f"No session at {market} since {record.datetime}: {sec.symbol}"
+                )
+                continue
+
+        result.append(sec)
+
+    skipped = len(securities) - len(result)
+    if skipped:
+        logger.info(f"Skipping {skipped} symbols with no session since the last price")
+
+    return result
+
+
+def describe_batch(batch: List[SymbolMetadata]) -> str:
+    """Short description of the batch, for the log."""
+    symbols = ", ".join(f"{sec.namespace}:{sec.symbol}" for sec in batch)
+    return f"{symbols} ({batch[0].updater})"
+
+
+def report_failures(
+    failures: List[Tuple[SymbolMetadata, str]], retry_hint: bool = True
+):
+    """List the securities that were not downloaded."""
+    if not failures:
+        return
+
+    click.echo(f"Failed to download {len(failures)} symbols:")
+    for sec, reason in failures:
+        click.echo(f"  {symbol_key(sec)} ({sec.updater}): {reason}")
+    if retry_hint:
+        click.echo("Use `pricedl dl --retry-failed` to download only these.")
+
+
+def plan_batches(
+    securities: List[SymbolMetadata], registry: DownloaderRegistry
+) -> List[List[SymbolMetadata]]:
+    """
+    Group the securities into batches that can be fetched with one call to the
+    downloader. A batch has the same updater and currency, and is limited to the
+    batch size of the updater's downloader. The batches are also split by
+    exchange, except for the updaters that fetch several exchanges at once.
+    """
+    groups: Dict[Tuple[str | None, str | None, str | None], List[SymbolMetadata]] = {}
+    for sec in securities:
+        multi_exchange = (sec.updater or "").lower() in MULTI_EXCHANGE_UPDATERS
+        key = (sec.updater, None if multi_exchange else sec.namespace, sec.currency)
+        groups.setdefault(key, []).append(sec)
+
+    batches = []
+    for (agent, _, _), group in groups.items():
+        batch_size = get_batch_size(agent, registry)
+        for start in range(0, len(group), batch_size):
+            batches.append(group[start : start + batch_size])
+
+    return batches
+
+
+def get_batch_size(agent: str | None, registry: DownloaderRegistry) -> int:
+    """The number of symbols the updater can fetch in one call."""
+    quote = Quote(registry=registry)
+    if agent:
+        quote.set_source(agent)
+    try:
+        return quote.get_batch_size()
+    except Exception as e:
+        # Reported when the batch is downloaded.
+        logger.debug(f"Cannot determine the batch size for {agent}: {e}")
+        return 1
+
+
+def get_download_symbol(sec: SymbolMetadata) -> SecuritySymbol:
+    """
+    Get the symbol to use with the price provider.
+    Uses the Updater Symbol, if specified. This is provider-specific.
+    """
+    logger.debug(f"Processing symbol: {sec.symbol}, {sec.updater_symbol}")
+    mnemonic = sec.updater_symbol if sec.updater_symbol else sec.symbol
+    return SecuritySymbol(sec.namespace or "", mnemonic)
+
+
+def to_price_record(sec: SymbolMetadata, price: Price) -> PriceRecord:
+    """
+    Convert the downloaded price to ledger format record, using the ledger symbol.
+    """
+    price_record = PriceRecord.from_price_model(price)
+    price_record.symbol = get_ledger_symbol(sec)
+    return price_record
+
+
+def get_ledger_symbol(sec: SymbolMetadata) -> str:
+    """The symbol used in the price file."""
+    return sec.ledger_symbol or sec.symbol
 
 
 def filter_securities(securities_list, filter_val):
@@ -165,3 +722,47 @@ def download_price(
         raise LookupError(f"No price downloaded for {symbol}")
 
     return prices[0]
+
+
+async def download_batch_async(
+    batch: List[SymbolMetadata], registry: DownloaderRegistry | None = None
+) -> List[Tuple[SymbolMetadata, Price]]:
+    """
+    Download the prices for a batch of securities, without blocking the event loop.
+    All the securities in the batch must share the updater and currency.
+    Returns the securities paired with their prices. The securities for which no
+    price was received are omitted.
+    """
+    first = batch[0]
+    # Several securities can share the symbol at the provider.
+    download_symbols: Dict[Tuple[str, str], SecuritySymbol] = {}
+    symbols: Dict[Tuple[str, str], List[SymbolMetadata]] = {}
+    for sec in batch:
+        symbol = get_download_symbol(sec)
+        key = (symbol.namespace.upper(), symbol.mnemonic)
+        download_symbols.setdefault(key, symbol)
+        symbols.setdefault(key, []).append(sec)
+    logger.debug(
+        f"Fetching prices for {', '.join(map(str, download_symbols.values()))}"
+    )
+
+    dl = Quote(registry=registry)
+    if first.updater:
+        dl.set_source(first.updater)
+    if first.currency:
+        dl.set_currency(first.currency)
+
+    prices = await dl.fetch_symbols_async(list(download_symbols.values()))
+
+    # The downloaders set the requested symbol on the prices.
+    received = {
+        (price.symbol.namespace.upper(), price.symbol.mnemonic): price
+        for price in prices
+    }
+
+    return [
+        (sec, received[key])
+        for key, securities in symbols.items()
+        if key in received
+        for sec in securities
+    ]
@@ -0,0 +1,56 @@
+"""
+Keeps the list of the symbols that failed to download, so that only those can be
+fetched again, with `pricedl dl --retry-failed`.
+The list is stored as JSON in the configuration directory.
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Set
+
+from loguru import logger
+
+from alens.pricedl.config import PriceDbConfig
+from alens.pricedl.model import SymbolMetadata
+
+FAILED_SYMBOLS_FILE = "failed_symbols.json"
+
+
+def symbol_key(sec: SymbolMetadata) -> str:
+    """The key identifying the row in the symbols file, i.e. XETRA:EL4X"""
+    return f"{sec.namespace or ''}:{sec.symbol}"
+
+
+def get_failed_symbols_path(config: PriceDbConfig) -> Path:
+    """The location of the failed symbols list."""
+    return config.config_path.parent / FAILED_SYMBOLS_FILE
+
+
+def load_failed_symbols(path: Path) -> Set[str]:
+    """Load the keys of the failed symbols. Empty if there is no list."""
+    if not path.exists():
+        return set()
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Could not read the failed symbols from {path}: {e}")
+        return set()
+
+    return set(data.get("symbols", []))
+
+
+def save_failed_symbols(path: Path, keys: Iterable[str]):
+    """Save the keys of the failed symbols. Removes the list if there are none."""
+    keys = sorted(keys)
+    if not keys:
+        path.unlink(missing_ok=True)
+        return
+
+    data = {"updated": datetime.now().isoformat(timespec="seconds"), "symbols": keys}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+    logger.debug(f"Saved {len(keys)} failed symbols to {path}")
@@ -0,0 +1,142 @@
+"""
+Freshness policy: skip the symbols whose stored price is recent enough.
+
+The maximum age of a price can be set on the command line (`--max-age`), in the
+configuration file, and per exchange (namespace) or updater:
+
+    max_age = "12h"
+
+    [updaters.fixerio]
+    max_age = "1d"
+
+    [namespaces.ASX]
+    max_age = "20h"
+
+The namespace setting takes precedence over the updater setting, which takes
+precedence over the default.
+
+The stored price times are in the exchange's time zone, where it is known, and
+in the local time zone otherwise.
+"""
+
+import re
+from datetime import datetime, timedelta
+from typing import Dict
+
+from alens.pricedl.config import PriceDbConfig
+from alens.pricedl.model import SymbolMetadata
+from alens.pricedl.price_flat_file import PriceRecord
+from alens.pricedl.trading_calendar import get_market, market_timezone
+
+AGE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*$", re.IGNORECASE)
+AGE_UNITS = {
+    "s": "seconds",
+    "m": "minutes",
+    "h": "hours",
+    "d": "days",
+    "w": "weeks",
+}
+
+
+def parse_age(value: str | int | float) -> timedelta:
+    """
+    Parse the age, i.e. "30m", "12h", "1d", "2w".
+    A number without a unit is in hours.
+    """
+    if isinstance(value, (int, float)):
+        return timedelta(hours=value)
+
+    match = AGE_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"Invalid age: '{value}'. Use i.e. 30m, 12h, 1d")
+
+    amount, unit = match.groups()
+    unit = AGE_UNITS[unit.lower()] if unit else "hours"
+    return timedelta(**{unit: float(amount)})
+
+
+def _config_age(key: str, value) -> timedelta:
+    """Parse a configured age. The error names the setting."""
+    try:
+        return parse_age(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid setting {key} = {value!r}: {e}") from e
+
+
+class FreshnessPolicy:
+    """
+    Decides whether a stored price is fresh enough to skip the download.
+    """
+
+    def __init__(
+        self,
+        default: timedelta | None = None,
+        by_namespace: Dict[str, timedelta] | None = None,
+        by_updater: Dict[str, timedelta] | None = None,
+    ):
+        self.default = default
+        self.by_namespace = by_namespace or {}
+        self.by_updater = by_updater or {}
+
+    @classmethod
+    def from_config(
+        cls, config: PriceDbConfig, default: str | None = None
+    ) -> "FreshnessPolicy":
+        """
+        Create the policy from the configuration. The given default (from the
+        command line) replaces the configured default.
+        """
+        default_age = default or config.get_value("max_age")
+
+        by_namespace = {
+            namespace.upper(): _config_age(
+                f"namespaces.{namespace}.max_age", options["max_age"]
+            )
+            for namespace, options in (config.get_value("namespaces") or {}).items()
+            if "max_age" in options
+        }
+        by_updater = {
+            updater.lower(): _config_age(
+                f"updaters.{updater}.max_age", options["max_age"]
+            )
+            for updater, options in (config.get_value("updaters") or {}).items()
+            if "max_age" in options
+        }
+
+        return cls(
+            _config_age("max_age", default_age) if default_age is not None else None,
+            by_namespace,
+            by_updater,
+        )
+
+    def get_max_age(self, sec: SymbolMetadata) -> timedelta | None:
+        """The maximum age of the price for the security. None if not limited."""
+        if sec.namespace and sec.namespace.upper() in self.by_namespace:
+            return self.by_namespace[sec.namespace.upper()]
+        if sec.updater and sec.updater.lower() in self.by_updater:
+            return self.by_updater[sec.updater.lower()]
+        return self.default
+
+    def is_fresh(
+        self, sec: SymbolMetadata, record: PriceRecord | None, now: datetime
+    ) -> bool:
+        """
+        Whether the stored price record is recent enough to skip the download.
+        A naive `now` is in the local time zone.
+        """
+        if record is None:
+            return False
+
+        max_age = self.get_max_age(sec)
+        if max_age is None:
+            return False
+
+        return now.astimezone() - get_price_time(sec, record) <= max_age
+
+
+def get_price_time(sec: SymbolMetadata, record: PriceRecord) -> datetime:
+    """The time of the stored price, in the time zone of the security's exchange."""
+    tz = market_timezone(get_market(sec.namespace))
+    if tz is None:
+        return record.datetime.astimezone()
+    return record.datetime.replace(tzinfo=tz)
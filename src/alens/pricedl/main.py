@@ -3,18 +3,43 @@ Main entry point for the script executable.
 """
 
 import importlib.metadata
+from datetime import date
+from pathlib import Path
 
 import asyncclick as click
 from loguru import logger
 import dotenv
 
-from alens.pricedl.direct_dl import dl_quotes
+from alens.pricedl.direct_dl import (
+    DEFAULT_CONCURRENCY,
+    Checkpoint,
+    backfill_async,
+    compact_prices,
+    dl_quotes_async,
+    export_prices,
+    fill_gaps_async,
+    find_gaps,
+    get_paths,
+    lookup_price,
+)
 from alens.pricedl.config import PriceDbConfig
+from alens.pricedl.freshness import parse_age
 from alens.pricedl.model import SecurityFilter
 
 dotenv.load_dotenv()
 
 
+def validate_age(ctx, param, value):
+    """Validates a price age option, i.e. 12h."""
+    if value is None:
+        return None
+    try:
+        parse_age(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
+    return value
+
+
 @click.group()
 # @click.option("--debug/--no-debug", default=False, help="Enable debug logging")
 def cli():
@@ -64,7 +89,64 @@ def config_show():
 @click.option("--currency", "-c", default=None, help="Currency for the price")
 @click.option("--agent", "-a", default=None, help="Agent for the price")
 @click.option("--file", "-f", default=None, help="Path to CSV file with symbols")
-async def download(exchange, symbol, currency, agent, file):
+@click.option(
+    "--concurrency",
+    "-n",
+    default=DEFAULT_CONCURRENCY,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of downloads to run at the same time",
+)
+@click.option(
+    "--checkpoint-every",
+    default=None,
+    type=click.IntRange(min=1),
+    help="Save the price file after every N downloaded prices",
+)
+@click.option(
+    "--checkpoint-seconds",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Save the price file at most every N seconds during the download",
+)
+@click.option(
+    "--max-age",
+    default=None,
+    callback=validate_age,
+    help="Skip the symbols with a stored price younger than this, i.e. 12h, 1d",
+)
+@click.option(
+    "--ignore-calendar",
+    is_flag=True,
+    default=False,
+    help="Download even if the exchange has had no session since the last price",
+)
+@click.option(
+    "--append/--rewrite",
+    default=None,
+    help="Append the new prices to the end of the price file, or rewrite it. "
+    "Default: the append_only setting",
+)
+@click.option(
+    "--retry-failed",
+    is_flag=True,
+    default=False,
+    help="Download only the symbols that failed in the previous runs",
+)
+async def download(
+    exchange,
+    symbol,
+    currency,
+    agent,
+    file,
+    concurrency,
+    checkpoint_every,
+    checkpoint_seconds,
+    retry_failed,
+    max_age,
+    ignore_calendar,
+    append,
+):
     """Download prices for symbols."""
     if currency:
         currency = currency.strip()
@@ -72,7 +154,169 @@ async def download(exchange, symbol, currency, agent, file):
 
     sec_filter = SecurityFilter(currency, agent, exchange, symbol)
     logger.debug(f"Filter: {sec_filter}")
-    dl_quotes(sec_filter)
+    checkpoint = Checkpoint(checkpoint_every, checkpoint_seconds)
+    await dl_quotes_async(
+        sec_filter,
+        concurrency,
+        checkpoint,
+        retry_failed,
+        max_age,
+        use_calendar=not ignore_calendar,
+        append=append,
+    )
+
+
+@cli.command("backfill")
+@click.option(
+    "--from",
+    "start",
+    required=True,
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="The first date of the history (YYYY-MM-DD)",
+)
+@click.option(
+    "--to",
+    "end",
+    default=None,
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="The last date of the history (YYYY-MM-DD). Default: today",
+)
+@click.option(
+    "--exchange", "-x", default=None, help="Exchange for the securities to update"
+)
+@click.option(
+    "--symbol", "-s", default=None, help="Symbol to download (NAMESPACE:MNEMONIC)"
+)
+@click.option("--currency", "-c", default=None, help="Currency for the price")
+@click.option("--agent", "-a", default=None, help="Agent for the price")
+@click.option(
+    "--concurrency",
+    "-n",
+    default=DEFAULT_CONCURRENCY,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of downloads to run at the same time",
+)
+async def backfill(start, end, exchange, symbol, currency, agent, concurrency):
+    """Download the daily price history for a date range."""
+    if currency:
+        currency = currency.strip().upper()
+
+    first = start.date()
+    last = end.date() if end else date.today()
+    if first > last:
+        raise click.BadParameter(f"{first} is after {last}", param_hint="--from")
+
+    sec_filter = SecurityFilter(currency, agent, exchange, symbol)
+    logger.debug(f"Filter: {sec_filter}")
+    await backfill_async(sec_filter, first, last, concurrency)
+
+
+@cli.command("gaps")
+@click.option(
+    "--from",
+    "start",
+    default=None,
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Check from this date (YYYY-MM-DD). Default: the first price of each symbol",
+)
+@click.option(
+    "--to",
+    "end",
+    default=None,
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Check up to this date (YYYY-MM-DD). Default: the latest session",
+)
+@click.option(
+    "--exchange", "-x", default=None, help="Exchange for the securities to check"
+)
+@click.option(
+    "--symbol", "-s", default=None, help="Symbol to check (NAMESPACE:MNEMONIC)"
+)
+@click.option("--currency", "-c", default=None, help="Currency for the price")
+@click.option("--agent", "-a", default=None, help="Agent for the price")
+@click.option(
+    "--fill",
+    is_flag=True,
+    default=False,
+    help="Download the missing prices, one request per gap",
+)
+@click.option(
+    "--concurrency",
+    "-n",
+    default=DEFAULT_CONCURRENCY,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of downloads to run at the same time",
+)
+async def gaps(start, end, exchange, symbol, currency, agent, fill, concurrency):
+    """List the trading sessions without a price, and optionally fill them."""
+    if currency:
+        currency = currency.strip().upper()
+
+    sec_filter = SecurityFilter(currency, agent, exchange, symbol)
+    logger.debug(f"Filter: {sec_filter}")
+    found = find_gaps(
+        sec_filter, start.date() if start else None, end.date() if end else None
+    )
+
+    for sec, ranges in found:
+        for first, last in ranges:
+            span = str(first) if first == last else f"{first} - {last}"
+            click.echo(f"{sec.namespace}:{sec.symbol} {span}")
+
+    count = sum(len(ranges) for _, ranges in found)
+    click.echo(f"{count} gaps in {len(found)} symbols")
+
+    if fill and found:
+        await fill_gaps_async(found, concurrency)
+
+
+@cli.command("compact")
+@click.option("--file", "-f", default=None, help="Path to the price file")
+def compact(file):
+    """Sort the price file and remove duplicate prices."""
+    if file:
+        prices_path = Path(file)
+    else:
+        _, prices_path = get_paths()
+
+    count = compact_prices(prices_path)
+    click.echo(f"Compacted {prices_path}: {count} prices")
+
+
+@cli.command("export")
+@click.option("--file", "-f", default=None, help="Path to the price file")
+def export(file):
+    """Write the prices from the price database into the price file."""
+    if file:
+        prices_path = Path(file)
+    else:
+        _, prices_path = get_paths()
+
+    count = export_prices(prices_path)
+    click.echo(f"Exported {count} prices to {prices_path}")
+
+
+@cli.command("price")
+@click.argument("symbol")
+@click.option(
+    "--date",
+    "-d",
+    "on",
+    default=None,
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="The date of the price (YYYY-MM-DD). Default: the latest price",
+)
+def price(symbol, on):
+    """Show the price of SYMBOL in effect on a date."""
+    day = on.date() if on else None
+    record = lookup_price(symbol, day)
+    if record is None:
+        when = f" on {day}" if day else ""
+        raise click.ClickException(f"No price for {symbol}{when}")
+
+    click.echo(record)
 
 
 def get_version():
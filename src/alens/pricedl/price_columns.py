@@ -0,0 +1,177 @@
+"""
+Columnar, array-backed price history for analytics.
+
+The records are held in one NumPy structured array, sorted by symbol and then
+date/time, with a symbol -> slice index. Lookups are binary searches over the
+stamps and range queries return views, so no Python object is created per row.
+
+NumPy is an optional dependency: `pip install alens-pricedl[analytics]`.
+"""
+
+from datetime import date
+from itertools import chain
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, KeysView, List
+
+from alens.pricedl.price_flat_file import PriceFlatFile, PriceRecord
+from alens.pricedl.price_history import SECONDS_PER_DAY, to_stamp
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from alens.pricedl.price_history import PriceHistory
+
+# The stamp of 1970-01-01, to convert to numpy.datetime64.
+EPOCH_STAMP = date(1970, 1, 1).toordinal() * SECONDS_PER_DAY
+
+
+def _numpy():
+    """Imports NumPy on first use."""
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError(
+            "The columnar price store requires NumPy. "
+            "Install it with `pip install alens-pricedl[analytics]`."
+        ) from e
+    return numpy
+
+
+def _row_dtype():
+    np = _numpy()
+    return np.dtype(
+        [
+            ("stamp", np.int64),
+            ("mantissa", np.int64),
+            ("scale", np.int8),
+            ("currency", np.int32),
+        ]
+    )
+
+
+class PriceColumns:
+    """
+    The price history as columns: stamps (day ordinal * 86400 + seconds),
+    value mantissas and scales, and currency ids into `currencies`.
+    There is one row per symbol and date/time.
+    """
+
+    def __init__(
+        self, rows: "np.ndarray", index: Dict[str, slice], currencies: List[str]
+    ):
+        self.rows = rows
+        self.currencies = currencies
+        self._index = index
+
+    @classmethod
+    def from_records(cls, records: Iterable[PriceRecord]) -> "PriceColumns":
+        """
+        Builds the columns from the records, in any order.
+        For the same symbol and date/time, the last record wins.
+        """
+        np = _numpy()
+        symbol_ids: Dict[str, int] = {}
+        currency_ids: Dict[str, int] = {}
+
+        def to_row(record: PriceRecord):
+            symbol_id = symbol_ids.setdefault(record.symbol, len(symbol_ids))
+            currency_id = currency_ids.setdefault(record.currency, len(currency_ids))
+            return (
+                record.stamp,
+                record.mantissa,
+                record.scale,
+                currency_id,
+                symbol_id,
+            )
+
+        dtype = np.dtype(_row_dtype().descr + [("symbol", np.int32)])
+        table = np.fromiter((to_row(record) for record in records), dtype=dtype)
+
+        # Stable sort by symbol, then stamp, and keep the last of the duplicates.
+        order = np.lexsort((table["stamp"], table["symbol"]))
+        table = table[order]
+        if len(table):
+            keep = np.ones(len(table), dtype=bool)
+            keep[:-1] = (table["symbol"][1:] != table["symbol"][:-1]) | (
+                table["stamp"][1:] != table["stamp"][:-1]
+            )
+            table = table[keep]
+
+        # The symbols are sorted by id, so each one is a contiguous block.
+        names = list(symbol_ids)
+        boundaries = np.flatnonzero(np.diff(table["symbol"])) + 1
+        starts = np.concatenate(([0], boundaries)) if len(table) else []
+        ends = np.concatenate((boundaries, [len(table)])) if len(table) else []
+        index = {
+            names[table["symbol"][start]]: slice(int(start), int(end))
+            for start, end in zip(starts, ends)
+        }
+
+        rows = np.ascontiguousarray(table[list(_row_dtype().names)])
+        return cls(rows, index, list(currency_ids))
+
+    @classmethod
+    def from_history(cls, history: "PriceHistory") -> "PriceColumns":
+        """Builds the columns from a loaded price history."""
+        return cls.from_records(
+            chain.from_iterable(history.series(s) or () for s in history.symbols())
+        )
+
+    @classmethod
+    def load(cls, file_path: Path) -> "PriceColumns":
+        """Builds the columns from the price file, streaming the records."""
+        return cls.from_records(PriceFlatFile(file_path).iter_records())
+
+    def symbols(self) -> KeysView[str]:
+        """The symbols in the store."""
+        return self._index.keys()
+
+    def series(self, symbol: str) -> "np.ndarray":
+        """All the rows for the symbol, as a view. Empty if the symbol is unknown."""
+        return self.rows[self._index.get(symbol, slice(0, 0))]
+
+    def between(self, symbol: str, start: date, end: date) -> "np.ndarray":
+        """The rows for the symbol from `start` to `end`, inclusive, as a view."""
+        np = _numpy()
+        rows = self.series(symbol)
+        stamps = rows["stamp"]
+        lo = np.searchsorted(stamps, to_stamp(start), side="left")
+        hi = np.searchsorted(stamps, to_stamp(end), side="right")
+        return rows[lo:hi]
+
+    def as_of(self, symbol: str, when: date) -> PriceRecord | None:
+        """The price in effect at the given date/time, if any."""
+        np = _numpy()
+        rows = self.series(symbol)
+        index = int(np.searchsorted(rows["stamp"], to_stamp(when), side="right"))
+        return self._record(symbol, rows[index - 1]) if index else None
+
+    def latest(self, symbol: str) -> PriceRecord | None:
+        """The most recent price for the symbol, if any."""
+        rows = self.series(symbol)
+        return self._record(symbol, rows[-1]) if len(rows) else None
+
+    @staticmethod
+    def values(rows: "np.ndarray") -> "np.ndarray":
+        """The prices of the rows as floats, for analytics."""
+        return rows["mantissa"] / 10.0 ** rows["scale"].astype(float)
+
+    @staticmethod
+    def datetimes(rows: "np.ndarray") -> "np.ndarray":
+        """The date/times of the rows as numpy.datetime64[s]."""
+        return (rows["stamp"] - EPOCH_STAMP).astype("datetime64[s]")
+
+    def _record(self, symbol: str, row) -> PriceRecord:
+        return PriceRecord._from_parts(
+            int(row["stamp"]),
+            int(row["mantissa"]),
+            int(row["scale"]),
+            symbol,
+            self.currencies[row["currency"]],
+        )
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, symbol: object) -> bool:
+        return symbol in self._index
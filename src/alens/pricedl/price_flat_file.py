@@ -3,27 +3,148 @@ Maintains the prices in a flat-file in Ledger format.
 P 2023-04-14 00:00:00 GBP 1.132283 EUR
 """
 
+import mmap
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+from sys import intern
+import tempfile
 from datetime import date, datetime, time as dt_time
 from decimal import Decimal, InvalidOperation
 from pathlib import Path
-from typing import Dict, List
+from typing import Iterable, Iterator, List, MutableMapping
 
 from alens.pricedl.model import Price
+from alens.pricedl.price_store import PriceStore
+from alens.pricedl.price_history import (
+    SECONDS_PER_DAY,
+    PriceHistory,
+    from_stamp,
+    to_stamp,
+)
 
 
 DATE_TIME_FORMAT: str = "%Y-%m-%d %H:%M:%S"
+# Upper bound on the memoized date/time strings, for files with many intraday times.
+DATETIME_CACHE_SIZE: int = 100_000
+
+_STAMP_CACHE: dict[str, int] = {}
+_DAY_STRINGS: dict[int, str] = {}
+
+# The symbol and currency names, indexed by the ids held in the records.
+_NAMES: List[str] = []
+_NAME_IDS: dict[str, int] = {}
+_NAMES_LOCK = threading.Lock()
+
+
+def _name_id(name: str) -> int:
+    """The id of the name in the shared table. Adds the name if needed."""
+    name_id = _NAME_IDS.get(name)
+    if name_id is not None:
+        return name_id
+    with _NAMES_LOCK:
+        name_id = _NAME_IDS.get(name)
+        if name_id is None:
+            name_id = len(_NAMES)
+            _NAMES.append(intern(name))
+            _NAME_IDS[_NAMES[name_id]] = name_id
+        return name_id
+
+
+def _decimal_parts(value: Decimal) -> tuple[int, int]:
+    """The integer mantissa and the scale of the value."""
+    if not value.is_finite():
+        raise ValueError(f"The price must be a finite number. Got: '{value}'")
+    # From the digits, as scaleb() rounds to the precision of the context.
+    sign, digits, exponent = value.as_tuple()
+    mantissa = int("".join(map(str, digits)))
+    return -mantissa if sign else mantissa, -exponent
+
+
+def _format_day(ordinal: int) -> str:
+    """The ISO date for the day ordinal. Memoized, as the days repeat per symbol."""
+    text = _DAY_STRINGS.get(ordinal)
+    if text is None:
+        if len(_DAY_STRINGS) >= DATETIME_CACHE_SIZE:
+            _DAY_STRINGS.clear()
+        text = _DAY_STRINGS[ordinal] = date.fromordinal(ordinal).isoformat()
+    return text
 
 
 class PriceRecord:
-    """A row in the prices file"""
+    """
+    A row in the prices file.
+
+    The record is kept compact, as the files hold years of prices for hundreds
+    of symbols: the date/time is stored as whole seconds since 0001-01-01, the
+    value as an integer mantissa and a scale, and the symbol and currency as ids
+    into a shared table of names. The properties convert to and from
+    `datetime`, `Decimal` and `str`.
+    """
+
+    __slots__ = ("_stamp", "_mantissa", "_scale", "_symbol_id", "_currency_id")
 
     def __init__(
         self, datetime_val: datetime, symbol: str, value: Decimal, currency: str
     ):
-        self.datetime: datetime = datetime_val
-        self.symbol: str = symbol
-        self.value: Decimal = value
-        self.currency: str = currency
+        self.datetime = datetime_val
+        self.symbol = symbol
+        self.value = value
+        self.currency = currency
+
+    @property
+    def datetime(self) -> datetime:
+        """The date/time of the price. Microseconds and time zones are not kept."""
+        return from_stamp(self._stamp)
+
+    @datetime.setter
+    def datetime(self, value: datetime):
+        self._stamp = to_stamp(value)
+
+    @property
+    def stamp(self) -> int:
+        """The date/time as whole seconds since 0001-01-01. Sorts like the date/time."""
+        return self._stamp
+
+    @property
+    def mantissa(self) -> int:
+        """The value as an integer, scaled by 10 ** `scale`."""
+        return self._mantissa
+
+    @property
+    def scale(self) -> int:
+        """The number of decimal places of the value."""
+        return self._scale
+
+    @property
+    def value(self) -> Decimal:
+        # Exact, whatever the precision of the context.
+        sign, digits, _ = Decimal(self._mantissa).as_tuple()
+        return Decimal((sign, digits, -self._scale))
+
+    @value.setter
+    def value(self, value: Decimal):
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value))
+        self._mantissa, self._scale = _decimal_parts(value)
+
+    @property
+    def symbol(self) -> str:
+        return _NAMES[self._symbol_id]
+
+    @symbol.setter
+    def symbol(self, value: str):
+        self._symbol_id = _name_id(value)
+
+    @property
+    def currency(self) -> str:
+        return _NAMES[self._currency_id]
+
+    @currency.setter
+    def currency(self, value: str):
+        self._currency_id = _name_id(value)
 
     def __str__(self) -> str:
         """
@@ -31,10 +152,12 @@ class PriceRecord:
         Example: "P 2023-04-14 00:00:00 GBP 1.132283 EUR"
                  "P 2023-04-15 VEUR_AS 13.24 EUR" (if time is 00:00:00)
         """
-        if self.datetime.time() == dt_time(0, 0, 0):
-            date_time_string = self.datetime.strftime("%Y-%m-%d")
-        else:
-            date_time_string = self.datetime.strftime(DATE_TIME_FORMAT)
+        days, seconds = divmod(self._stamp, SECONDS_PER_DAY)
+        date_time_string = _format_day(days)
+        if seconds:
+            minutes, second = divmod(seconds, 60)
+            hour, minute = divmod(minutes, 60)
+            date_time_string = f"{date_time_string} {hour:02d}:{minute:02d}:{second:02d}"
 
         return f"P {date_time_string} {self.symbol} {self.value} {self.currency}"
 
@@ -44,6 +167,53 @@ class PriceRecord:
             f"value={self.value!r}, currency={self.currency!r})"
         )
 
+    @classmethod
+    def _from_parts(
+        cls, stamp: int, mantissa: int, scale: int, symbol: str, currency: str
+    ) -> "PriceRecord":
+        """Creates the record from the stored representation, used by the parser."""
+        record = cls.__new__(cls)
+        record._stamp = stamp
+        record._mantissa = mantissa
+        record._scale = scale
+        record._symbol_id = _name_id(symbol)
+        record._currency_id = _name_id(currency)
+        return record
+
+    @classmethod
+    def _from_columns(
+        cls,
+        stamps: List[int],
+        mantissas: List[int],
+        scales: List[int],
+        symbol: str,
+        currencies: List[str],
+    ) -> List["PriceRecord"]:
+        """Creates the records of one symbol from the stored columns, in bulk."""
+        new = cls.__new__
+        symbol_id = _name_id(symbol)
+        currency_ids = {name: _name_id(name) for name in set(currencies)}
+        records = []
+        append = records.append
+        for stamp, mantissa, scale, currency in zip(
+            stamps, mantissas, scales, currencies
+        ):
+            record = new(cls)
+            record._stamp = stamp
+            record._mantissa = mantissa
+            record._scale = scale
+            record._symbol_id = symbol_id
+            record._currency_id = currency_ids[currency]
+            append(record)
+        return records
+
+    def __reduce__(self):
+        # The name ids are only valid in this process.
+        return (
+            PriceRecord,
+            (self.datetime, self.symbol, self.value, self.currency),
+        )
+
     @classmethod
     def from_price_model(cls, item: Price) -> "PriceRecord":
         """
@@ -72,45 +242,89 @@ class PriceRecord:
         )
 
 
+def _is_iso_shape(date_time_str: str) -> bool:
+    """Whether the string has the shape of "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS"."""
+    length = len(date_time_str)
+    if length not in (10, 19) or date_time_str[4] != "-" or date_time_str[7] != "-":
+        return False
+    return length == 10 or (
+        date_time_str[10] == " "
+        and date_time_str[13] == ":"
+        and date_time_str[16] == ":"
+    )
+
+
+def _parse_stamp(date_time_str: str) -> int:
+    """
+    Parses "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS" into a record stamp.
+    The files repeat the same few thousand dates, so the results are memoized.
+    """
+    stamp = _STAMP_CACHE.get(date_time_str)
+    if stamp is not None:
+        return stamp
+
+    dt_val = None
+    if _is_iso_shape(date_time_str):
+        try:
+            dt_val = datetime.fromisoformat(date_time_str)
+        except ValueError:
+            pass
+    if dt_val is None or dt_val.tzinfo is not None:
+        # Not zero-padded, or otherwise off the fast path. fromisoformat accepts
+        # more than the file format, i.e. "20230414", so only the exact shapes
+        # take the fast path.
+        full_str = date_time_str if " " in date_time_str else f"{date_time_str} 00:00:00"
+        dt_val = datetime.strptime(full_str, DATE_TIME_FORMAT)
+
+    if len(_STAMP_CACHE) >= DATETIME_CACHE_SIZE:
+        _STAMP_CACHE.clear()
+    stamp = _STAMP_CACHE[date_time_str] = to_stamp(dt_val)
+    return stamp
+
+
+def _parse_value(value_str: str) -> tuple[int, int]:
+    """
+    Parses the price into the mantissa and the scale.
+    Plain decimals, as written by this module, skip the construction of a Decimal.
+    """
+    whole, _, fraction = value_str.partition(".")
+    digits = whole[1:] if whole[:1] == "-" else whole
+    if digits.isdecimal() and (not fraction or fraction.isdecimal()):
+        return int(whole + fraction), len(fraction)
+
+    try:
+        # rust_decimal::Decimal::from_str_exact
+        value = Decimal(value_str)
+    except InvalidOperation as e:
+        raise ValueError(f"Failed to parse decimal value: '{value_str}'") from e
+    return _decimal_parts(value)
+
+
 def _parse_with_time(items: List[str]) -> PriceRecord:
     # items: [date_str, time_str, symbol, value_str, currency]
     date_time_str = f"{items[0]} {items[1]}"
     try:
-        dt_val = datetime.strptime(date_time_str, DATE_TIME_FORMAT)
+        stamp = _parse_stamp(date_time_str)
     except ValueError as e:
         raise ValueError(
             f"Failed to parse date/time string: '{date_time_str}' - {e}"
         ) from e
 
-    try:
-        # rust_decimal::Decimal::from_str_exact
-        value = Decimal(items[3])
-    except InvalidOperation as e:
-        raise ValueError(f"Failed to parse decimal value: '{items[3]}'") from e
-
-    return PriceRecord(
-        datetime_val=dt_val, symbol=items[2], value=value, currency=items[4]
-    )
+    mantissa, scale = _parse_value(items[3])
+    return PriceRecord._from_parts(stamp, mantissa, scale, items[2], items[4])
 
 
 def _parse_with_no_time(items: List[str]) -> PriceRecord:
     # items: [date_str, symbol, value_str, currency]
-    date_time_str = f"{items[0]} 00:00:00"
     try:
-        dt_val = datetime.strptime(date_time_str, DATE_TIME_FORMAT)
+        stamp = _parse_stamp(items[0])
     except ValueError as e:
         raise ValueError(
-            f"Failed to parse date string: '{items[0]}' (interpreted as '{date_time_str}') - {e}"
+            f"Failed to parse date string: '{items[0]}' (interpreted as '{items[0]} 00:00:00') - {e}"
         )
 
-    try:
-        value = Decimal(items[2])
-    except InvalidOperation:
-        raise ValueError(f"Failed to parse decimal value: '{items[2]}'")
-
-    return PriceRecord(
-        datetime_val=dt_val, symbol=items[1], value=value, currency=items[3]
-    )
+    mantissa, scale = _parse_value(items[2])
+    return PriceRecord._from_parts(stamp, mantissa, scale, items[1], items[3])
 
 
 def _parse_line(line: str) -> PriceRecord:
@@ -138,14 +352,111 @@ def _parse_line(line: str) -> PriceRecord:
         )
 
 
-class PriceFlatFile:
+def write_atomic(file_path: Path, chunks: Iterable[bytes]):
+    """
+    Writes the chunks into a temporary file in the same directory and renames
+    it over the file, so that the file is never left truncated.
+    """
+    fd, temp_name = tempfile.mkstemp(
+        dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.writelines(chunks)
+            f.flush()
+            os.fsync(f.fileno())
+        if file_path.exists():
+            shutil.copymode(file_path, temp_name)
+        os.replace(temp_name, file_path)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def _map_file(file_path: Path):
+    """Memory-maps the file read-only. An empty file can not be mapped."""
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def _symbols_pattern(symbols: Iterable[str]) -> re.Pattern[bytes]:
+    """
+    Matches one of the symbols as a whole token.
+    The currency column can match too, so the parsed records still need checking.
+    """
+    alternatives = b"|".join(
+        re.escape(symbol.encode("utf-8"))
+        for symbol in sorted(symbols, key=len, reverse=True)
+    )
+    # No look-behind, so that the search can skip ahead on the literals.
+    return re.compile(rb"(?:" + alternatives + rb")(?=[ \t\r\n])")
+
+
+def _iter_lines(mm, pattern: re.Pattern[bytes] | None) -> Iterator[tuple[int, bytes]]:
+    """
+    Yields the start offset and the content of the lines in the mapped file.
+    With a pattern, only the lines containing a match are yielded.
+    """
+    if pattern is None:
+        start = 0
+        size = len(mm)
+        while start < size:
+            end = mm.find(b"\n", start)
+            if end < 0:
+                end = size
+            yield start, mm[start:end]
+            start = end + 1
+        return
+
+    next_line = 0
+    for match in pattern.finditer(mm):
+        if match.start() < next_line:
+            # Another match on a line that was already yielded.
+            continue
+        if mm[match.start() - 1 : match.start()] not in (b" ", b"\t"):
+            # Only the end of a longer token.
+            continue
+        start = mm.rfind(b"\n", 0, match.start()) + 1
+        end = mm.find(b"\n", match.end())
+        if end < 0:
+            end = len(mm)
+        yield start, mm[start:end]
+        next_line = end + 1
+
+
+def _iter_lines_reversed(mm) -> Iterator[bytes]:
+    """Yields the lines of the mapped file from the last one to the first."""
+    end = len(mm)
+    while end > 0:
+        start = mm.rfind(b"\n", 0, end) + 1
+        yield mm[start:end]
+        end = start - 1
+
+
+def _warn_malformed(file_path: Path, line_num: int, line_content: str, error):
+    print(
+        f"Warning: Skipping malformed line {line_num} in '{file_path}': \"{line_content}\" - {error}"
+    )
+
+
+class PriceFlatFile(PriceStore):
     """
     A handler for the prices file.
     """
 
     def __init__(self, file_path: Path, load_on_init: bool = False):
         self.file_path: Path = file_path
-        self.prices: Dict[str, PriceRecord] = {}
+        # All the price records.
+        self.history: PriceHistory = PriceHistory()
+        # The latest price per symbol, a view of the history.
+        self.prices: MutableMapping[str, PriceRecord] = self.history.latest
+        # Only the latest prices were loaded. The file must not be rewritten.
+        self.partial: bool = False
         if load_on_init:
             self._load_data()
 
@@ -158,11 +469,51 @@ class PriceFlatFile:
         instance._load_data()
         return instance
 
+    @classmethod
+    def load_latest(
+        cls, file_path: Path, symbols: Iterable[str] | None = None
+    ) -> "PriceFlatFile":
+        """
+        Loads only the latest price of each symbol, reading the file backwards
+        from the end, and stops once all the given symbols have been seen.
+        Assumes that the newer prices are further down in the file, as written
+        by `save` and `append`.
+        The history is partial, so the file can only be appended to.
+        """
+        instance = cls(file_path)
+        instance.partial = True
+        # The symbol tokens, to skip the other lines without parsing them.
+        wanted = None if symbols is None else {s.encode("utf-8") for s in symbols}
+        seen = set()
+
+        with _map_file(file_path) as mm:
+            for raw in _iter_lines_reversed(mm):
+                if wanted is not None and len(seen) >= len(wanted):
+                    break
+                parts = raw.split()
+                if len(parts) < 5 or parts[0] != b"P":
+                    continue
+                symbol = parts[-3]
+                if symbol in seen or (wanted is not None and symbol not in wanted):
+                    continue
+                try:
+                    record = _parse_line(raw.strip().decode("utf-8"))
+                except (UnicodeDecodeError, ValueError):
+                    # Reported by the full load.
+                    continue
+
+                seen.add(symbol)
+                instance.history.add(record)
+
+        return instance
+
     def _load_data(self):
-        """Internal method to read and parse the price file."""
+        """
+        Internal method to read and parse the price file.
+        The file is read line by line. All the records are kept in the history.
+        """
         try:
-            with open(self.file_path, "r", encoding="utf-8") as f:
-                content = f.read()
+            f = open(self.file_path, "r", encoding="utf-8")
         except FileNotFoundError as ex:
             # Corresponds to .expect("Error reading rates file")
             raise FileNotFoundError(
@@ -171,10 +522,19 @@ class PriceFlatFile:
         except Exception as e:
             raise IOError(f"Error reading rates file {self.file_path}: {e}") from e
 
-        self.prices.clear()  # Clear any existing prices
-        lines = content.splitlines()
+        self.history.clear()  # Clear any existing prices
+        self.partial = False
+
+        with f:
+            self._add_lines(f)
 
-        for line_num, line_content in enumerate(lines):
+    def _add_lines(self, lines: Iterable[str], first_line: int = 0) -> int:
+        """
+        Parses the lines into the history. `first_line` is the number of lines
+        before them in the file. Returns the number of the last line.
+        """
+        line_num = first_line
+        for line_num, line_content in enumerate(lines, first_line + 1):
             line_content = line_content.strip()
             if not line_content or line_content.startswith(
                 "#"
@@ -182,41 +542,160 @@ class PriceFlatFile:
                 continue
             try:
                 price_record = _parse_line(line_content)
-                # Last price for a symbol wins, as HashMap does in Rust
-                self.prices[price_record.symbol] = price_record
+                # The last record for a symbol and date/time wins.
+                self.history.add(price_record)
             except ValueError as e:
                 # In Rust, this would likely be a panic or logged error.
                 # Here, we print a warning and skip the line.
-                print(
-                    f"Warning: Skipping malformed line {line_num + 1} in '{self.file_path}': \"{line_content}\" - {e}"
-                )
+                _warn_malformed(self.file_path, line_num, line_content, e)
+        return line_num
 
-    def save(self):
-        """Saves the current prices to the file, ordered by date/time then symbol."""
-        # Order by date/time, then symbol
-        sorted_price_records: list[PriceRecord] = sorted(
-            self.prices.values(), key=lambda pr: (pr.datetime, pr.symbol)
-        )
+    def iter_records(self) -> Iterator[PriceRecord]:
+        """
+        Lazily yields all the records in file order, without loading the file.
+        """
+        return self.scan()
 
-        output_lines = [str(pr) for pr in sorted_price_records]
+    def scan(
+        self, symbols: Iterable[str] | None = None, since: date | None = None
+    ) -> Iterator[PriceRecord]:
+        """
+        Lazily yields the records for the given symbols, dated on or after `since`,
+        in file order. The history is not touched.
+        The file is memory-mapped and filtered on the raw bytes, so only the
+        matching lines are decoded and parsed.
+        """
+        wanted = None if symbols is None else set(symbols)
+        if wanted is not None and not wanted:
+            return
+
+        since_dt = None
+        since_key = None
+        if since is not None:
+            since_dt = (
+                since
+                if isinstance(since, datetime)
+                else datetime.combine(since, dt_time(0, 0))
+            )
+            since_key = since_dt.strftime("%Y-%m-%d").encode("ascii")
+
+        pattern = None if wanted is None else _symbols_pattern(wanted)
+
+        with _map_file(self.file_path) as mm:
+            for offset, raw in _iter_lines(mm, pattern):
+                raw = raw.strip()
+                if not raw or raw.startswith(b"#"):
+                    continue
+                if since_key is not None:
+                    # ISO dates compare as bytes. Unpadded dates are checked after parsing.
+                    date_token = raw.split(None, 2)[1:2]
+                    if (
+                        date_token
+                        and len(date_token[0]) == len(since_key)
+                        and date_token[0] < since_key
+                    ):
+                        continue
+
+                line_content = raw.decode("utf-8", errors="replace")
+                try:
+                    record = _parse_line(line_content)
+                except ValueError as e:
+                    line_num = mm[:offset].count(b"\n") + 1
+                    _warn_malformed(self.file_path, line_num, line_content, e)
+                    continue
+
+                if wanted is not None and record.symbol not in wanted:
+                    continue
+                if since_dt is not None and record.datetime < since_dt:
+                    continue
+                yield record
+
+    def as_of(self, symbol: str, when: datetime) -> PriceRecord | None:
+        series = self.history.series(symbol)
+        return series.as_of(when) if series is not None else None
+
+    def dates(self, symbol: str) -> List[date]:
+        series = self.history.series(symbol)
+        if series is None:
+            return []
+        ordinals = dict.fromkeys(stamp // SECONDS_PER_DAY for stamp in series.stamps)
+        return [date.fromordinal(ordinal) for ordinal in ordinals]
+
+    def add(self, records: Iterable[PriceRecord]):
+        """Adds the records to the history. The file is written by `save`."""
+        for record in records:
+            self.history.add(record)
 
-        output_content = "\n".join(output_lines)
-        if (
-            output_lines
-        ):  # Add a trailing newline if there's content, matching Rust behavior
-            output_content += "\n"
+    def save(self):
+        """
+        Saves all the prices to the file, ordered by date/time then symbol.
+        The history is already sorted per symbol, so the series are only merged.
+        """
+        if self.partial:
+            raise IOError(
+                f"Only the latest prices of {self.file_path} were loaded, "
+                "so the file can not be rewritten"
+            )
+        self.write(self.history)
+
+    def write(self, records: Iterable[PriceRecord]):
+        """Replaces the content of the file with the records, in the given order."""
+        # Every line ends with a newline, matching Rust behavior.
+        output_lines = (f"{pr}\n" for pr in records)
 
         try:
-            with open(self.file_path, "w", encoding="utf-8") as f:
-                f.write(output_content)
+            self._write_atomic(output_lines)
         except IOError as e:
             # Corresponds to .expect("saved successfully")
             raise IOError(f"Failed to save prices to {self.file_path}: {e}") from e
 
+    def _write_atomic(self, lines: Iterable[str]):
+        """
+        Writes the lines into a temporary file next to the price file and then
+        renames it over the price file, so that the file is never left truncated.
+        """
+        write_atomic(self.file_path, (line.encode("utf-8") for line in lines))
+
+    def append(self, records: Iterable[PriceRecord]):
+        """
+        Appends the records to the end of the file, and to the history.
+        The file is flushed to disk, so the cost does not depend on the file size.
+        The file is no longer sorted afterwards. Use `compact` to re-sort it.
+        """
+        records = list(records)
+        if not records:
+            return
+
+        content = "".join(f"{pr}\n" for pr in records)
+
+        try:
+            with open(self.file_path, "a+b") as f:
+                # Start on a new line if the last line is not terminated.
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        content = "\n" + content
+                f.write(content.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+        except IOError as e:
+            raise IOError(f"Failed to append prices to {self.file_path}: {e}") from e
+
+        for record in records:
+            self.history.add(record)
+
+    def compact(self):
+        """
+        Rewrites the file in canonical order: sorted by date/time and symbol,
+        with one record per symbol and date/time.
+        """
+        self._load_data()
+        self.save()
+
     # Helper for tests, similar to direct manipulation in Rust tests
     def add_price_record(self, record: PriceRecord):
-        """Adds or updates a price record in the internal dictionary."""
-        self.prices[record.symbol] = record
+        """Adds or updates a price record in the history."""
+        self.history.add(record)
 
     @staticmethod
     def default() -> "PriceFlatFile":
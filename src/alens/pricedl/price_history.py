@@ -0,0 +1,198 @@
+"""
+In-memory store of the full price history.
+
+Holds every price record, one per (symbol, date/time), in per-symbol series
+sorted by date/time. The latest price per symbol is available as a dictionary-
+like view.
+"""
+
+import heapq
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Iterator, KeysView, List, MutableMapping
+
+if TYPE_CHECKING:
+    from alens.pricedl.price_flat_file import PriceRecord
+
+
+SECONDS_PER_DAY = 86_400
+
+
+def to_stamp(value: date) -> int:
+    """
+    The date/time as whole seconds since 0001-01-01. A date is taken at midnight.
+    Microseconds and the time zone are dropped, as the price file has neither.
+    """
+    if not isinstance(value, datetime):
+        return value.toordinal() * SECONDS_PER_DAY
+    return (
+        value.toordinal() * SECONDS_PER_DAY
+        + value.hour * 3600
+        + value.minute * 60
+        + value.second
+    )
+
+
+def from_stamp(stamp: int) -> datetime:
+    """The date/time for the seconds since 0001-01-01."""
+    days, seconds = divmod(stamp, SECONDS_PER_DAY)
+    result = datetime.fromordinal(days)
+    return result + timedelta(seconds=seconds) if seconds else result
+
+
+class PriceSeries:
+    """
+    The prices of one symbol, sorted by date/time, one record per date/time.
+    The records are keyed by their integer stamps.
+    """
+
+    __slots__ = ("_keys", "_records")
+
+    def __init__(self):
+        self._keys: List[int] = []
+        self._records: List["PriceRecord"] = []
+
+    def add(self, record: "PriceRecord"):
+        """
+        Adds the record. Replaces an existing record with the same date/time.
+        Appending in chronological order is O(1).
+        """
+        key = record.stamp
+        keys = self._keys
+
+        if not keys or key > keys[-1]:
+            keys.append(key)
+            self._records.append(record)
+            return
+
+        index = bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            self._records[index] = record
+        else:
+            keys.insert(index, key)
+            self._records.insert(index, record)
+
+    @classmethod
+    def from_sorted(
+        cls, records: List["PriceRecord"], stamps: List[int] | None = None
+    ) -> "PriceSeries":
+        """
+        The series of records already sorted by date/time, one per date/time.
+        The stamps of the records can be passed, if known.
+        """
+        series = cls()
+        series._keys = (
+            stamps if stamps is not None else [record.stamp for record in records]
+        )
+        series._records = records
+        return series
+
+    @property
+    def stamps(self) -> List[int]:
+        """The stamps of the records, in order. Not to be modified."""
+        return self._keys
+
+    def latest(self) -> "PriceRecord":
+        """The most recent record."""
+        return self._records[-1]
+
+    def as_of(self, when: datetime) -> "PriceRecord | None":
+        """The record in effect at the given date/time, if any."""
+        index = bisect_right(self._keys, to_stamp(when))
+        return self._records[index - 1] if index else None
+
+    def between(self, start: datetime, end: datetime) -> List["PriceRecord"]:
+        """The records from `start` to `end`, inclusive."""
+        return self._records[
+            bisect_left(self._keys, to_stamp(start)) : bisect_right(
+                self._keys, to_stamp(end)
+            )
+        ]
+
+    def __iter__(self) -> Iterator["PriceRecord"]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+class LatestPrices(MutableMapping[str, "PriceRecord"]):
+    """
+    The latest price per symbol, as a view of the price history.
+    Setting a price adds it to the history. If the history holds a more recent
+    price for the symbol, that one remains the latest.
+    Deleting a symbol removes its whole history.
+    """
+
+    def __init__(self, history: "PriceHistory"):
+        self._history = history
+
+    def __getitem__(self, symbol: str) -> "PriceRecord":
+        series = self._history.series(symbol)
+        if series is None:
+            raise KeyError(symbol)
+        return series.latest()
+
+    def __setitem__(self, symbol: str, record: "PriceRecord"):
+        if record.symbol != symbol:
+            raise ValueError(
+                f"The record for {record.symbol} can not be stored as {symbol}"
+            )
+        self._history.add(record)
+
+    def __delitem__(self, symbol: str):
+        self._history.remove(symbol)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._history.symbols())
+
+    def __len__(self) -> int:
+        return len(self._history.symbols())
+
+
+class PriceHistory:
+    """
+    All the price records, keyed by (symbol, date/time).
+    """
+
+    def __init__(self):
+        self._series: Dict[str, PriceSeries] = {}
+        self.latest = LatestPrices(self)
+
+    def add(self, record: "PriceRecord"):
+        """Adds the record, replacing any record for the same symbol and date/time."""
+        series = self._series.get(record.symbol)
+        if series is None:
+            series = self._series[record.symbol] = PriceSeries()
+        series.add(record)
+
+    def set_series(self, symbol: str, series: PriceSeries):
+        """Replaces all the prices for the symbol."""
+        self._series[symbol] = series
+
+    def series(self, symbol: str) -> PriceSeries | None:
+        """The price series for the symbol."""
+        return self._series.get(symbol)
+
+    def symbols(self) -> KeysView[str]:
+        """The symbols in the history."""
+        return self._series.keys()
+
+    def remove(self, symbol: str):
+        """Removes all the prices for the symbol."""
+        del self._series[symbol]
+
+    def clear(self):
+        """Removes all the prices."""
+        self._series.clear()
+
+    def __len__(self) -> int:
+        """The number of records."""
+        return sum(len(series) for series in self._series.values())
+
+    def __iter__(self) -> Iterator["PriceRecord"]:
+        """All the records, ordered by date/time, then symbol."""
+        return heapq.merge(
+            *(iter(series) for series in self._series.values()),
+            key=lambda record: (record.stamp, record.symbol),
+        )
@@ -0,0 +1,240 @@
+"""
+Per-symbol index of the price file, for point-in-time lookups.
+
+The index holds, for every symbol, the sorted stamps of its prices and the
+offsets of their lines in the file. A lookup bisects the stamps and parses the
+one line. The index is saved next to the price file (`prices.txt.idx`), keyed
+by the file's mtime and size, and is rebuilt when the file changes.
+
+Sidecar layout (little-endian):
+    magic, mtime_ns (q), size (q), symbol count (I)
+    per symbol: name length (H), name (UTF-8), price count (I), data offset (q)
+    per symbol, at its data offset: stamps (q * count), line offsets (q * count)
+"""
+
+import struct
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime, time as dt_time
+from pathlib import Path
+from typing import Dict, Tuple
+
+from loguru import logger
+
+from alens.pricedl.price_flat_file import (
+    PriceRecord,
+    _iter_lines,
+    _map_file,
+    _parse_line,
+    _parse_stamp,
+    write_atomic,
+)
+from alens.pricedl.price_history import to_stamp
+
+MAGIC = b"PRICEIDX1\n"
+HEADER = struct.Struct("<qqI")
+ENTRY = struct.Struct("<Iq")
+NAME_LENGTH = struct.Struct("<H")
+
+
+def get_index_path(prices_path: Path) -> Path:
+    """The sidecar index for the price file."""
+    return prices_path.with_name(f"{prices_path.name}.idx")
+
+
+def _file_key(prices_path: Path) -> Tuple[int, int]:
+    stat = prices_path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+class PriceIndex:
+    """
+    The sorted stamps and line offsets per symbol in the price file.
+    """
+
+    def __init__(
+        self,
+        prices_path: Path,
+        key: Tuple[int, int],
+        series: Dict[str, Tuple[array, array]],
+    ):
+        self.prices_path = prices_path
+        # (mtime_ns, size) of the indexed file.
+        self.key = key
+        self._series = series
+        # The sidecar file and its table of contents, when read from disk.
+        self._data: bytes = b""
+        self._toc: Dict[str, Tuple[int, int]] = {}
+
+    @classmethod
+    def open(cls, prices_path: Path) -> "PriceIndex":
+        """
+        Loads the sidecar index if it matches the price file, or else builds
+        the index and saves it.
+        """
+        key = _file_key(prices_path)
+        index_path = get_index_path(prices_path)
+
+        index = cls.read(index_path, prices_path)
+        if index is not None and index.key == key:
+            return index
+
+        index = cls.build(prices_path)
+        try:
+            index.write(index_path)
+        except OSError as e:
+            logger.debug(f"Could not save the price index {index_path}: {e}")
+        return index
+
+    @classmethod
+    def build(cls, prices_path: Path) -> "PriceIndex":
+        """
+        Indexes the price file. Only the date and symbol of each line are parsed.
+        Lines that can not be indexed are left out.
+        """
+        key = _file_key(prices_path)
+        entries: Dict[str, Dict[int, int]] = {}
+
+        with _map_file(prices_path) as mm:
+            for offset, raw in _iter_lines(mm, None):
+                parts = raw.split()
+                if len(parts) not in (5, 6) or parts[0] != b"P":
+                    continue
+                try:
+                    # The date, and the time if present.
+                    stamp = _parse_stamp(b" ".join(parts[1:-3]).decode("ascii"))
+                except (UnicodeDecodeError, ValueError):
+                    continue
+                symbol = parts[-3].decode("utf-8", errors="replace")
+                # The last line for a symbol and date/time wins.
+                entries.setdefault(symbol, {})[stamp] = offset
+
+        series = {}
+        for symbol, offsets in entries.items():
+            stamps = sorted(offsets)
+            series[symbol] = (
+                array("q", stamps),
+                array("q", (offsets[stamp] for stamp in stamps)),
+            )
+        return cls(prices_path, key, series)
+
+    @classmethod
+    def read(cls, index_path: Path, prices_path: Path) -> "PriceIndex | None":
+        """
+        Reads the sidecar index. Returns None if it is missing or unreadable.
+        Only the table of contents is parsed. The series are loaded on first use.
+        The file is not kept open, so that it can be replaced at any time.
+        """
+        try:
+            data = index_path.read_bytes()
+        except OSError:
+            return None
+        if data[: len(MAGIC)] != MAGIC:
+            return None
+
+        try:
+            position = len(MAGIC)
+            mtime_ns, size, count = HEADER.unpack_from(data, position)
+            position += HEADER.size
+
+            toc = {}
+            for _ in range(count):
+                (name_length,) = NAME_LENGTH.unpack_from(data, position)
+                position += NAME_LENGTH.size
+                name = data[position : position + name_length].decode("utf-8")
+                position += name_length
+                toc[name] = ENTRY.unpack_from(data, position)
+                position += ENTRY.size
+        except (struct.error, UnicodeDecodeError):
+            return None
+
+        index = cls(prices_path, (mtime_ns, size), {})
+        index._data = data
+        index._toc = toc
+        return index
+
+    def _get_series(self, symbol: str) -> Tuple[array, array] | None:
+        series = self._series.get(symbol)
+        if series is not None or symbol not in self._toc:
+            return series
+
+        length, data_offset = self._toc[symbol]
+        stamps = array("q")
+        stamps.frombytes(self._data[data_offset : data_offset + 8 * length])
+        offsets = array("q")
+        offsets.frombytes(
+            self._data[data_offset + 8 * length : data_offset + 16 * length]
+        )
+        series = self._series[symbol] = (stamps, offsets)
+        return series
+
+    def write(self, index_path: Path):
+        """Saves the index, replacing the sidecar file atomically."""
+        symbols = list(self.symbols())
+        names = [name.encode("utf-8") for name in symbols]
+        toc_size = sum(NAME_LENGTH.size + len(name) + ENTRY.size for name in names)
+
+        header = [MAGIC, HEADER.pack(*self.key, len(names))]
+        blocks = []
+        data_offset = len(MAGIC) + HEADER.size + toc_size
+        for symbol, name in zip(symbols, names):
+            stamps, offsets = self._get_series(symbol)
+            header.append(NAME_LENGTH.pack(len(name)) + name)
+            header.append(ENTRY.pack(len(stamps), data_offset))
+            blocks.append(stamps.tobytes() + offsets.tobytes())
+            data_offset += 16 * len(stamps)
+
+        write_atomic(index_path, header + blocks)
+
+    def symbols(self):
+        """The indexed symbols."""
+        return self._toc.keys() if self._toc else self._series.keys()
+
+    def as_of(self, symbol: str, when: datetime | None = None) -> PriceRecord | None:
+        """
+        The price of the symbol in effect at the given date/time, or the latest
+        price. Only the line of the price is read from the file.
+        Lines that do not parse are skipped, with a warning, and the price
+        before them is used.
+        """
+        series = self._get_series(symbol)
+        if series is None:
+            return None
+        stamps, offsets = series
+
+        position = len(stamps) if when is None else bisect_right(stamps, to_stamp(when))
+        with open(self.prices_path, "rb") as f:
+            for offset in reversed(offsets[:position]):
+                f.seek(offset)
+                line = f.readline().decode("utf-8", errors="replace").strip()
+                try:
+                    record = _parse_line(line)
+                except ValueError as e:
+                    logger.warning(
+                        f"Skipping malformed line in '{self.prices_path}': \"{line}\" - {e}"
+                    )
+                    continue
+                if record.symbol == symbol:
+                    return record
+                logger.warning(
+                    f"The price index of '{self.prices_path}' is out of date: \"{line}\""
+                )
+        return None
+
+
+def end_of_day(on: date) -> datetime:
+    """The last second of the day. A date/time is returned as is."""
+    if isinstance(on, datetime):
+        return on
+    return datetime.combine(on, dt_time(23, 59, 59))
+
+
+def get_price(
+    prices_path: Path, symbol: str, on: date | None = None
+) -> PriceRecord | None:
+    """
+    The price of the symbol in effect on the given day (its last price up to the
+    end of that day), or the latest price. Uses the sidecar index.
+    """
+    when = end_of_day(on) if on is not None else None
+    return PriceIndex.open(prices_path).as_of(symbol, when)
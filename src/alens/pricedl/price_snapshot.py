@@ -0,0 +1,262 @@
+"""
+Binary snapshot of the parsed price file, for a fast start.
+
+The snapshot is saved next to the price file (`prices.txt.snapshot`) and holds
+the records as columns, along with the mtime, size and hash of the text it was
+parsed from. When the price file is unchanged, the records are restored from
+the snapshot without parsing. When lines were only appended, just the new tail
+is parsed.
+
+Snapshot layout (little-endian):
+    magic, mtime_ns (q), size (q), lines (q), BLAKE2b digest (16s),
+    names length (I), series count (I), record count (q)
+    names: the symbol and currency names, UTF-8, separated by newlines
+    per series: symbol name index (I), record count (I)
+    per record, as columns: stamps (q), mantissas (q), scales (b),
+        currency name indices (I)
+"""
+
+import hashlib
+import struct
+from array import array
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from loguru import logger
+
+from alens.pricedl.price_flat_file import (
+    PriceFlatFile,
+    PriceRecord,
+    _map_file,
+    write_atomic,
+)
+from alens.pricedl.price_history import PriceHistory, PriceSeries
+
+MAGIC = b"PRICESNAP1\n"
+HEADER = struct.Struct("<qqq16sIIq")
+SERIES = struct.Struct("<II")
+
+
+def get_snapshot_path(prices_path: Path) -> Path:
+    """The snapshot file for the price file."""
+    return prices_path.with_name(f"{prices_path.name}.snapshot")
+
+
+def _digest(data, size: int) -> bytes:
+    """The hash of the first `size` bytes."""
+    with memoryview(data) as view:
+        return hashlib.blake2b(view[:size], digest_size=16).digest()
+
+
+class Snapshot:
+    """The records of the price file, with the state of the text they came from."""
+
+    def __init__(
+        self,
+        mtime_ns: int,
+        size: int,
+        lines: int,
+        digest: bytes,
+        history: PriceHistory,
+    ):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        # The number of lines in the first `size` bytes.
+        self.lines = lines
+        self.digest = digest
+        self.history = history
+
+    @classmethod
+    def read(cls, snapshot_path: Path) -> "Snapshot | None":
+        """Reads the snapshot. Returns None if it is missing or unreadable."""
+        try:
+            data = snapshot_path.read_bytes()
+        except OSError:
+            return None
+        if not data.startswith(MAGIC):
+            return None
+
+        try:
+            position = len(MAGIC)
+            mtime_ns, size, lines, digest, names_length, series_count, count = (
+                HEADER.unpack_from(data, position)
+            )
+            position += HEADER.size
+
+            names = data[position : position + names_length].decode("utf-8")
+            names = names.split("\n")
+            position += names_length
+
+            series_table = [
+                SERIES.unpack_from(data, position + i * SERIES.size)
+                for i in range(series_count)
+            ]
+            position += series_count * SERIES.size
+
+            columns = []
+            for typecode in ("q", "q", "b", "I"):
+                column = array(typecode)
+                end = position + column.itemsize * count
+                column.frombytes(data[position:end])
+                if len(column) != count:
+                    return None
+                columns.append(column)
+                position = end
+        except (struct.error, UnicodeDecodeError, ValueError):
+            return None
+
+        stamps, mantissas, scales, currency_indices = columns
+        history = PriceHistory()
+        start = 0
+        try:
+            for symbol_index, length in series_table:
+                symbol = names[symbol_index]
+                end = start + length
+                series_stamps = stamps[start:end].tolist()
+                records = PriceRecord._from_columns(
+                    series_stamps,
+                    mantissas[start:end].tolist(),
+                    scales[start:end].tolist(),
+                    symbol,
+                    [names[i] for i in currency_indices[start:end]],
+                )
+                history.set_series(
+                    symbol, PriceSeries.from_sorted(records, series_stamps)
+                )
+                start = end
+        except IndexError:
+            return None
+
+        return cls(mtime_ns, size, lines, digest, history)
+
+    def write(self, snapshot_path: Path):
+        """
+        Saves the snapshot, replacing the file atomically.
+        Raises OverflowError if a value does not fit the columns.
+        """
+        name_ids: Dict[str, int] = {}
+        series_table: List[Tuple[int, int]] = []
+        stamps = array("q")
+        mantissas = array("q")
+        scales = array("b")
+        currencies = array("I")
+
+        for symbol in self.history.symbols():
+            series = self.history.series(symbol)
+            series_table.append(
+                (name_ids.setdefault(symbol, len(name_ids)), len(series))
+            )
+            stamps.extend(series.stamps)
+            mantissas.extend([record.mantissa for record in series])
+            scales.extend([record.scale for record in series])
+            currencies.extend(
+                [name_ids.setdefault(record.currency, len(name_ids)) for record in series]
+            )
+
+        names = "\n".join(name_ids).encode("utf-8")
+        header = HEADER.pack(
+            self.mtime_ns,
+            self.size,
+            self.lines,
+            self.digest,
+            len(names),
+            len(series_table),
+            len(stamps),
+        )
+        table = b"".join(SERIES.pack(*entry) for entry in series_table)
+
+        write_atomic(
+            snapshot_path,
+            [
+                MAGIC,
+                header,
+                names,
+                table,
+                stamps.tobytes(),
+                mantissas.tobytes(),
+                scales.tobytes(),
+                currencies.tobytes(),
+            ],
+        )
+
+
+class SnapshotPriceFile(PriceFlatFile):
+    """
+    The price file, loaded through the binary snapshot when it is still valid.
+    The snapshot is refreshed after loading changed text and after saving.
+    """
+
+    def _load_data(self):
+        snapshot_path = get_snapshot_path(self.file_path)
+        snapshot = Snapshot.read(snapshot_path)
+
+        if snapshot is not None and self._restore(snapshot):
+            if snapshot.size == self.file_path.stat().st_size:
+                logger.debug(f"Loaded the prices from {snapshot_path}")
+                return
+            lines = self._load_tail(snapshot)
+            logger.debug(f"Loaded the prices from {snapshot_path} and the new lines")
+        else:
+            super()._load_data()
+            lines = None
+
+        self._write_snapshot(lines)
+
+    def _restore(self, snapshot: Snapshot) -> bool:
+        """
+        Uses the snapshot if the price file is unchanged (same mtime and size),
+        or if it still starts with the text the snapshot was made from (same
+        hash), ending on a whole line.
+        """
+        stat = self.file_path.stat()
+        unchanged = (
+            stat.st_mtime_ns == snapshot.mtime_ns and stat.st_size == snapshot.size
+        )
+
+        if not unchanged:
+            if stat.st_size < snapshot.size:
+                return False
+            with _map_file(self.file_path) as mm:
+                if stat.st_size > snapshot.size and snapshot.size:
+                    # The last line may have been extended.
+                    if mm[snapshot.size - 1 : snapshot.size] != b"\n":
+                        return False
+                if _digest(mm, snapshot.size) != snapshot.digest:
+                    return False
+
+        self.history = snapshot.history
+        self.prices = self.history.latest
+        return True
+
+    def _load_tail(self, snapshot: Snapshot) -> int:
+        """Parses the lines appended after the snapshot. Returns the line count."""
+        with open(self.file_path, "rb") as f:
+            f.seek(snapshot.size)
+            return self._add_lines(
+                (raw.decode("utf-8") for raw in f), first_line=snapshot.lines
+            )
+
+    def save(self):
+        super().save()
+        self._write_snapshot(None)
+
+    def _write_snapshot(self, lines: int | None):
+        """
+        Saves the snapshot of the history, for the current content of the file.
+        Without the line count, the lines are counted.
+        """
+        snapshot_path = get_snapshot_path(self.file_path)
+        try:
+            stat = self.file_path.stat()
+            with _map_file(self.file_path) as mm:
+                digest = _digest(mm, stat.st_size)
+                if lines is None:
+                    lines = mm[: stat.st_size].count(b"\n")
+                    if stat.st_size and mm[stat.st_size - 1 : stat.st_size] != b"\n":
+                        lines += 1
+
+            Snapshot(stat.st_mtime_ns, stat.st_size, lines, digest, self.history).write(
+                snapshot_path
+            )
+        except (OSError, OverflowError) as e:
+            logger.debug(f"Could not save the price snapshot {snapshot_path}: {e}")
@@ -0,0 +1,54 @@
+"""
+The storage for the price history.
+
+The backends are the Ledger price file (`PriceFlatFile`) and a SQLite database
+(`SqlitePriceStore`), selected with the `price_database_path` setting.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Iterable, List, Mapping
+
+if TYPE_CHECKING:
+    from alens.pricedl.price_flat_file import PriceRecord
+
+
+class PriceStore(ABC):
+    """
+    A price history, one record per symbol and date/time.
+    The latest price per symbol is available as the `prices` mapping.
+    """
+
+    prices: Mapping[str, "PriceRecord"]
+
+    @abstractmethod
+    def as_of(self, symbol: str, when: datetime) -> "PriceRecord | None":
+        """The price in effect at the given date/time, if any."""
+
+    @abstractmethod
+    def dates(self, symbol: str) -> List[date]:
+        """The dates with a price for the symbol, in order."""
+
+    @abstractmethod
+    def add(self, records: Iterable["PriceRecord"]):
+        """
+        Adds the records, replacing those for the same symbol and date/time.
+        The records are persisted at the latest by `save`.
+        """
+
+    @abstractmethod
+    def append(self, records: Iterable["PriceRecord"]):
+        """Adds the records and persists them right away."""
+
+    @abstractmethod
+    def save(self):
+        """Persists the added records."""
+
+    def close(self):
+        """Releases the storage."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -6,51 +6,354 @@ Based on [Price Database](https://gitlab.com/alensiljak/price-database),
 Python library.
 """
 
+import asyncio
 import logging
 from abc import ABC, abstractmethod
-from typing import List, Optional
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Tuple
 
+import requests
 from loguru import logger
 
+from .config import PriceDbConfig
 from .model import Price, SecuritySymbol
+from .ratelimit import create_rate_limiter
+from .retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    call_with_retries,
+    call_with_retries_async,
+    create_circuit_breaker,
+    create_retry_policy,
+)
+from .session import create_session
 
 
 class Downloader(ABC):
     """Base class for all the downloaders."""
 
+    # The number of symbols that can be fetched with one `download_many` call.
+    batch_size: int = 1
+
+    _session: requests.Session | None = None
+
+    @property
+    def session(self) -> requests.Session:
+        """The HTTP session used for the requests. Created on first use."""
+        if self._session is None:
+            self._session = create_session()
+        return self._session
+
+    @session.setter
+    def session(self, value: requests.Session):
+        self._session = value
+
     @abstractmethod
     def download(self, security_symbol: SecuritySymbol, currency: str) -> Price:
         """Download price for the given security symbol and currency."""
         pass
 
+    async def download_async(
+        self, security_symbol: SecuritySymbol, currency: str
+    ) -> Price:
+        """
+        Async variant of `download`.
+        The default implementation runs the blocking download in a worker thread,
+        so that multiple downloads can be awaited concurrently.
+        Downloaders with a native async client can override this.
+        """
+        return await asyncio.to_thread(self.download, security_symbol, currency)
+
+    def download_many(
+        self, security_symbols: List[SecuritySymbol], currency: str
+    ) -> List[Price]:
+        """
+        Download prices for multiple symbols.
+        The default implementation downloads them one by one. Downloaders that can
+        fetch several symbols in one request override this.
+        Symbols without a price are omitted from the result.
+        """
+        result = []
+        for security_symbol in security_symbols:
+            price = self.download(security_symbol, currency)
+            price.symbol = security_symbol
+            result.append(price)
+        return result
+
+    async def download_many_async(
+        self, security_symbols: List[SecuritySymbol], currency: str
+    ) -> List[Price]:
+        """Async variant of `download_many`."""
+        return await asyncio.to_thread(self.download_many, security_symbols, currency)
+
+    def download_history(
+        self, security_symbol: SecuritySymbol, currency: str, start: date, end: date
+    ) -> List[Price]:
+        """
+        Download the daily prices from `start` to `end`, inclusive, preferably
+        in one request. Not all the providers offer historical prices.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not provide historical prices"
+        )
+
+    async def download_history_async(
+        self, security_symbol: SecuritySymbol, currency: str, start: date, end: date
+    ) -> List[Price]:
+        """Async variant of `download_history`."""
+        return await asyncio.to_thread(
+            self.download_history, security_symbol, currency, start, end
+        )
+
+
+def create_downloader(source: str | None, config: PriceDbConfig) -> Downloader:
+    """Create the downloader for the given source (updater)."""
+    from alens.pricedl.quotes.yahoo_finance_downloader import YahooFinanceDownloader
+
+    source = source.lower() if source else None
+    if source == "yahoo_finance":
+        logging.debug("using yahoo finance")
+        options = config.get_updater_config("yahoo_finance")
+        return YahooFinanceDownloader(batch_size=options.get("batch_size"))
+
+    # elif source == "yfinance":
+    #     logging.debug("using yfinance")
+    #     from .quotes.yfinance import YfinanceDownloader
+
+    #     return YfinanceDownloader()
+    elif source == "ecb":
+        logging.debug("using ecb")
+        from .quotes.ecb import EcbDownloader
+
+        return EcbDownloader()
+    elif source == "fixerio":
+        logging.debug("using fixerio")
+        from .quotes.fixerio import Fixerio
+
+        return Fixerio()
+    elif source == "vanguard_au":
+        logging.debug("using vanguard")
+        from .quotes.vanguard_au_2023_detail import VanguardAu3Downloader
+
+        return VanguardAu3Downloader()
+    else:
+        raise ValueError(f"unknown downloader: {source}")
+
+
+class DownloaderRegistry:
+    """
+    Holds one downloader per source (updater) for the duration of a run.
+    Each downloader gets its own pooled HTTP session, so that all the symbols for
+    the same provider reuse the open connections, and a rate limiter, which keeps
+    the requests within the rate the provider tolerates.
+    The circuit breakers are also kept per source, for the whole run.
+    """
+
+    def __init__(self, config: PriceDbConfig | None = None):
+        self.config = config or PriceDbConfig()
+        self._downloaders: Dict[str, Downloader] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, source: str | None) -> Downloader:
+        """Get the downloader for the source, creating it on first use."""
+        key = source.lower() if source else ""
+
+        with self._lock:
+            downloader = self._downloaders.get(key)
+            if downloader is None:
+                downloader = create_downloader(source, self.config)
+
+                options = self.config.get_updater_config(key)
+                downloader.session = create_session(
+                    pool_connections=options.get("pool_connections"),
+                    pool_maxsize=options.get("pool_maxsize"),
+                    limiter=create_rate_limiter(key, options),
+                )
+                self._downloaders[key] = downloader
+
+        return downloader
+
+    def get_circuit_breaker(self, source: str | None) -> CircuitBreaker:
+        """The circuit breaker for the source, shared by all the downloads."""
+        key = source.lower() if source else ""
+
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                options = self.config.get_updater_config(key)
+                breaker = create_circuit_breaker(key, options)
+                self._breakers[key] = breaker
+
+        return breaker
+
+    def get_retry_policy(self, source: str | None) -> RetryPolicy:
+        """The retry policy for the source."""
+        key = source.lower() if source else ""
+        return create_retry_policy(self.config.get_updater_config(key))
+
+    def close(self):
+        """Close the HTTP sessions of all the downloaders."""
+        with self._lock:
+            for downloader in self._downloaders.values():
+                downloader.session.close()
+            self._downloaders.clear()
+
+    def __enter__(self) -> "DownloaderRegistry":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
 
 class Quote:
     """
     The price downloading facade.
+    Transient download errors are retried. A provider that keeps failing is
+    cut off by its circuit breaker, which raises CircuitOpenError.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        config: PriceDbConfig | None = None,
+        registry: DownloaderRegistry | None = None,
+    ):
         self.symbol: str | None = None
         self.exchange: str | None = None
         self.source: Optional[str] = None
         self.currency: Optional[str] = None
+        self._config = config or (registry.config if registry else None)
+        # When set, the downloaders are shared through the registry.
+        self.registry = registry
+        self._breaker: CircuitBreaker | None = None
+
+    @property
+    def config(self) -> PriceDbConfig:
+        """The configuration, loaded on first use."""
+        if self._config is None:
+            self._config = PriceDbConfig()
+        return self._config
 
     def fetch(self, exchange: str, symbols: List[str]) -> List[Price]:
-        """Fetch prices for the given symbols."""
-        result = []
+        """
+        Fetch prices for the given symbols.
+        The whole list is passed to the downloader, which can fetch it in batches.
+        """
+        sec_symbols = [SecuritySymbol(exchange, symbol) for symbol in symbols]
+        downloader, currency = self._prepare_download(sec_symbols)
+
+        try:
+            prices = call_with_retries(
+                lambda: downloader.download_many(sec_symbols, currency),
+                self._get_retry_policy(),
+                self.get_circuit_breaker(),
+            )
+        except CircuitOpenError:
+            raise
+        except Exception as error:
+            raise ConnectionError(f"Error downloading prices: {error}") from error
 
-        for symbol in symbols:
-            # logging.debug(f"Downloading price for {symbol}")
-            sec_sym = SecuritySymbol(exchange, symbol)
+        return self._set_source(prices)
 
-            price = self.download(sec_sym)
-            if price:
-                result.append(price)
+    async def fetch_async(self, exchange: str, symbols: List[str]) -> List[Price]:
+        """Fetch prices for the given symbols without blocking the event loop."""
+        return await self.fetch_symbols_async(
+            [SecuritySymbol(exchange, symbol) for symbol in symbols]
+        )
 
-        return result
+    async def fetch_symbols_async(
+        self, sec_symbols: List[SecuritySymbol]
+    ) -> List[Price]:
+        """
+        Fetch prices for the given symbols, which can be on different exchanges,
+        without blocking the event loop.
+        """
+        downloader, currency = self._prepare_download(sec_symbols)
+
+        try:
+            prices = await call_with_retries_async(
+                lambda: downloader.download_many_async(sec_symbols, currency),
+                self._get_retry_policy(),
+                self.get_circuit_breaker(),
+            )
+        except CircuitOpenError:
+            raise
+        except Exception as error:
+            raise ConnectionError(f"Error downloading prices: {error}") from error
+
+        return self._set_source(prices)
+
+    async def fetch_history_async(
+        self, exchange: str, symbol: str, start: date, end: date
+    ) -> List[Price]:
+        """Fetch the daily prices of the symbol from `start` to `end`, inclusive."""
+        sec_symbol = SecuritySymbol(exchange, symbol)
+        downloader, currency = self._prepare_download([sec_symbol])
+
+        try:
+            prices = await call_with_retries_async(
+                lambda: downloader.download_history_async(
+                    sec_symbol, currency, start, end
+                ),
+                self._get_retry_policy(),
+                self.get_circuit_breaker(),
+            )
+        except (CircuitOpenError, NotImplementedError):
+            raise
+        except Exception as error:
+            raise ConnectionError(f"Error downloading prices: {error}") from error
+
+        for price in prices:
+            price.symbol = sec_symbol
+        return self._set_source(prices)
+
+    def get_batch_size(self) -> int:
+        """The number of symbols the selected downloader fetches in one request."""
+        return self.get_downloader().batch_size
 
     def download(self, security_symbol: SecuritySymbol) -> Optional[Price]:
         """Download price for the given security symbol."""
+        downloader, currency = self._prepare_download([security_symbol])
+
+        try:
+            price = call_with_retries(
+                lambda: downloader.download(security_symbol, currency),
+                self._get_retry_policy(),
+                self.get_circuit_breaker(),
+            )
+            price.source = self.source or ""
+
+            # Set the symbol here.
+            #price.symbol = security_symbol
+            return price
+        except CircuitOpenError:
+            raise
+        except Exception as error:
+            raise ConnectionError(f"Error downloading price: {error}") from error
+
+    async def download_async(self, security_symbol: SecuritySymbol) -> Optional[Price]:
+        """Download price for the given security symbol without blocking the event loop."""
+        downloader, currency = self._prepare_download([security_symbol])
+
+        try:
+            price = await call_with_retries_async(
+                lambda: downloader.download_async(security_symbol, currency),
+                self._get_retry_policy(),
+                self.get_circuit_breaker(),
+            )
+            price.source = self.source or ""
+            return price
+        except CircuitOpenError:
+            raise
+        except Exception as error:
+            raise ConnectionError(f"Error downloading price: {error}") from error
+
+    def _prepare_download(
+        self, security_symbols: List[SecuritySymbol]
+    ) -> Tuple[Downloader, str]:
+        """Validate the settings and pick the downloader and currency to use."""
         if self.currency is not None:
             currency_val = self.currency
             if currency_val != currency_val.upper():
@@ -60,50 +363,39 @@ class Quote:
         currency: str = self.currency or "EUR"
 
         logger.debug(
-            f"Calling download with symbol {security_symbol} and currency {currency}"
+            f"Calling download with symbols {', '.join(map(str, security_symbols))} "
+            f"and currency {currency}"
         )
 
-        try:
-            price = downloader.download(security_symbol, currency)
-            price.source = self.source or ""
+        return downloader, currency
 
-            # Set the symbol here.
-            #price.symbol = security_symbol
-            return price
-        except Exception as error:
-            raise ConnectionError(f"Error downloading price: {error}") from error
+    def get_circuit_breaker(self) -> CircuitBreaker:
+        """
+        The circuit breaker for the source. Shared through the registry, if set.
+        """
+        if self.registry is not None:
+            return self.registry.get_circuit_breaker(self.source)
+        if self._breaker is None:
+            self._breaker = create_circuit_breaker(self.source or "", {})
+        return self._breaker
+
+    def _get_retry_policy(self) -> RetryPolicy:
+        if self.registry is not None:
+            return self.registry.get_retry_policy(self.source)
+        return RetryPolicy()
+
+    def _set_source(self, prices: List[Price]) -> List[Price]:
+        """Mark the prices with the source that provided them."""
+        for price in prices:
+            price.source = self.source or ""
+        return prices
 
     def get_downloader(self) -> Downloader:
         """Get the appropriate downloader based on the source."""
-        from alens.pricedl.quotes.yahoo_finance_downloader import YahooFinanceDownloader
-        
-        source = self.source.lower() if self.source else None
-        if source == "yahoo_finance":
-            logging.debug("using yahoo finance")
-            return YahooFinanceDownloader()
-
-        # elif source == "yfinance":
-        #     logging.debug("using yfinance")
-        #     from .quotes.yfinance import YfinanceDownloader
-
-        #     return YfinanceDownloader()
-        elif source == "ecb":
-            logging.debug("using ecb")
-            from .quotes.ecb import EcbDownloader
-
-            return EcbDownloader()
-        elif source == "fixerio":
-            logging.debug("using fixerio")
-            from .quotes.fixerio import Fixerio
-
-            return Fixerio()
-        elif source == "vanguard_au":
-            logging.debug("using vanguard")
-            from .quotes.vanguard_au_2023_detail import VanguardAu3Downloader
-
-            return VanguardAu3Downloader()
-        else:
-            raise ValueError(f"unknown downloader: {source}")
+        if self.registry is not None:
+            return self.registry.get(self.source)
+
+        return create_downloader(self.source, self.config)
 
     def set_currency(self, currency: str):
         """Set the currency for price fetching."""
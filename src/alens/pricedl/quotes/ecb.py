@@ -9,16 +9,20 @@ import tempfile
 from decimal import ROUND_HALF_UP, Decimal
 import xml.etree.ElementTree as ET
 
-import requests
 from loguru import logger
 
-from alens.pricedl.model import Price
 from alens.pricedl.quote import Downloader
+from alens.pricedl.quotes.rate_table import RateTable, get_rate_table
 
 ECB_URL = "https://www.ecb.europa.eu/stats/eurofx/eurofxref/eurofxref-daily.xml"
 ECB_NS = "http://www.ecb.int/vocabulary/2002-08-01/eurofxref"
 
 
+def invert_rate(rate: float) -> Decimal:
+    '''Convert the EUR/currency rate into the currency price in EUR.'''
+    return Decimal(1 / rate).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+
+
 class EcbDownloader(Downloader):
     '''
     Downloader for ECB data (currencies).
@@ -34,6 +38,19 @@ class EcbDownloader(Downloader):
         symbol = security_symbol.mnemonic.upper()
         logger.debug(f"Downloading price for {symbol} in {currency}")
 
+        # The ECB rates are always against EUR.
+        table = get_rate_table(
+            "ECB", "EUR", datetime.date.today(), self.load_rate_table
+        )
+        price = table.get_price(security_symbol)
+        # The price is in the requested currency, as before the shared tables.
+        price.currency = currency
+        return price
+
+    def load_rate_table(self) -> RateTable:
+        '''
+        Load today's rates, from the daily cache or from the ECB, and invert them.
+        '''
         if self.daily_cache_exists():
             logger.debug(f"Using cached daily rates: {self.get_cache_path()}")
             data = self.read_daily_cache()
@@ -42,16 +59,12 @@ class EcbDownloader(Downloader):
             self.write_daily_cache(data)
 
         date = datetime.date.fromisoformat(data["date"])
-        rate = data["rates"][symbol]
         # Rates are EUR/currency, so invert to get currency/EUR
-        inv_rate = Decimal(1 / rate).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
-
-        return Price(symbol=security_symbol, date=date, value=inv_rate,
-                     currency=currency, source="ECB")
+        return RateTable.from_rates("ECB", "EUR", date, data["rates"], invert_rate)
 
     def fetch_daily_rates(self) -> dict:
         '''Fetch and parse ECB daily rates XML.'''
-        response = requests.get(ECB_URL, timeout=30)
+        response = self.session.get(ECB_URL, timeout=30)
         response.raise_for_status()
 
         root = ET.fromstring(response.content)
@@ -12,8 +12,9 @@ from loguru import logger
 
 import requests
 
-from pricedl.model import Price, SecuritySymbol
-from pricedl.quote import Downloader
+from alens.pricedl.model import Price, SecuritySymbol
+from alens.pricedl.quote import Downloader
+from alens.pricedl.quotes.rate_table import RateTable, get_rate_table
 
 # --- Global Constants ---
 APP_NAME = "pricedb-py"  # Adapted for Python version
@@ -50,89 +51,54 @@ def get_todays_file_path() -> Path:
     return get_rate_file_path(today_str)
 
 
-def map_rates_to_price(rates_json: Dict[str, Any], target_symbol: str) -> Price:
+def invert_rate(rate: float | str) -> Decimal:
     """
-    Maps the JSON rates data from Fixer.io to a Price object.
-    'target_symbol' is the currency for which we want the price (e.g., "AUD").
-    The price will be relative to the base currency specified in rates_json["base"].
+    Converts the rate (units of currency per unit of base currency) into the
+    price of the currency in the base currency, rounded to 6 decimal places.
     """
     try:
-        date_str = rates_json["date"]
-        base_currency = rates_json["base"].upper()
-        rates_dict = rates_json["rates"]
-    except KeyError as e:
-        logger.error(f"Rates JSON is missing expected field: {e}. Data: {rates_json}")
-        raise ValueError(f"Invalid rates JSON structure: missing {e}") from e
-
-    rate_value_for_target = rates_dict.get(target_symbol.upper())
-
-    if rate_value_for_target is None:
-        logger.error(
-            f"Target symbol '{target_symbol.upper()}' not found in rates for base '{base_currency}'. Available: {list(rates_dict.keys())}"
-        )
-        raise KeyError(
-            f"Symbol '{target_symbol.upper()}' not found in rates for base '{base_currency}'"
-        )
-
-    try:
-        value_decimal = Decimal(str(rate_value_for_target))
+        value_decimal = Decimal(str(rate))
     except Exception as e:
-        logger.error(
-            f"Could not convert rate '{rate_value_for_target}' to Decimal for {target_symbol}: {e}"
-        )
-        raise ValueError(f"Invalid rate value for {target_symbol}") from e
-
-    if value_decimal.is_zero():
-        logger.error(
-            f"Rate for symbol '{target_symbol}' against base '{base_currency}' is zero, cannot invert."
-        )
-        raise ValueError("Rate is zero, cannot calculate inverse price.")
+        logger.error(f"Could not convert rate '{rate}' to Decimal: {e}")
+        raise ValueError(f"Invalid rate value {rate}") from e
 
     inverse_rate = Decimal(1) / value_decimal
-    logger.debug(f"Inverse rate for {target_symbol}/{base_currency}: {inverse_rate}")
-
-    rounded_str_py = f"{inverse_rate:.6f}"
-    final_decimal_for_price = Decimal(rounded_str_py)
+    final_decimal_for_price = Decimal(f"{inverse_rate:.6f}")
 
-    logger.debug(
-        f"Rounded rate for {target_symbol}/{base_currency} (6dp): {final_decimal_for_price}"
-    )
+    if final_decimal_for_price.is_signed():
+        logger.error(f"Negative price encountered for rate {rate}.")
+        raise ValueError("Negative price encountered, which is not expected.")
 
-    sign, digits_tuple, exponent_int = final_decimal_for_price.as_tuple()
+    return final_decimal_for_price
 
-    if sign:
-        logger.error(
-            f"Negative price encountered for {target_symbol}/{base_currency} after inversion and rounding."
-        )
-        raise ValueError("Negative price encountered, which is not expected.")
 
-    # val_mantissa = 0
-    # if digits_tuple:
-    #     val_mantissa = int("".join(map(str, digits_tuple)))
+def create_rate_table(rates_json: Dict[str, Any]) -> RateTable:
+    """
+    Creates the table of currency prices from the Fixer.io rates JSON.
+    All the rates are inverted at once.
+    """
+    try:
+        date_str = rates_json["date"]
+        base_currency = rates_json["base"].upper()
+        rates_dict = rates_json["rates"]
+    except KeyError as e:
+        logger.error(f"Rates JSON is missing expected field: {e}. Data: {rates_json}")
+        raise ValueError(f"Invalid rates JSON structure: missing {e}") from e
 
-    # val_scale = 0
-    # if isinstance(exponent_int, int):
-    #     if exponent_int < 0:
-    #         val_scale = -exponent_int
-    # else:
-    #     logger.error(
-    #         "Unexpected exponent type for Decimal %s: %s",
-    #         final_decimal_for_price,
-    #         exponent_int,
-    #     )
-    #     raise ValueError(f"Unexpected exponent type for Decimal: {exponent_int}")
+    return RateTable.from_rates(
+        "fixerio", base_currency, date.fromisoformat(date_str), rates_dict, invert_rate
+    )
 
-    # val_denom = 10**val_scale
 
+def map_rates_to_price(rates_json: Dict[str, Any], target_symbol: str) -> Price:
+    """
+    Maps the JSON rates data from Fixer.io to a Price object.
+    'target_symbol' is the currency for which we want the price (e.g., "AUD").
+    The price will be relative to the base currency specified in rates_json["base"].
+    """
+    table = create_rate_table(rates_json)
     symbol = SecuritySymbol("CURRENCY", f"{target_symbol.upper()}")
-    return Price(
-        symbol=symbol,
-        date=date_str,
-        time=None,
-        # value=val_mantissa,
-        # denom=val_denom,
-        currency=base_currency,
-    )
+    return table.get_price(symbol)
 
 
 def read_rates_from_cache() -> Dict[str, Any]:
@@ -160,7 +126,8 @@ def read_rates_from_cache() -> Dict[str, Any]:
 class Fixerio(Downloader):
     """
     Downloader for currency exchange rates from Fixer.io.
-    Implements caching of daily rates.
+    Implements caching of daily rates. The rates are loaded once per process and
+    day, and shared by all the currency symbols.
     """
 
     def __init__(self, api_key: Optional[str] = None):
@@ -197,7 +164,7 @@ class Fixerio(Downloader):
 
         logger.info(f"Downloading rates from Fixer.io: URL={url}, Params={params}")
         try:
-            response = requests.get(url, params=params, timeout=15)
+            response = self.session.get(url, params=params, timeout=15)
             logger.debug(f"Request URL: {response.url}")
             response.raise_for_status()
             result_json = response.json()
@@ -216,6 +183,10 @@ class Fixerio(Downloader):
         except requests.ConnectionError as e:
             logger.error(e)
             raise ConnectionError() from e
+        except (requests.HTTPError, requests.Timeout) as e:
+            # Kept as is, for the retries to see the status code.
+            logger.error(e)
+            raise
         except requests.RequestException as e:
             logger.error(e)
             raise requests.RequestException(f"Error retrieving quotes: {e}") from e
@@ -271,6 +242,24 @@ class Fixerio(Downloader):
             logger.error(err_msg)
             raise ValueError(err_msg)
 
+        table = get_rate_table(
+            "fixerio",
+            api_base_param,
+            date.today(),
+            lambda: self._load_rate_table(api_base_param),
+        )
+
+        logger.debug(
+            f"Mapping rates for target '{target_mnemonic}' using data with base '{table.base}'"
+        )
+
+        return table.get_price(SecuritySymbol("CURRENCY", target_mnemonic))
+
+    def _load_rate_table(self, api_base_param: str) -> RateTable:
+        """
+        Loads today's rates from the cache or the API, and inverts them.
+        Called once per base currency and day.
+        """
         rates_json: Optional[Dict[str, Any]] = None
 
         cached_data = self._latest_rates_cached_and_valid(api_base_param)
@@ -292,13 +281,7 @@ class Fixerio(Downloader):
             logger.critical(crit_msg)
             raise RuntimeError(crit_msg)
 
-        logger.debug(
-            f"Mapping rates for target '{target_mnemonic}' using data with base '{rates_json.get('base')}'"
-        )
-
-        price_object = map_rates_to_price(rates_json, target_mnemonic)
-
-        return price_object
+        return create_rate_table(rates_json)
 
 
 # --- Example Usage (Optional) ---
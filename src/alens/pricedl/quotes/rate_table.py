@@ -0,0 +1,108 @@
+"""
+Process-wide tables of daily currency exchange rates.
+
+The FX providers (Fixer.io, ECB) return the rates for all the currencies at once.
+A table is loaded once per (provider, base currency, day) and shared by all the
+currency symbols in the run. The inverse rates are computed in one pass when
+the table is created, so a currency price is a dictionary lookup.
+"""
+
+import threading
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+from typing import Callable, Dict, Tuple
+
+from alens.pricedl.model import Price, SecuritySymbol
+
+
+@dataclass
+class RateTable:
+    """
+    The prices of the currencies, expressed in the base currency.
+    """
+
+    provider: str
+    base: str
+    date: date
+    # Currency -> price of one unit in the base currency.
+    prices: Dict[str, Decimal] = field(default_factory=dict)
+
+    @classmethod
+    def from_rates(
+        cls,
+        provider: str,
+        base: str,
+        rates_date: date,
+        rates: Dict[str, float | str],
+        invert: Callable[[float | str], Decimal],
+    ) -> "RateTable":
+        """
+        Create the table from the rates, quoted as units of currency per one unit
+        of the base currency. `invert` converts a rate into the price of the
+        currency, with the provider's rounding. Zero rates are left out.
+        """
+        prices = {
+            currency.upper(): invert(rate)
+            for currency, rate in rates.items()
+            if Decimal(str(rate)) != 0
+        }
+        return cls(provider, base.upper(), rates_date, prices)
+
+    def get_price(self, symbol: SecuritySymbol) -> Price:
+        """The price of the currency in the symbol's mnemonic."""
+        currency = symbol.mnemonic.upper()
+        value = self.prices.get(currency)
+        if value is None:
+            raise KeyError(
+                f"Symbol '{currency}' not found in {self.provider} rates "
+                f"for base '{self.base}'"
+            )
+
+        return Price(
+            symbol=symbol,
+            date=self.date,
+            time=None,
+            value=value,
+            currency=self.base,
+            source=self.provider,
+        )
+
+
+_tables: Dict[Tuple[str, str, date], RateTable] = {}
+_locks: Dict[Tuple[str, str, date], threading.Lock] = {}
+_lock = threading.Lock()
+
+
+def get_rate_table(
+    provider: str, base: str, day: date, load: Callable[[], RateTable]
+) -> RateTable:
+    """
+    Get the rate table for the provider, base currency, and day. The table is
+    loaded with `load` the first time. Concurrent requests for the same table
+    wait for the one load.
+    """
+    key = (provider, base.upper(), day)
+
+    with _lock:
+        table = _tables.get(key)
+        if table is not None:
+            return table
+        key_lock = _locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        with _lock:
+            table = _tables.get(key)
+        if table is None:
+            table = load()
+            with _lock:
+                _tables[key] = table
+
+    return table
+
+
+def clear_rate_tables():
+    """Forget the loaded rate tables."""
+    with _lock:
+        _tables.clear()
+        _locks.clear()
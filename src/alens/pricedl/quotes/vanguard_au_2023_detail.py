@@ -13,11 +13,10 @@ The limit parameter is for the number of prices retrieved.
 """
 
 import json
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 
-import requests
 
 from alens.pricedl.model import Price, SecuritySymbol
 from alens.pricedl.quote import Downloader
@@ -34,35 +33,37 @@ class VanguardAu3Downloader(Downloader):
             "VANGUARD:HY": "8106",  # VAN0104AU
         }
 
-    def get_url(self, symbol: SecuritySymbol) -> str:
-        """Creates the URL for the fund"""
+    def get_url(self, symbol: SecuritySymbol, limit: str = "1") -> str:
+        """
+        Creates the URL for the fund.
+        The limit is the number of prices to retrieve, "-1" for all of them.
+        """
         sec_symbol_str = str(symbol)
         fund_id = self.funds_map.get(sec_symbol_str)
         if fund_id is None:
             raise ValueError(f"Fund ID not found for symbol: {sec_symbol_str}")
 
-        # limit = "-1"  # Get all prices
-        limit = "1"  # Get only the latest price
-
         result = f"https://www.vanguard.com.au/personal/api/products/personal/fund/{fund_id}/detail?limit={limit}"
 
         return result
 
-    def _dl_price(self, symbol: SecuritySymbol) -> Tuple[str, str, str]:
-        """
-        Returns the latest retail fund price.
-        (date_str, price_str, currency_str)
-        """
-        url = self.get_url(symbol)
+    def _dl_prices(self, symbol: SecuritySymbol, limit: str) -> Tuple[str, list]:
+        """Returns the URL and the retail fund prices, the latest first."""
+        url = self.get_url(symbol, limit)
 
-        response = requests.get(url, timeout=30)
+        response = self.session.get(url, timeout=30)
         response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
-        content = response.content
 
-        content_json = json.loads(content)
+        content_json = json.loads(response.content)
         data = content_json["data"][0]
+        return url, data["navPrices"]
 
-        prices = data["navPrices"]
+    def _dl_price(self, symbol: SecuritySymbol) -> Tuple[str, str, str]:
+        """
+        Returns the latest retail fund price.
+        (date_str, price_str, currency_str)
+        """
+        url, prices = self._dl_prices(symbol, "1")
         if not prices:
             raise ValueError(f"No price data found for symbol {symbol} at {url}")
 
@@ -89,6 +90,25 @@ class VanguardAu3Downloader(Downloader):
 
         return self._parse_price(date_str, price_str, currency_api)
 
+    def download_history(
+        self, security_symbol: SecuritySymbol, currency: str, start: date, end: date
+    ) -> List[Price]:
+        """Download all the fund prices in one request, and keep the date range."""
+        if security_symbol.namespace.upper() != "VANGUARD":
+            raise ValueError("Only Vanguard symbols are handled by this downloader!")
+
+        _, nav_prices = self._dl_prices(security_symbol, "-1")
+
+        result = []
+        for nav_price in nav_prices:
+            price = self._parse_price(
+                nav_price["asOfDate"], str(nav_price["price"]), nav_price["currencyCode"]
+            )
+            if start <= price.date <= end:
+                price.symbol = security_symbol
+                result.append(price)
+        return result
+
     def _parse_price(self, date_str, price_str, currency_api) -> Price:
         """
         Parse price from the price strings.
@@ -2,21 +2,37 @@
 Yahoo Finance downloader implementation.
 """
 
-import logging
-from datetime import datetime, timezone, timedelta
-import requests
-from typing import Dict
+from datetime import date, datetime, timezone, timedelta
+from typing import Dict, List
 from decimal import Decimal
 
+from loguru import logger
+
 from ..model import Price, SecuritySymbol
 from ..quote import Downloader
+from ..retry import is_transient
+
+
+# The number of symbols requested in one call to the quote endpoint.
+DEFAULT_BATCH_SIZE = 50
+
+# user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:128.0) Gecko/20100101 Firefox/128.0"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 
 
 class YahooFinanceDownloader(Downloader):
     """YahooFinanceDownloader"""
 
-    def __init__(self):
+    def __init__(self, batch_size: int | None = None):
         self.url = "https://query1.finance.yahoo.com/v8/finance/chart/"
+        # Multi-symbol quote endpoint.
+        self.quote_url = "https://query1.finance.yahoo.com/v7/finance/quote"
+        # Set when the quote endpoint rejects the requests (i.e. without the
+        # cookie and crumb). The prices are then fetched from the chart endpoint.
+        self.quote_unavailable = False
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        if self.batch_size < 1:
+            raise ValueError(f"Batch size must be at least 1, got {self.batch_size}")
         self.namespaces = {
             "AMS": "AS",
             "ASX": "AX",
@@ -30,20 +46,22 @@ class YahooFinanceDownloader(Downloader):
             "XETRA": "DE",
         }
 
-    def assemble_url(self, symbol: SecuritySymbol) -> str:
-        """Assemble the URL for the Yahoo Finance API request."""
+    def get_yahoo_symbol(self, symbol: SecuritySymbol) -> str:
+        """The symbol as used by Yahoo Finance, i.e. VHY.AX"""
         current_namespace = symbol.namespace
         local_namespace = current_namespace
 
         if current_namespace in self.namespaces:
             local_namespace = self.namespaces[current_namespace]
 
-        url = f"{self.url}{symbol.mnemonic}"
-
         if local_namespace:
-            url = f"{url}.{local_namespace}"
+            return f"{symbol.mnemonic}.{local_namespace}"
 
-        return url
+        return symbol.mnemonic
+
+    def assemble_url(self, symbol: SecuritySymbol) -> str:
+        """Assemble the URL for the Yahoo Finance API request."""
+        return f"{self.url}{self.get_yahoo_symbol(symbol)}"
 
     def get_price_from_json(self, body: Dict) -> Price:
         """Extract the Price from JSON response."""
@@ -67,6 +85,49 @@ class YahooFinanceDownloader(Downloader):
         seconds = meta.get("regularMarketTime")
         offset = meta.get("gmtoffset", 0)
 
+        return self._create_price(value, currency, seconds, offset)
+
+    def get_history_from_json(self, body: Dict) -> List[Price]:
+        """
+        Extract the daily prices from the chart response, in one pass over
+        the timestamp and close arrays. Days without a close are skipped.
+        """
+        chart = body.get("chart", {})
+        error = chart.get("error")
+
+        # Ensure that there is no error
+        assert error is None, f"Error in Yahoo Finance response: {error}"
+
+        result = (chart.get("result") or [{}])[0]
+        meta = result.get("meta", {})
+        currency = meta.get("currency")
+        tz = timezone(timedelta(seconds=meta.get("gmtoffset", 0)))
+        # The closes are floats. Round them to the precision Yahoo displays.
+        price_hint = meta.get("priceHint")
+
+        timestamps = result.get("timestamp") or []
+        quotes = (result.get("indicators") or {}).get("quote") or [{}]
+        closes = quotes[0].get("close") or []
+
+        return [
+            Price(
+                symbol=SecuritySymbol("", ""),
+                date=datetime.fromtimestamp(seconds, tz=tz).date(),
+                time=None,
+                value=Decimal(
+                    str(round(close, price_hint) if price_hint is not None else close)
+                ),
+                currency=currency,
+                source="yahoo",
+            )
+            for seconds, close in zip(timestamps, closes)
+            if close is not None
+        ]
+
+    def _create_price(
+        self, value: Decimal, currency: str, seconds: int, offset: int
+    ) -> Price:
+        """Create the Price from the market time, in the exchange's time zone."""
         # Create timezone with the offset
         tz = timezone(timedelta(seconds=offset))
 
@@ -90,20 +151,43 @@ class YahooFinanceDownloader(Downloader):
 
         return result
 
+    def get_prices_from_quote_json(self, body: Dict) -> Dict[str, Price]:
+        """
+        Extract the Prices from the multi-symbol quote response.
+        Returns the prices keyed by the Yahoo symbol.
+        """
+        quote_response = body.get("quoteResponse", {})
+        error = quote_response.get("error")
+
+        # Ensure that there is no error
+        assert error is None, f"Error in Yahoo Finance response: {error}"
+
+        result = {}
+        for quote in quote_response.get("result") or []:
+            market_price = quote.get("regularMarketPrice")
+            seconds = quote.get("regularMarketTime")
+            if market_price is None or seconds is None:
+                logger.warning(f"No price in the quote for {quote.get('symbol')}")
+                continue
+
+            offset = quote.get("gmtOffSetMilliseconds", 0) // 1000
+            result[quote["symbol"].upper()] = self._create_price(
+                Decimal(str(market_price)), quote.get("currency"), seconds, offset
+            )
+
+        return result
+
     def download(self, security_symbol: SecuritySymbol, currency: str) -> Price:
         """Download price data from Yahoo Finance."""
         url = self.assemble_url(security_symbol)
 
-        logging.debug("fetching from %s", url)
+        logger.debug(f"Fetching from {url}")
 
-        # user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:128.0) Gecko/20100101 Firefox/128.0"
-        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        headers = {"User-Agent": USER_AGENT}
 
-        headers = {"User-Agent": user_agent}
-
-        response = requests.get(url, headers=headers, timeout=30)
+        response = self.session.get(url, headers=headers, timeout=30)
         if not response.ok:
-            print(f"Received a non-success status: {response}")
+            logger.warning(f"Received a non-success status: {response}")
             response.raise_for_status()
 
         body = response.json()
@@ -114,3 +198,114 @@ class YahooFinanceDownloader(Downloader):
         result.symbol = security_symbol
 
         return result
+
+    def download_many(
+        self, security_symbols: List[SecuritySymbol], currency: str
+    ) -> List[Price]:
+        """
+        Download prices for multiple symbols, using the multi-symbol quote endpoint.
+        The symbols are requested in chunks of `batch_size`.
+        If the quote endpoint refuses the request (401/403), the prices are
+        downloaded one by one from the chart endpoint, for the rest of the run.
+        """
+        result = []
+
+        for start in range(0, len(security_symbols), self.batch_size):
+            chunk = security_symbols[start : start + self.batch_size]
+            if self.quote_unavailable:
+                result.extend(self._download_each(chunk))
+                continue
+
+            yahoo_symbols = {self.get_yahoo_symbol(sym): sym for sym in chunk}
+
+            logger.debug(f"Fetching quotes for {', '.join(yahoo_symbols)}")
+
+            response = self.session.get(
+                self.quote_url,
+                params={"symbols": ",".join(yahoo_symbols)},
+                headers={"User-Agent": USER_AGENT},
+                timeout=30,
+            )
+            if response.status_code in (401, 403):
+                logger.warning(
+                    f"The quote endpoint refused the request ({response.status_code})"
+                    ", using the chart endpoint"
+                )
+                self.quote_unavailable = True
+                result.extend(self._download_each(chunk))
+                continue
+            if not response.ok:
+                logger.warning(f"Received a non-success status: {response}")
+                response.raise_for_status()
+
+            prices = self.get_prices_from_quote_json(response.json())
+
+            for yahoo_symbol, security_symbol in yahoo_symbols.items():
+                price = prices.get(yahoo_symbol.upper())
+                if price is None:
+                    logger.warning(f"No quote received for {yahoo_symbol}")
+                    continue
+
+                price.symbol = security_symbol
+                result.append(price)
+
+        return result
+
+    def _download_each(self, security_symbols: List[SecuritySymbol]) -> List[Price]:
+        """
+        Download the prices one by one from the chart endpoint. The symbols
+        without a price are left out. Transient errors are raised, for a retry.
+        """
+        result = []
+        for security_symbol in security_symbols:
+            try:
+                result.append(self.download(security_symbol, ""))
+            except Exception as error:
+                if is_transient(error):
+                    raise
+                logger.warning(f"No price received for {security_symbol}: {error}")
+        return result
+
+    def download_history(
+        self, security_symbol: SecuritySymbol, currency: str, start: date, end: date
+    ) -> List[Price]:
+        """Download the daily closing prices in one chart request."""
+        url = self.assemble_url(security_symbol)
+        # From the start of the first day to the end of the last day, in UTC.
+        # The bars of the exchanges east of UTC are stamped on the previous UTC
+        # day, so a day earlier is requested. The date filter trims the extra.
+        # Yahoo rejects times before the epoch.
+        period1 = max(
+            0,
+            int(
+                datetime.combine(
+                    start - timedelta(days=1), datetime.min.time(), timezone.utc
+                ).timestamp()
+            ),
+        )
+        period2 = int(
+            datetime.combine(
+                end + timedelta(days=1), datetime.min.time(), timezone.utc
+            ).timestamp()
+        )
+
+        logger.debug(f"Fetching history from {url}")
+
+        response = self.session.get(
+            url,
+            params={"period1": period1, "period2": period2, "interval": "1d"},
+            headers={"User-Agent": USER_AGENT},
+            timeout=30,
+        )
+        if not response.ok:
+            logger.warning(f"Received a non-success status: {response}")
+            response.raise_for_status()
+
+        prices = self.get_history_from_json(response.json())
+
+        result = []
+        for price in prices:
+            if start <= price.date <= end:
+                price.symbol = security_symbol
+                result.append(price)
+        return result
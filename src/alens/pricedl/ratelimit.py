@@ -0,0 +1,136 @@
+"""
+Rate limiting of the requests to the price providers.
+
+A token bucket per provider limits the request rate. When the provider signals
+throttling (HTTP 429 or 503), the rate is halved and the requests pause for the
+time given in the Retry-After header. After that, the rate recovers gradually,
+with every successful request, back up to the configured maximum.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict
+
+# Default maximum request rates (requests per second) per updater.
+DEFAULT_RATES: Dict[str, float] = {
+    "yahoo_finance": 5.0,
+    "fixerio": 1.0,
+    "ecb": 1.0,
+    "vanguard_au": 2.0,
+}
+# The rate for updaters not listed above.
+FALLBACK_RATE = 2.0
+
+# The HTTP status codes that mean "slow down".
+THROTTLE_STATUS_CODES = (429, 503)
+
+# The rate is multiplied by this factor when throttled.
+BACKOFF_FACTOR = 0.5
+# The fraction of the maximum rate recovered with every successful request.
+RECOVERY_FRACTION = 0.05
+# The lowest rate, as a fraction of the maximum rate.
+MIN_RATE_FRACTION = 1 / 32
+
+
+class RateLimiter:
+    """
+    Token bucket with an adaptive rate. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive, got {rate}")
+
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = rate * MIN_RATE_FRACTION
+        self.burst = burst or max(1, int(rate))
+
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        # No requests until this time, after throttling.
+        self._blocked_until = 0.0
+
+    def acquire(self):
+        """Wait until a request can be sent."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = max(
+                    self._blocked_until - now, (1 - self._tokens) / self.rate
+                )
+
+            self._sleep(wait)
+
+    def on_success(self):
+        """A request succeeded. Recover the rate gradually."""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(
+                    self.max_rate, self.rate + self.max_rate * RECOVERY_FRACTION
+                )
+
+    def on_throttled(self, retry_after: float | None = None):
+        """
+        The provider throttled a request. Reduce the rate and pause the requests
+        for `retry_after` seconds, if given.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+
+            self.rate = max(self.min_rate, self.rate * BACKOFF_FACTOR)
+            self._tokens = 0
+            pause = retry_after if retry_after is not None else 1 / self.rate
+            self._blocked_until = max(self._blocked_until, now + pause)
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parse the Retry-After header, which is either a number of seconds or an HTTP
+    date. Returns the number of seconds to wait.
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def create_rate_limiter(updater: str, options: Dict) -> RateLimiter:
+    """
+    Create the rate limiter for the updater, from the [updaters.<name>] settings:
+    rate (requests per second) and burst.
+    """
+    rate = options.get("rate") or DEFAULT_RATES.get(updater, FALLBACK_RATE)
+    return RateLimiter(float(rate), options.get("burst"))
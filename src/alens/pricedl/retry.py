@@ -0,0 +1,240 @@
+"""
+Retries and circuit breaking for the price downloads.
+
+Transient errors (connection problems, timeouts, server errors, throttling) are
+retried with jittered exponential backoff. After a number of consecutive failed
+downloads, the circuit breaker for the provider opens, and the remaining
+downloads fail fast instead of waiting for the timeouts, one by one.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, TypeVar
+
+import requests
+from loguru import logger
+
+T = TypeVar("T")
+
+DEFAULT_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 10.0
+DEFAULT_FAILURE_THRESHOLD = 5
+# Seconds before an open circuit lets a trial request through.
+DEFAULT_RESET_TIMEOUT = 60.0
+
+
+class CircuitOpenError(ConnectionError):
+    """The provider has failed repeatedly and is not being called."""
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether the error is likely to go away if the request is repeated."""
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        if response is None:
+            return True
+        return response.status_code == 429 or response.status_code >= 500
+
+    return isinstance(
+        error,
+        (
+            requests.ConnectionError,
+            requests.Timeout,
+            ConnectionError,
+            TimeoutError,
+        ),
+    ) and not isinstance(error, CircuitOpenError)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+    """
+
+    def __init__(
+        self,
+        attempts: int = DEFAULT_ATTEMPTS,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+    ):
+        if attempts < 1:
+            raise ValueError(f"Attempts must be at least 1, got {attempts}")
+
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """The time to wait after the given (0-based) failed attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. While open, the calls
+    fail fast. After `reset_timeout` seconds, one trial call is let through;
+    the circuit closes again if it succeeds. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._opened_at: float | None = None
+        self._trial_running = False
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the calls are currently being rejected."""
+        return self._opened_at is not None
+
+    def check(self):
+        """Raises CircuitOpenError if the call should not be made."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+
+            ready = self._clock() - self._opened_at >= self.reset_timeout
+            if ready and not self._trial_running:
+                # Half-open: let one trial call through.
+                self._trial_running = True
+                return
+
+        raise CircuitOpenError(
+            f"{self.name} is unavailable after {self.failures} consecutive failures"
+        )
+
+    def record_success(self):
+        """A call succeeded. Close the circuit."""
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def release(self):
+        """
+        A call ended without an outcome (i.e. it was cancelled).
+        If it was the trial call, the next call may be the trial.
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        """A call failed. Open the circuit after too many consecutive failures."""
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(
+                        f"Circuit opened for {self.name} after {self.failures} failures"
+                    )
+                self._opened_at = self._clock()
+                self._trial_running = False
+
+
+def call_with_retries(
+    call: Callable[[], T], policy: RetryPolicy, breaker: CircuitBreaker
+) -> T:
+    """Call the function, retrying the transient errors."""
+    # Checked once: the retries of a half-open trial belong to the trial.
+    breaker.check()
+    settled = False
+    attempt = 0
+    try:
+        while True:
+            try:
+                result = call()
+            except Exception as error:
+                if not is_transient(error):
+                    # The provider did respond. The error is specific to the
+                    # request.
+                    settled = True
+                    breaker.record_success()
+                    raise
+                if attempt + 1 >= policy.attempts:
+                    settled = True
+                    breaker.record_failure()
+                    raise
+                delay = policy.delay(attempt)
+                logger.debug(
+                    f"{breaker.name}: retrying in {delay:.2f}s after {error}"
+                )
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            settled = True
+            breaker.record_success()
+            return result
+    finally:
+        if not settled:
+            breaker.release()
+
+
+async def call_with_retries_async(
+    call: Callable[[], Awaitable[T]], policy: RetryPolicy, breaker: CircuitBreaker
+) -> T:
+    """Await the coroutine returned by `call`, retrying the transient errors."""
+    # Checked once: the retries of a half-open trial belong to the trial.
+    breaker.check()
+    settled = False
+    attempt = 0
+    try:
+        while True:
+            try:
+                result = await call()
+            except Exception as error:
+                if not is_transient(error):
+                    # The provider did respond. The error is specific to the
+                    # request.
+                    settled = True
+                    breaker.record_success()
+                    raise
+                if attempt + 1 >= policy.attempts:
+                    settled = True
+                    breaker.record_failure()
+                    raise
+                delay = policy.delay(attempt)
+                logger.debug(
+                    f"{breaker.name}: retrying in {delay:.2f}s after {error}"
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            settled = True
+            breaker.record_success()
+            return result
+    finally:
+        if not settled:
+            breaker.release()
+
+
+def create_retry_policy(options: Dict) -> RetryPolicy:
+    """Create the retry policy from the [updaters.<name>] settings."""
+    return RetryPolicy(
+        attempts=options.get("attempts", DEFAULT_ATTEMPTS),
+        base_delay=options.get("retry_delay", DEFAULT_BASE_DELAY),
+    )
+
+
+def create_circuit_breaker(name: str, options: Dict) -> CircuitBreaker:
+    """Create the circuit breaker from the [updaters.<name>] settings."""
+    return CircuitBreaker(
+        name,
+        failure_threshold=options.get("failure_threshold", DEFAULT_FAILURE_THRESHOLD),
+        reset_timeout=options.get("reset_timeout", DEFAULT_RESET_TIMEOUT),
+    )
@@ -0,0 +1,68 @@
+"""
+Pooled HTTP sessions for the downloaders.
+A session keeps the connections alive, so that consecutive requests to the same
+provider reuse the TCP/TLS connection instead of opening a new one.
+"""
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+from alens.pricedl.ratelimit import (
+    THROTTLE_STATUS_CODES,
+    RateLimiter,
+    parse_retry_after,
+)
+
+# The number of connection pools (hosts) to cache.
+DEFAULT_POOL_CONNECTIONS = 4
+# The number of connections kept alive per host.
+DEFAULT_POOL_MAXSIZE = 10
+
+
+class RateLimitedSession(requests.Session):
+    """
+    A session that sends the requests at the rate allowed by the rate limiter,
+    and adjusts the rate when the provider throttles the requests.
+    """
+
+    def __init__(self, limiter: RateLimiter):
+        super().__init__()
+        self.limiter = limiter
+
+    def request(self, method, url, *args, **kwargs):
+        self.limiter.acquire()
+
+        response = super().request(method, url, *args, **kwargs)
+
+        if response.status_code in THROTTLE_STATUS_CODES:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            logger.warning(
+                f"Throttled by {response.url} ({response.status_code}), "
+                f"retry after: {retry_after}"
+            )
+            self.limiter.on_throttled(retry_after)
+        else:
+            self.limiter.on_success()
+
+        return response
+
+
+def create_session(
+    pool_connections: int | None = None,
+    pool_maxsize: int | None = None,
+    limiter: RateLimiter | None = None,
+) -> requests.Session:
+    """
+    Create an HTTP session with keep-alive connection pools of the given size.
+    If a rate limiter is given, the requests are sent at the rate it allows.
+    """
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections or DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=pool_maxsize or DEFAULT_POOL_MAXSIZE,
+    )
+
+    session = RateLimitedSession(limiter) if limiter else requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -0,0 +1,155 @@
+"""
+Price history in a SQLite database.
+
+Keyed by (symbol, datetime), so point-in-time queries use the primary key and
+new prices are upserted without rewriting anything. The database runs in WAL
+mode. The Ledger price file can be exported on demand.
+"""
+
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Iterable, Iterator, List, Mapping
+
+from alens.pricedl.price_flat_file import DATE_TIME_FORMAT, PriceFlatFile, PriceRecord
+from alens.pricedl.price_store import PriceStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    symbol TEXT NOT NULL,
+    datetime TEXT NOT NULL,
+    value TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    PRIMARY KEY (symbol, datetime)
+) WITHOUT ROWID
+"""
+
+UPSERT = """
+INSERT INTO prices (symbol, datetime, value, currency) VALUES (?, ?, ?, ?)
+ON CONFLICT (symbol, datetime) DO UPDATE
+SET value = excluded.value, currency = excluded.currency
+"""
+
+
+def _to_row(record: PriceRecord) -> tuple[str, str, str, str]:
+    return (
+        record.symbol,
+        record.datetime.strftime(DATE_TIME_FORMAT),
+        str(record.value),
+        record.currency,
+    )
+
+
+def _to_record(row) -> PriceRecord:
+    symbol, date_time, value, currency = row
+    return PriceRecord(
+        datetime_val=datetime.fromisoformat(date_time),
+        symbol=symbol,
+        value=Decimal(value),
+        currency=currency,
+    )
+
+
+class SqliteLatestPrices(Mapping[str, PriceRecord]):
+    """The latest price per symbol, queried from the database."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+
+    def __getitem__(self, symbol: str) -> PriceRecord:
+        row = self._connection.execute(
+            "SELECT symbol, datetime, value, currency FROM prices"
+            " WHERE symbol = ? ORDER BY datetime DESC LIMIT 1",
+            (symbol,),
+        ).fetchone()
+        if row is None:
+            raise KeyError(symbol)
+        return _to_record(row)
+
+    def __iter__(self) -> Iterator[str]:
+        rows = self._connection.execute("SELECT DISTINCT symbol FROM prices")
+        return (symbol for (symbol,) in rows)
+
+    def __len__(self) -> int:
+        return self._connection.execute(
+            "SELECT COUNT(DISTINCT symbol) FROM prices"
+        ).fetchone()[0]
+
+
+class SqlitePriceStore(PriceStore):
+    """
+    The price history in a SQLite database.
+    """
+
+    def __init__(self, database_path: Path):
+        self.database_path = database_path
+        self._connection = sqlite3.connect(database_path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(SCHEMA)
+        self._connection.commit()
+        self.prices = SqliteLatestPrices(self._connection)
+
+    def as_of(self, symbol: str, when: datetime) -> PriceRecord | None:
+        row = self._connection.execute(
+            "SELECT symbol, datetime, value, currency FROM prices"
+            " WHERE symbol = ? AND datetime <= ? ORDER BY datetime DESC LIMIT 1",
+            (symbol, when.strftime(DATE_TIME_FORMAT)),
+        ).fetchone()
+        return _to_record(row) if row else None
+
+    def dates(self, symbol: str) -> List[date]:
+        rows = self._connection.execute(
+            "SELECT DISTINCT substr(datetime, 1, 10) FROM prices"
+            " WHERE symbol = ? ORDER BY 1",
+            (symbol,),
+        )
+        return [date.fromisoformat(day) for (day,) in rows]
+
+    def add(self, records: Iterable[PriceRecord]):
+        """Upserts the records in one batch. They are committed by `save`."""
+        self._connection.executemany(UPSERT, (_to_row(record) for record in records))
+
+    def append(self, records: Iterable[PriceRecord]):
+        self.add(records)
+        self.save()
+
+    def save(self):
+        self._connection.commit()
+
+    def records(self) -> Iterator[PriceRecord]:
+        """All the records, ordered by date/time, then symbol."""
+        rows = self._connection.execute(
+            "SELECT symbol, datetime, value, currency FROM prices"
+            " ORDER BY datetime, symbol"
+        )
+        return (_to_record(row) for row in rows)
+
+    def import_file(self, prices_path: Path) -> int:
+        """Adds all the records from the price file. Returns the number of records."""
+        before = self._connection.total_changes
+        self.append(PriceFlatFile(prices_path).iter_records())
+        return self._connection.total_changes - before
+
+    def export(self, prices_path: Path) -> int:
+        """
+        Writes all the prices into the price file, in Ledger format.
+        Returns the number of records.
+        """
+        count = 0
+
+        def counted():
+            nonlocal count
+            for record in self.records():
+                count += 1
+                yield record
+
+        PriceFlatFile(prices_path).write(counted())
+        return count
+
+    def close(self):
+        self._connection.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM prices").fetchone()[0]
@@ -0,0 +1,342 @@
+"""
+Offline trading calendars for the exchanges (namespaces) in the symbols list.
+
+The calendars contain the weekends and the regular exchange holidays, computed
+from the holiday rules. One-off closures are not included.
+The sessions are precomputed per exchange and year, so that a lookup is a list
+index.
+"""
+
+from datetime import date, datetime, time, timedelta, tzinfo
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Namespace -> market calendar.
+NAMESPACE_MARKETS: Dict[str, str] = {
+    "AMS": "EURONEXT",
+    "ASX": "ASX",
+    "BATS": "NYSE",
+    "BVME": "BORSA_ITALIANA",
+    "FWB": "XETRA",
+    "LSE": "LSE",
+    "NASDAQ": "NYSE",
+    "NYSE": "NYSE",
+    "NYSEARCA": "NYSE",
+    "XETRA": "XETRA",
+    # Vanguard Australia funds are priced on the Australian business days.
+    "VANGUARD": "ASX",
+}
+
+MARKET_TIMEZONES: Dict[str, str] = {
+    "ASX": "Australia/Sydney",
+    "BORSA_ITALIANA": "Europe/Rome",
+    "EURONEXT": "Europe/Amsterdam",
+    "LSE": "Europe/London",
+    "NYSE": "America/New_York",
+    "XETRA": "Europe/Berlin",
+}
+
+# The end of the regular trading session, in the exchange's time zone.
+MARKET_CLOSE: Dict[str, time] = {
+    "ASX": time(16, 0),
+    "BORSA_ITALIANA": time(17, 30),
+    "EURONEXT": time(17, 30),
+    "LSE": time(16, 30),
+    "NYSE": time(16, 0),
+    "XETRA": time(17, 30),
+}
+
+MONDAY, THURSDAY, FRIDAY, SATURDAY, SUNDAY = 0, 3, 4, 5, 6
+
+
+def easter_sunday(year: int) -> date:
+    """Easter Sunday, by the anonymous Gregorian algorithm."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7  # noqa: E741
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """The n-th weekday of the month. Negative n counts from the end."""
+    if n > 0:
+        first = date(year, month, 1)
+        offset = (weekday - first.weekday()) % 7
+        return first + timedelta(days=offset + 7 * (n - 1))
+
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - timedelta(days=1)
+    offset = (last.weekday() - weekday) % 7
+    return last - timedelta(days=offset + 7 * (-n - 1))
+
+
+def observed(day: date) -> date:
+    """A holiday on a weekend is observed on the following Monday."""
+    if day.weekday() == SATURDAY:
+        return day + timedelta(days=2)
+    if day.weekday() == SUNDAY:
+        return day + timedelta(days=1)
+    return day
+
+
+def observed_us(day: date) -> date:
+    """A holiday on Saturday is observed on Friday, on Sunday on Monday."""
+    if day.weekday() == SATURDAY:
+        return day - timedelta(days=1)
+    if day.weekday() == SUNDAY:
+        return day + timedelta(days=1)
+    return day
+
+
+def christmas_observed(year: int) -> Set[date]:
+    """Christmas and Boxing Day, with the substitute days after a weekend."""
+    christmas = date(year, 12, 25)
+    boxing_day = date(year, 12, 26)
+    if christmas.weekday() == SATURDAY:
+        return {christmas + timedelta(days=2), boxing_day + timedelta(days=2)}
+    if christmas.weekday() == SUNDAY:
+        return {christmas + timedelta(days=2), boxing_day}
+    if christmas.weekday() == FRIDAY:
+        return {christmas, boxing_day + timedelta(days=2)}
+    return {christmas, boxing_day}
+
+
+def nyse_holidays(year: int) -> Set[date]:
+    """NYSE / NASDAQ holidays."""
+    easter = easter_sunday(year)
+    holidays = {
+        nth_weekday(year, 1, MONDAY, 3),  # Martin Luther King Jr. Day
+        nth_weekday(year, 2, MONDAY, 3),  # Washington's Birthday
+        easter - timedelta(days=2),  # Good Friday
+        nth_weekday(year, 5, MONDAY, -1),  # Memorial Day
+        observed_us(date(year, 7, 4)),  # Independence Day
+        nth_weekday(year, 9, MONDAY, 1),  # Labor Day
+        nth_weekday(year, 11, THURSDAY, 4),  # Thanksgiving
+        observed_us(date(year, 12, 25)),
+    }
+    # New Year's Day on a Saturday is not moved to Friday.
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != SATURDAY:
+        holidays.add(observed_us(new_year))
+    if year >= 2022:
+        holidays.add(observed_us(date(year, 6, 19)))  # Juneteenth
+    return holidays
+
+
+def xetra_holidays(year: int) -> Set[date]:
+    """Deutsche Börse (Xetra, Frankfurt) holidays."""
+    easter = easter_sunday(year)
+    return {
+        date(year, 1, 1),
+        easter - timedelta(days=2),
+        easter + timedelta(days=1),
+        date(year, 5, 1),
+        date(year, 12, 24),
+        date(year, 12, 25),
+        date(year, 12, 26),
+        date(year, 12, 31),
+    }
+
+
+def euronext_holidays(year: int) -> Set[date]:
+    """Euronext (Amsterdam) holidays."""
+    easter = easter_sunday(year)
+    return {
+        date(year, 1, 1),
+        easter - timedelta(days=2),
+        easter + timedelta(days=1),
+        date(year, 5, 1),
+        date(year, 12, 25),
+        date(year, 12, 26),
+    }
+
+
+def borsa_italiana_holidays(year: int) -> Set[date]:
+    """Borsa Italiana (Milan) holidays."""
+    return euronext_holidays(year) | {
+        date(year, 8, 15),
+        date(year, 12, 24),
+        date(year, 12, 31),
+    }
+
+
+def lse_holidays(year: int) -> Set[date]:
+    """London Stock Exchange holidays (England bank holidays)."""
+    easter = easter_sunday(year)
+    return {
+        observed(date(year, 1, 1)),
+        easter - timedelta(days=2),
+        easter + timedelta(days=1),
+        nth_weekday(year, 5, MONDAY, 1),  # Early May bank holiday
+        nth_weekday(year, 5, MONDAY, -1),  # Spring bank holiday
+        nth_weekday(year, 8, MONDAY, -1),  # Summer bank holiday
+    } | christmas_observed(year)
+
+
+def asx_holidays(year: int) -> Set[date]:
+    """Australian Securities Exchange holidays."""
+    easter = easter_sunday(year)
+    return {
+        observed(date(year, 1, 1)),
+        observed(date(year, 1, 26)),  # Australia Day
+        easter - timedelta(days=2),
+        easter + timedelta(days=1),
+        date(year, 4, 25),  # Anzac Day, not moved
+        nth_weekday(year, 6, MONDAY, 2),  # King's Birthday
+    } | christmas_observed(year)
+
+
+MARKET_HOLIDAYS: Dict[str, Callable[[int], Set[date]]] = {
+    "ASX": asx_holidays,
+    "BORSA_ITALIANA": borsa_italiana_holidays,
+    "EURONEXT": euronext_holidays,
+    "LSE": lse_holidays,
+    "NYSE": nyse_holidays,
+    "XETRA": xetra_holidays,
+}
+
+
+def get_market(namespace: str | None) -> str | None:
+    """The market calendar for the namespace. None if there is no calendar."""
+    if not namespace:
+        return None
+    return NAMESPACE_MARKETS.get(namespace.upper())
+
+
+def is_session(market: str, day: date) -> bool:
+    """Whether the market is open on the day."""
+    if day.weekday() >= SATURDAY:
+        return False
+    # A session is its own last session. The table is cached per year.
+    table = _last_sessions(market, day.year)
+    return table[day.timetuple().tm_yday - 1] == day.toordinal()
+
+
+@lru_cache(maxsize=None)
+def _last_sessions(market: str, year: int) -> List[int]:
+    """
+    For every day of the year (index 0 = 1 January), the ordinal of the latest
+    session on or before that day.
+    """
+    holidays = MARKET_HOLIDAYS[market](year)
+    first = date(year, 1, 1)
+    days = (date(year + 1, 1, 1) - first).days
+
+    last = _last_session_before_year(market, year)
+    result = []
+    for offset in range(days):
+        day = first + timedelta(days=offset)
+        if day.weekday() < SATURDAY and day not in holidays:
+            last = day.toordinal()
+        result.append(last)
+    return result
+
+
+def _last_session_before_year(market: str, year: int) -> int:
+    """The ordinal of the last session before 1 January of the year."""
+    # From the holidays, as the table of the previous year is built from this.
+    holidays = MARKET_HOLIDAYS[market](year - 1)
+    day = date(year, 1, 1) - timedelta(days=1)
+    while day.weekday() >= SATURDAY or day in holidays:
+        day -= timedelta(days=1)
+    return day.toordinal()
+
+
+def last_session(market: str, day: date) -> date:
+    """The latest session on or before the day."""
+    table = _last_sessions(market, day.year)
+    return date.fromordinal(table[day.timetuple().tm_yday - 1])
+
+
+def sessions(market: str, start: date, end: date) -> Iterator[date]:
+    """The sessions from `start` to `end`, inclusive."""
+    for year in range(start.year, end.year + 1):
+        first = date(year, 1, 1).toordinal()
+        table = _last_sessions(market, year)
+        lo = max(start.toordinal(), first) - first
+        hi = min(end.toordinal(), first + len(table) - 1) - first
+        for index in range(lo, hi + 1):
+            if table[index] == first + index:
+                yield date.fromordinal(first + index)
+
+
+def session_gaps(
+    market: str, days: Iterable[date], start: date, end: date
+) -> List[Tuple[date, date]]:
+    """
+    The sessions from `start` to `end` that are not in `days`, as (first, last)
+    ranges. Missing sessions separated only by closed days form one range.
+    """
+    present = set(days)
+    gaps: List[Tuple[date, date]] = []
+    gap_start = gap_end = None
+
+    for day in sessions(market, start, end):
+        if day in present:
+            if gap_start is not None:
+                gaps.append((gap_start, gap_end))
+                gap_start = None
+        elif gap_start is None:
+            gap_start = gap_end = day
+        else:
+            gap_end = day
+
+    if gap_start is not None:
+        gaps.append((gap_start, gap_end))
+    return gaps
+
+
+def has_session_since(market: str, since: date, until: date) -> bool:
+    """Whether the market had a session after `since`, up to and including `until`."""
+    return last_session(market, until) > since
+
+
+def market_timezone(market: str | None) -> tzinfo | None:
+    """The time zone of the exchange. None if unknown."""
+    try:
+        return ZoneInfo(MARKET_TIMEZONES[market])
+    except (KeyError, ZoneInfoNotFoundError):
+        return None
+
+
+def market_now(market: str) -> datetime:
+    """The current date and time at the exchange, without the time zone."""
+    tz = market_timezone(market)
+    if tz is None:
+        return datetime.now()
+    return datetime.now(tz).replace(tzinfo=None)
+
+
+def market_today(market: str) -> date:
+    """The current date at the exchange."""
+    return market_now(market).date()
+
+
+def is_price_current(market: str, price_time: datetime, now: datetime) -> bool:
+    """
+    Whether the price, in exchange time, is the latest closing price as of `now`,
+    also in exchange time. A price taken during a session is not, nor is any
+    price while a session is pending or in progress today.
+    A price without a time (midnight) is taken as the closing price of its day.
+    """
+    close = MARKET_CLOSE[market]
+    price_date = price_time.date()
+    today = now.date()
+
+    has_time = price_time.time() != time(0)
+    if has_time and price_time.time() < close and is_session(market, price_date):
+        # Intraday.
+        return False
+
+    if price_date < today:
+        return not has_session_since(market, price_date, today)
+
+    return not is_session(market, today) or now.time() >= close
@@ -0,0 +1,58 @@
+"""
+Tests for the shared cache of the bean-price sources.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from alens.pricedl.beanprice.cache import SharedCache
+
+
+def test_single_flight():
+    """
+    Concurrent requests for the same key wait for the one load in flight.
+    """
+    cache = SharedCache()
+    release = threading.Event()
+    loads = []
+
+    def load():
+        loads.append(1)
+        release.wait(5)
+        return "price"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(cache.get, "ASX:VHY", load) for _ in range(8)]
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert results == ["price"] * 8
+    assert len(loads) == 1
+
+
+def test_ttl_and_errors():
+    """
+    Values expire after the TTL. Failed loads are not cached.
+    """
+    now = [0.0]
+    cache = SharedCache(ttl=60, clock=lambda: now[0])
+    loads = []
+
+    def load():
+        loads.append(1)
+        return len(loads)
+
+    assert cache.get("HY", load) == 1
+    now[0] = 59
+    assert cache.get("HY", load) == 1
+    now[0] = 61
+    assert cache.get("HY", load) == 2
+
+    def fail():
+        raise ConnectionError("offline")
+
+    with pytest.raises(ConnectionError):
+        cache.get("PROP", fail)
+    assert cache.get("PROP", load) == 3
@@ -0,0 +1,54 @@
+"""
+Tests for the local-first bean-price source.
+"""
+
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from alens.pricedl.beanprice import local
+from alens.pricedl.beanprice.cache import SharedCache
+
+SYMBOLS = """namespace,symbol,currency,updater,updater_symbol,ledger_symbol,ib_symbol,remarks
+XETRA,S0,EUR,yahoo_finance,,S0_DE,,
+"""
+
+
+def test_local_then_network(monkeypatch, tmp_path):
+    """
+    A stored price for the day is used. A gap is downloaded from the updater.
+    """
+    symbols_path = tmp_path / "symbols.csv"
+    symbols_path.write_text(SYMBOLS, encoding="utf-8")
+    prices_path = tmp_path / "prices.txt"
+    prices_path.write_text(
+        "P 2024-01-04 S0_DE 10.5 EUR\nP 2024-01-08 S0_DE 11 EUR\n", encoding="utf-8"
+    )
+
+    monkeypatch.setattr(local, "get_paths", lambda: (symbols_path, prices_path))
+    monkeypatch.setattr(local, "_setup_cache", SharedCache())
+    monkeypatch.setattr(local, "_index", None)
+    downloads = []
+
+    def fake_historical(self, ticker, time):
+        downloads.append((ticker, time.date()))
+        return None
+
+    monkeypatch.setattr(local.yahoo.Source, "get_historical_price", fake_historical)
+    source = local.Source()
+
+    def on(day):
+        return source.get_historical_price(
+            "XETRA:S0", datetime(2024, 1, day, 16, tzinfo=timezone.utc)
+        )
+
+    # Stored.
+    assert on(4).price == Decimal("10.5")
+    # Friday is missing, so it is downloaded.
+    assert on(5) is None
+    # Sunday: no session since Friday, the stored Thursday price is stale.
+    assert on(7) is None
+    assert on(8).price == Decimal(11)
+    assert on(8).time.tzinfo is not None
+    assert [day.day for _, day in downloads] == [5, 7]
+    assert downloads[0][0] == "XETRA:S0"
+    assert source.get_historical_price("XETRA:UNKNOWN", datetime.now()) is None
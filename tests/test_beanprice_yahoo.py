@@ -4,6 +4,7 @@ Tests for the bean-price Vanguard downloader
 
 # from datetime import date, datetime, timedelta, timezone
 
+from datetime import date, datetime, timezone
 from decimal import Decimal
 
 # import pytest
@@ -11,6 +12,8 @@ import beanprice.price
 from beanprice.price import DatedPrice, PriceSource
 
 from alens.pricedl.beanprice import yahoo
+from alens.pricedl.beanprice.cache import SeriesCache
+from alens.pricedl.model import Price, SecuritySymbol
 
 
 def test_dl_vhy():
@@ -89,3 +92,41 @@ def test_us_symbol_with_namespace():
     assert price is not None
     assert price.price != Decimal(0)
     assert price.quote_currency == "USD"
+
+
+def test_historical_prices_cached(monkeypatch):
+    """
+    The series is downloaded once per ticker, and the dates are looked up in it.
+    """
+    downloads = []
+
+    def fake_series(ticker):
+        downloads.append(ticker)
+        symbol = SecuritySymbol("ASX", "VHY")
+        return [
+            Price(symbol, date(2024, 1, day), None, Decimal(day), "AUD")
+            for day in (5, 2, 3)
+        ]
+
+    monkeypatch.setattr(yahoo, "_series_cache", SeriesCache())
+    monkeypatch.setattr(yahoo, "download_series", fake_series)
+    source = yahoo.Source()
+
+    # Saturday: the price of Friday.
+    saturday = source.get_historical_price(
+        "ASX:VHY", datetime(2024, 1, 6, 16, tzinfo=timezone.utc)
+    )
+    before = source.get_historical_price(
+        "ASX:VHY", datetime(2024, 1, 1, 16, tzinfo=timezone.utc)
+    )
+    series = source.get_prices_series(
+        "ASX:VHY",
+        datetime(2024, 1, 3, tzinfo=timezone.utc),
+        datetime(2024, 1, 5, tzinfo=timezone.utc),
+    )
+
+    assert saturday.price == Decimal(5)
+    assert saturday.time.tzinfo is not None
+    assert before is None
+    assert [p.price for p in series] == [Decimal(3), Decimal(5)]
+    assert downloads == ["ASX:VHY"]
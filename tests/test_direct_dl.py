@@ -1,8 +1,25 @@
 '''
 Test the new logic, that downloads in memory.
 '''
-from alens.pricedl.direct_dl import dl_quotes
-from alens.pricedl.model import SecurityFilter
+import asyncio
+import datetime
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+from alens.pricedl import direct_dl
+from alens.pricedl.config import PriceDbConfig
+from alens.pricedl.direct_dl import Checkpoint, dl_quotes
+from alens.pricedl.model import Price, SecurityFilter, SecuritySymbol, SymbolMetadata
+from alens.pricedl.price_flat_file import PriceFlatFile
+from alens.pricedl.quote import Quote
+from alens.pricedl.sqlite_store import SqlitePriceStore
+
+SYMBOLS_HEADER = (
+    "namespace,symbol,currency,updater,updater_symbol,ledger_symbol,ib_symbol,remarks"
+)
+NO_FILTER = SecurityFilter(None, None, None, None)
 
 
 def test_xetra_dl():
@@ -39,3 +56,322 @@ async def test_vanguard():
     '''
     sec_filter = SecurityFilter(None, None, 'VANGUARD', 'HY')
     dl_quotes(sec_filter)
+
+
+def xetra_symbols(count: int, ledger_suffix: str = "_DE") -> str:
+    '''
+    The symbols list with S0, S1, ... on XETRA, downloaded from Yahoo.
+    Without the suffix, the ledger symbol is the symbol.
+    '''
+    rows = [SYMBOLS_HEADER]
+    for i in range(count):
+        ledger_symbol = f"S{i}{ledger_suffix}" if ledger_suffix else ""
+        rows.append(f"XETRA,S{i},EUR,yahoo_finance,,{ledger_symbol},,")
+    return "\n".join(rows)
+
+
+def fake_price(namespace: str, symbol: str, day: datetime.date, value) -> Price:
+    '''
+    A downloaded price in EUR.
+    '''
+    return Price(SecuritySymbol(namespace, symbol), day, None, Decimal(value), "EUR")
+
+
+@pytest.fixture
+def offline_run(monkeypatch, tmp_path):
+    '''
+    Point the download at temporary files instead of the configured ones.
+    The settings are empty, or the given ones, instead of the user's pricedl.toml.
+    Returns a function that writes the symbols list and returns the prices path.
+    '''
+    def setup(symbols_csv: str, config=None) -> Path:
+        symbols_path = tmp_path / "symbols.csv"
+        symbols_path.write_text(symbols_csv, encoding="utf-8")
+        prices_path = tmp_path / "prices.txt"
+        prices_path.write_text(Path("tests/prices.txt").read_text(), encoding="utf-8")
+
+        monkeypatch.setattr(direct_dl, "get_paths", lambda: (symbols_path, prices_path))
+        monkeypatch.setattr(
+            direct_dl, "get_failed_symbols_path", lambda config: tmp_path / "failed.json"
+        )
+        monkeypatch.setattr(
+            PriceDbConfig, "_load_config", lambda self: dict(config or {})
+        )
+        return prices_path
+
+    return setup
+
+
+class FakeBatchDownloader:
+    '''
+    Replaces the batch download. Returns a price for every security, except
+    for the `broken` symbols, and records the requests and the concurrency.
+    '''
+    def __init__(self):
+        self.requested = []
+        self.broken = set()
+        self.value = "1.5"
+        # Seconds to wait per batch, by the batch.
+        self.delay = lambda batch: 0
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, batch, registry=None):
+        self.requested.extend(sec.symbol for sec in batch)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delay(batch))
+        self.running -= 1
+        if batch[0].symbol in self.broken:
+            raise ConnectionError("provider down")
+        return [
+            (sec, fake_price(sec.namespace, sec.symbol, datetime.date(2024, 1, 2),
+                             self.value))
+            for sec in batch
+        ]
+
+
+@pytest.fixture
+def fake_batches(monkeypatch):
+    '''
+    The batch downloads, answered by FakeBatchDownloader.
+    '''
+    fake = FakeBatchDownloader()
+    monkeypatch.setattr(direct_dl, "download_batch_async", fake)
+    return fake
+
+
+class FakeHistory:
+    '''
+    Replaces the history download. Returns a price for every day of the range,
+    valued at the day number, except for the `broken` symbols.
+    '''
+    def __init__(self):
+        self.requests = []
+        self.broken = set()
+
+    async def __call__(self, quote, exchange, symbol, start, end):
+        self.requests.append((symbol, start, end))
+        if symbol in self.broken:
+            raise ConnectionError("Not found")
+        days = (end - start).days + 1
+        return [
+            fake_price(exchange, symbol, start + datetime.timedelta(days=d), d + 1)
+            for d in range(days)
+        ]
+
+
+@pytest.fixture
+def fake_history(monkeypatch):
+    '''
+    The history downloads, answered by FakeHistory.
+    '''
+    fake = FakeHistory()
+
+    async def fetch_history_async(quote, exchange, symbol, start, end):
+        return await fake(quote, exchange, symbol, start, end)
+
+    monkeypatch.setattr(Quote, "fetch_history_async", fetch_history_async)
+    return fake
+
+
+def test_concurrent_dl(monkeypatch, offline_run, fake_batches):
+    '''
+    The downloads run concurrently, up to the given limit, and all the prices
+    end up in the price file.
+    '''
+    prices_path = offline_run(xetra_symbols(10))
+    # Complete out of order.
+    fake_batches.delay = lambda batch: 0.001 * (10 - int(batch[0].symbol[1:]))
+    # One symbol per batch.
+    monkeypatch.setattr(direct_dl, "get_batch_size", lambda agent, registry: 1)
+
+    direct_dl.dl_quotes(NO_FILTER, concurrency=3)
+
+    assert fake_batches.max_running == 3
+    prices = PriceFlatFile.load(prices_path).prices
+    for i in range(10):
+        assert prices[f"S{i}_DE"].value == Decimal("1.5")
+    # Existing prices are kept.
+    assert "OPI" in prices
+
+
+def test_checkpoint_every():
+    '''
+    A checkpoint is due after every N prices, and never without the settings.
+    '''
+    checkpoint = Checkpoint(every=2)
+    assert not checkpoint.record()
+    assert checkpoint.record()
+    checkpoint.reset()
+    assert checkpoint.pending == 0
+    assert not checkpoint.record()
+
+    at_end_only = Checkpoint()
+    assert not any(at_end_only.record() for _ in range(100))
+
+
+def test_plan_batches(monkeypatch):
+    '''
+    Symbols are grouped by updater, exchange and currency, and split by batch size.
+    Yahoo Finance fetches the symbols of all the exchanges together.
+    '''
+    def sec(namespace, symbol, updater, currency="EUR"):
+        return SymbolMetadata(namespace, symbol, currency, updater, None, None, None, None)
+
+    securities = [sec("XETRA", f"S{i}", "yahoo_finance") for i in range(5)]
+    securities += [
+        sec("AMS", "VHYL", "yahoo_finance"),
+        sec("ASX", "VHY", "yahoo_finance", "AUD"),
+        sec("CURRENCY", "AUD", "ecb"),
+        sec("CURRENCY2", "USD", "ecb"),
+    ]
+    monkeypatch.setattr(
+        direct_dl,
+        "get_batch_size",
+        lambda agent, registry: 2 if agent == "yahoo_finance" else 1,
+    )
+
+    batches = direct_dl.plan_batches(securities, None)
+
+    assert [[s.symbol for s in batch] for batch in batches] == [
+        ["S0", "S1"], ["S2", "S3"], ["S4", "VHYL"], ["VHY"], ["AUD"], ["USD"],
+    ]
+
+
+def test_continue_on_error_and_retry_failed(monkeypatch, offline_run, fake_batches):
+    '''
+    A failing symbol does not stop the run. The retry run fetches only the
+    failed symbols.
+    '''
+    prices_path = offline_run(xetra_symbols(4, ledger_suffix=""))
+    monkeypatch.setattr(direct_dl, "get_batch_size", lambda agent, registry: 1)
+    fake_batches.broken = {"S1", "S2"}
+    fake_batches.value = "2"
+
+    failed = direct_dl.dl_quotes(NO_FILTER)
+
+    assert sorted(sec.symbol for sec in failed) == ["S1", "S2"]
+    prices = PriceFlatFile.load(prices_path).prices
+    assert "S0" in prices and "S3" in prices
+
+    fake_batches.requested.clear()
+    fake_batches.broken = {"S2"}
+    failed = direct_dl.dl_quotes(NO_FILTER, retry_failed=True)
+
+    assert sorted(fake_batches.requested) == ["S1", "S2"]
+    assert [sec.symbol for sec in failed] == ["S2"]
+    assert "S1" in PriceFlatFile.load(prices_path).prices
+
+
+def test_fresh_symbol_no_longer_failed(tmp_path, monkeypatch, offline_run, fake_batches):
+    '''
+    A failed symbol that is skipped in a later run, as its price is current,
+    is removed from the failed symbols.
+    '''
+    prices_path = offline_run(xetra_symbols(2, ledger_suffix=""))
+    monkeypatch.setattr(direct_dl, "get_batch_size", lambda agent, registry: 1)
+    fake_batches.broken = {"S1"}
+    direct_dl.dl_quotes(NO_FILTER)
+    failed_path = tmp_path / "failed.json"
+    assert direct_dl.load_failed_symbols(failed_path) == {"XETRA:S1"}
+
+    with open(prices_path, "a", encoding="utf-8") as f:
+        f.write(f"P {datetime.date.today()} S1 2 EUR\n")
+    fake_batches.requested.clear()
+    direct_dl.dl_quotes(NO_FILTER, retry_failed=True, max_age="52w")
+
+    assert fake_batches.requested == []
+    assert direct_dl.load_failed_symbols(failed_path) == set()
+
+
+def test_backfill(offline_run, fake_history):
+    '''
+    The history of each symbol is fetched in one request and merged into the
+    price file, next to the existing prices.
+    '''
+    prices_path = offline_run(xetra_symbols(3))
+    fake_history.broken = {"S2"}
+
+    failed = direct_dl.backfill(
+        NO_FILTER, datetime.date(2024, 1, 1), datetime.date(2024, 1, 3)
+    )
+
+    assert len(fake_history.requests) == 3
+    assert [sec.symbol for sec in failed] == ["S2"]
+    price_file = PriceFlatFile.load(prices_path)
+    assert len(price_file.history.series("S0_DE")) == 3
+    assert price_file.prices["S1_DE"].value == Decimal(3)
+    assert "OPI" in price_file.prices
+
+
+def test_fill_gaps(offline_run, fake_history):
+    '''
+    Only the missing sessions are requested, one request per gap.
+    '''
+    prices_path = offline_run(xetra_symbols(1))
+    with open(prices_path, "a", encoding="utf-8") as f:
+        for day in ("2024-01-02", "2024-01-03", "2024-01-08", "2024-01-10"):
+            f.write(f"P {day} S0_DE 1 EUR\n")
+
+    gaps = direct_dl.find_gaps(NO_FILTER, end=datetime.date(2024, 1, 10))
+    assert [(sec.symbol, ranges) for sec, ranges in gaps] == [
+        ("S0", [(datetime.date(2024, 1, 4), datetime.date(2024, 1, 5)),
+                (datetime.date(2024, 1, 9), datetime.date(2024, 1, 9))]),
+    ]
+
+    asyncio.run(direct_dl.fill_gaps_async(gaps))
+
+    assert [(start, end) for _, start, end in fake_history.requests] == [
+        r for _, ranges in gaps for r in ranges
+    ]
+    price_file = PriceFlatFile.load(prices_path)
+    assert len(price_file.history.series("S0_DE")) == 7
+
+
+def test_dl_into_database(tmp_path, offline_run, fake_batches):
+    '''
+    With a price database in the settings, the prices go to the database and
+    the price file is not changed.
+    '''
+    database_path = tmp_path / "prices.db"
+    prices_path = offline_run(
+        xetra_symbols(1), {"price_database_path": str(database_path)}
+    )
+    before = prices_path.read_text(encoding="utf-8")
+
+    direct_dl.dl_quotes(NO_FILTER)
+
+    assert prices_path.read_text(encoding="utf-8") == before
+    with SqlitePriceStore(database_path) as store:
+        assert store.prices["S0_DE"].value == Decimal("1.5")
+
+
+def test_batch_shared_download_symbol(monkeypatch):
+    '''
+    Securities in a batch that share the download symbol all get its price.
+    '''
+    requested = []
+
+    async def fetch_symbols_async(quote, sec_symbols):
+        requested.append([str(symbol) for symbol in sec_symbols])
+        return [
+            fake_price(
+                symbol.namespace, symbol.mnemonic, datetime.date(2024, 1, 2), "1.5"
+            )
+            for symbol in sec_symbols
+        ]
+
+    monkeypatch.setattr(Quote, "fetch_symbols_async", fetch_symbols_async)
+    batch = [
+        SymbolMetadata("XETRA", "EXH9", "EUR", "yahoo_finance", None, None, None, None),
+        SymbolMetadata("XETRA", "EXH9B", "EUR", "yahoo_finance", "EXH9", None, None, None),
+        SymbolMetadata("AMS", "S1", "EUR", "yahoo_finance", None, None, None, None),
+    ]
+
+    results = asyncio.run(direct_dl.download_batch_async(batch))
+
+    assert requested == [["XETRA:EXH9", "AMS:S1"]]
+    assert [(sec.symbol, str(price.symbol)) for sec, price in results] == [
+        ("EXH9", "XETRA:EXH9"), ("EXH9B", "XETRA:EXH9"), ("S1", "AMS:S1"),
+    ]
@@ -2,8 +2,12 @@
 ECB Quotes
 """
 
+import datetime
+from decimal import Decimal
 from pathlib import Path
+
 from alens.pricedl.model import SecuritySymbol
+from alens.pricedl.quotes import rate_table
 from alens.pricedl.quotes.ecb import EcbDownloader
 
 
@@ -53,3 +57,31 @@ def test_temp_dir():
     assert parent_dir is not None
     assert parent_dir.exists()
     assert parent_dir.is_dir()
+
+
+def test_rates_keyed_by_eur(monkeypatch):
+    """
+    The rates are loaded once, into the EUR table, and the prices are in the
+    requested currency.
+    """
+    rate_table.clear_rate_tables()
+    loads = []
+
+    def fetch_daily_rates(self):
+        loads.append(1)
+        return {"date": "2024-01-02", "rates": {"AUD": 1.6, "GBP": 0.8}}
+
+    monkeypatch.setattr(EcbDownloader, "daily_cache_exists", lambda self: False)
+    monkeypatch.setattr(EcbDownloader, "write_daily_cache", lambda self, data: None)
+    monkeypatch.setattr(EcbDownloader, "fetch_daily_rates", fetch_daily_rates)
+    dl = EcbDownloader()
+
+    aud = dl.download(SecuritySymbol("CURRENCY", "AUD"), "eur")
+    gbp = dl.download(SecuritySymbol("CURRENCY", "GBP"), "EUR")
+
+    assert loads == [1]
+    assert [key[:2] for key in rate_table._tables] == [("ECB", "EUR")]
+    assert (aud.value, aud.currency) == (Decimal("0.6250"), "EUR")
+    assert (gbp.value, gbp.currency) == (Decimal("1.2500"), "EUR")
+    assert aud.date == datetime.date(2024, 1, 2)
+    rate_table.clear_rate_tables()
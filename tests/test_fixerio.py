@@ -1,3 +1,75 @@
 '''
 Tests for fixerio
 '''
+from datetime import date
+from decimal import Decimal
+
+import pytest
+import requests
+
+from alens.pricedl.model import SecuritySymbol
+from alens.pricedl.quotes.fixerio import Fixerio, create_rate_table, map_rates_to_price
+from alens.pricedl.quotes.rate_table import clear_rate_tables
+from alens.pricedl.retry import is_transient
+
+RATES = {
+    "success": True,
+    "date": "2024-01-02",
+    "base": "EUR",
+    "rates": {"AUD": 1.6, "USD": 1.1, "XXX": 0},
+}
+
+
+def test_map_rates_to_price():
+    '''
+    The rate is inverted to get the price of the currency in the base currency.
+    '''
+    price = map_rates_to_price(RATES, "aud")
+
+    assert price.value == Decimal("0.625000")
+    assert price.currency == "EUR"
+    assert price.date == date(2024, 1, 2)
+    assert str(price.symbol) == "CURRENCY:AUD"
+
+
+def test_rates_loaded_once(monkeypatch):
+    '''
+    The rates are loaded once and shared by all the currencies.
+    '''
+    clear_rate_tables()
+    loads = []
+
+    def fake_load(self, base):
+        loads.append(base)
+        return create_rate_table(RATES)
+
+    monkeypatch.setattr(Fixerio, "_load_rate_table", fake_load)
+    dl = Fixerio(api_key="x" * 32)
+
+    aud = dl.download(SecuritySymbol("CURRENCY", "AUD"), "EUR")
+    usd = dl.download(SecuritySymbol("CURRENCY", "USD"), "EUR")
+
+    assert loads == ["EUR"]
+    assert aud.value == Decimal("0.625000")
+    assert usd.value == Decimal("0.909091")
+    clear_rate_tables()
+
+
+def test_throttling_is_transient():
+    '''
+    An HTTP error keeps its status code, for the retries.
+    '''
+    response = requests.Response()
+    response.status_code = 429
+    response.url = "http://data.fixer.io/api/latest"
+
+    class FakeSession:
+        def get(self, url, params=None, timeout=None):
+            return response
+
+    dl = Fixerio(api_key="x" * 32)
+    dl.session = FakeSession()
+
+    with pytest.raises(requests.HTTPError) as error:
+        dl._download_rates_from_api("EUR")
+    assert is_transient(error.value)
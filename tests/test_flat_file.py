@@ -3,9 +3,13 @@ Test price file handling
 """
 
 import datetime
+import pickle
 from decimal import Decimal
 from pathlib import Path
 
+import pytest
+
+from alens.pricedl import price_flat_file
 from alens.pricedl.model import Price, SecuritySymbol
 from alens.pricedl.price_flat_file import PriceFlatFile, PriceRecord
 
@@ -42,3 +46,208 @@ def test_conversion_to_datarecord():
     assert price_record.symbol == "VEUR_AS"
     assert price_record.value == Decimal("1.5")
     assert price_record.currency == "EUR"
+
+
+def test_save_is_atomic(tmp_path):
+    '''
+    Saving replaces the file in one step and leaves no temporary files behind.
+    '''
+    file_path = tmp_path / "prices.txt"
+    file_path.write_text(Path("tests/prices.txt").read_text(), encoding="utf-8")
+    price_file = PriceFlatFile.load(file_path)
+
+    price_file.save()
+
+    assert [p.name for p in tmp_path.iterdir()] == ["prices.txt"]
+    lines = file_path.read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "P 2023-03-11 USD 1.11 EUR"
+    assert lines[-1] == "P 2023-04-15 12:00:00 VEUR_AS 1.5 EUR"
+
+
+def test_append_and_compact(tmp_path):
+    '''
+    Appended prices go to the end of the file. Compacting sorts the file and
+    removes the duplicates.
+    '''
+    file_path = tmp_path / "prices.txt"
+    # The last line is not terminated.
+    file_path.write_text("P 2023-04-01 OPI 26.128 USD\nP 2023-04-14 GBP 1.13 EUR",
+                         encoding="utf-8")
+    price_file = PriceFlatFile.load(file_path)
+
+    older = PriceRecord(datetime.datetime(2023, 3, 1), "OPI", Decimal("25"), "USD")
+    fixed = PriceRecord(datetime.datetime(2023, 4, 14), "GBP", Decimal("1.14"), "EUR")
+    price_file.append([older, fixed])
+
+    assert file_path.read_text(encoding="utf-8").splitlines() == [
+        "P 2023-04-01 OPI 26.128 USD",
+        "P 2023-04-14 GBP 1.13 EUR",
+        "P 2023-03-01 OPI 25 USD",
+        "P 2023-04-14 GBP 1.14 EUR",
+    ]
+
+    PriceFlatFile(file_path).compact()
+
+    assert file_path.read_text(encoding="utf-8").splitlines() == [
+        "P 2023-03-01 OPI 25 USD",
+        "P 2023-04-01 OPI 26.128 USD",
+        "P 2023-04-14 GBP 1.14 EUR",
+    ]
+
+
+def test_parse_dates(tmp_path, capsys):
+    """
+    The fast path handles ISO dates, falls back for unpadded ones,
+    and still warns about malformed lines.
+    """
+    file_path = tmp_path / "prices.txt"
+    file_path.write_text(
+        "P 2023-04-14 VEUR_AS 13.24 EUR\n"
+        "P 2023-04-14 12:30:00 GBP 1.13 EUR\n"
+        "P 2023-4-15 VEUR_AS 13.30 EUR\n"
+        "P 2023-13-01 BAD 1 EUR\n",
+        encoding="utf-8",
+    )
+
+    price_file = PriceFlatFile.load(file_path)
+
+    veur = list(price_file.history.series("VEUR_AS"))
+    assert [r.datetime for r in veur] == [
+        datetime.datetime(2023, 4, 14),
+        datetime.datetime(2023, 4, 15),
+    ]
+    assert price_file.prices["GBP"].datetime == datetime.datetime(2023, 4, 14, 12, 30)
+    assert "BAD" not in price_file.prices
+    assert "Skipping malformed line 4" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    "date_time_str",
+    [
+        "20230414",
+        "2023-W15-5",
+        "2023-04-14T10:00:00",
+        "2023-04-14 10:00",
+        "2023-04-14 10:00:00.5",
+        "2023-04-14 10:00:00+01:00",
+    ],
+)
+def test_parse_dates_strict(date_time_str):
+    """
+    Only the formats of the price file are accepted, not all of ISO 8601.
+    """
+    with pytest.raises(ValueError):
+        price_flat_file._parse_stamp(date_time_str)
+
+
+def test_scan(tmp_path, capsys):
+    """
+    Scanning yields only the matching records, without loading the history.
+    """
+    file_path = tmp_path / "prices.txt"
+    file_path.write_text(
+        "# comment\n"
+        "P 2023-04-13 VEUR_AS 13.10 EUR\n"
+        "P 2023-04-13 EUR 1.10 USD\n"
+        "P 2023-04-14 XVEUR_AS 99 EUR\n"
+        "P 2023-04-14 VEUR_AS oops EUR\n"
+        "P 2023-04-15 VEUR_AS 13.30 EUR\n"
+        "P 2023-04-15 12:00:00 GBP 1.13 EUR",
+        encoding="utf-8",
+    )
+    price_file = PriceFlatFile(file_path)
+
+    assert len(list(price_file.iter_records())) == 5
+
+    veur = list(price_file.scan(symbols=["VEUR_AS"]))
+    assert [r.value for r in veur] == [Decimal("13.10"), Decimal("13.30")]
+    assert "malformed line 5" in capsys.readouterr().out
+
+    # The currency column matches the bytes filter, but not the symbol.
+    eur = list(price_file.scan(symbols=["EUR"]))
+    assert [r.currency for r in eur] == ["USD"]
+
+    recent = list(
+        price_file.scan(symbols=["VEUR_AS", "GBP"], since=datetime.date(2023, 4, 15))
+    )
+    assert [r.symbol for r in recent] == ["VEUR_AS", "GBP"]
+    assert len(price_file.history) == 0
+
+
+def test_compact_record():
+    """
+    The compact record keeps the Decimal, datetime and str API.
+    """
+    record = PriceRecord(
+        datetime_val=datetime.datetime(2023, 4, 14, 12, 30, 5),
+        symbol="VEUR_AS",
+        value=Decimal("13.240"),
+        currency="EUR",
+    )
+
+    assert not hasattr(record, "__dict__")
+    assert record.datetime == datetime.datetime(2023, 4, 14, 12, 30, 5)
+    assert record.value == Decimal("13.240")
+    assert str(record) == "P 2023-04-14 12:30:05 VEUR_AS 13.240 EUR"
+
+    record.value = Decimal("-0.5")
+    record.datetime = datetime.datetime(2023, 4, 15)
+    record.currency = "USD"
+    assert str(record) == "P 2023-04-15 VEUR_AS -0.5 USD"
+
+    copy = pickle.loads(pickle.dumps(record))
+    assert str(copy) == str(record)
+
+    with pytest.raises(ValueError):
+        record.value = Decimal("NaN")
+
+
+def test_long_value_round_trip():
+    """
+    Values longer than the Decimal context precision are kept exactly.
+    """
+    text = "12345678901234567890.123456789012345"
+    line = f"P 2023-04-14 VEUR_AS {text} EUR"
+
+    record = price_flat_file._parse_line(line)
+    assert str(record.value) == text
+    assert str(record) == line
+
+    record.value = Decimal("-" + text)
+    assert record.value == Decimal("-" + text)
+    assert str(record) == f"P 2023-04-14 VEUR_AS -{text} EUR"
+
+
+def test_load_latest(tmp_path, monkeypatch):
+    """
+    The latest prices are read from the end of the file, stopping once all
+    the symbols are found. The partial history can only be appended to.
+    """
+    file_path = tmp_path / "prices.txt"
+    file_path.write_text(
+        "".join(f"P 2024-01-{day:02d} VEUR {day}.00 EUR\n" for day in range(1, 29))
+        + "P 2024-01-28 GBP 1.10 EUR\n"
+        + "P 2024-01-29 VEUR 29.00 EUR",
+        encoding="utf-8",
+    )
+    parsed = []
+    parse_line = price_flat_file._parse_line
+    monkeypatch.setattr(
+        price_flat_file,
+        "_parse_line",
+        lambda line: parsed.append(line) or parse_line(line),
+    )
+
+    price_file = PriceFlatFile.load_latest(file_path, ["VEUR", "GBP"])
+
+    assert price_file.prices["VEUR"].value == Decimal("29.00")
+    assert price_file.prices["GBP"].value == Decimal("1.10")
+    assert len(parsed) == 2
+
+    with pytest.raises(IOError):
+        price_file.save()
+    price_file.append(
+        [PriceRecord(datetime.datetime(2024, 1, 30), "GBP", Decimal("1.2"), "EUR")]
+    )
+    assert PriceFlatFile.load(file_path).prices["GBP"].value == Decimal("1.2")
+    assert len(PriceFlatFile.load(file_path).history) == 31
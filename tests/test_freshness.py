@@ -0,0 +1,91 @@
+'''
+Tests for the freshness policy.
+'''
+from datetime import datetime, timedelta
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from alens.pricedl.config import PriceDbConfig
+from alens.pricedl.freshness import FreshnessPolicy, parse_age
+from alens.pricedl.model import SymbolMetadata
+from alens.pricedl.price_flat_file import PriceRecord
+
+
+def test_parse_age():
+    '''
+    Ages with units
+    '''
+    assert parse_age("30m") == timedelta(minutes=30)
+    assert parse_age("12h") == timedelta(hours=12)
+    assert parse_age("1d") == timedelta(days=1)
+    assert parse_age("6") == timedelta(hours=6)
+    with pytest.raises(ValueError):
+        parse_age("yesterday")
+
+
+def test_policy_precedence():
+    '''
+    The namespace setting wins over the updater setting and the default.
+    '''
+    config = PriceDbConfig()
+    config.config_data = {
+        "max_age": "1h",
+        "updaters": {"fixerio": {"max_age": "1d"}},
+        "namespaces": {"ASX": {"max_age": "20h"}},
+    }
+    policy = FreshnessPolicy.from_config(config)
+
+    def sec(namespace, updater):
+        return SymbolMetadata(namespace, "X", "EUR", updater, None, None, None, None)
+
+    assert policy.get_max_age(sec("ASX", "fixerio")) == timedelta(hours=20)
+    assert policy.get_max_age(sec("CURRENCY", "fixerio")) == timedelta(days=1)
+    assert policy.get_max_age(sec("XETRA", "yahoo_finance")) == timedelta(hours=1)
+
+
+def test_is_fresh():
+    '''
+    Compare the stored price time with now.
+    '''
+    policy = FreshnessPolicy(default=timedelta(hours=12))
+    sec = SymbolMetadata("XETRA", "X", "EUR", "yahoo_finance", None, None, None, None)
+    record = PriceRecord(datetime(2024, 1, 2, 17, 30), "X", Decimal(1), "EUR")
+
+    berlin = ZoneInfo("Europe/Berlin")
+
+    assert policy.is_fresh(sec, record, datetime(2024, 1, 3, 5, 0, tzinfo=berlin))
+    assert not policy.is_fresh(sec, record, datetime(2024, 1, 3, 6, 0, tzinfo=berlin))
+    assert not policy.is_fresh(sec, None, datetime(2024, 1, 3, 5, 0, tzinfo=berlin))
+    assert not FreshnessPolicy().is_fresh(
+        sec, record, datetime(2024, 1, 3, 5, 0, tzinfo=berlin)
+    )
+
+
+def test_is_fresh_in_exchange_time():
+    '''
+    The price time is in the exchange's time zone, not the caller's.
+    '''
+    policy = FreshnessPolicy(default=timedelta(hours=12))
+    sec = SymbolMetadata("ASX", "VHY", "AUD", "yahoo_finance", None, None, None, None)
+    # 16:10 in Sydney (UTC+11) is 05:10 UTC.
+    record = PriceRecord(datetime(2024, 1, 2, 16, 10), "VHY", Decimal(1), "AUD")
+    utc = ZoneInfo("UTC")
+
+    assert policy.is_fresh(sec, record, datetime(2024, 1, 2, 17, 0, tzinfo=utc))
+    assert not policy.is_fresh(sec, record, datetime(2024, 1, 2, 20, 0, tzinfo=utc))
+
+
+def test_invalid_config_age():
+    '''
+    An invalid age in the configuration names the setting.
+    '''
+    config = PriceDbConfig()
+    config.config_data = {"updaters": {"fixerio": {"max_age": "daily"}}}
+    with pytest.raises(ValueError, match=r"updaters\.fixerio\.max_age"):
+        FreshnessPolicy.from_config(config)
+
+    config.config_data = {"namespaces": {"ASX": {"max_age": ["1d"]}}}
+    with pytest.raises(ValueError, match=r"namespaces\.ASX\.max_age"):
+        FreshnessPolicy.from_config(config)
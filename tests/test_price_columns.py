@@ -0,0 +1,61 @@
+"""
+Test the columnar price store.
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from alens.pricedl.price_flat_file import PriceRecord
+
+np = pytest.importorskip("numpy")
+
+from alens.pricedl.price_columns import PriceColumns  # noqa: E402
+
+
+def _record(day: int, symbol: str, value: str) -> PriceRecord:
+    return PriceRecord(datetime(2024, 1, day), symbol, Decimal(value), "EUR")
+
+
+def test_build_and_lookup():
+    """
+    The rows are grouped per symbol, sorted, and the last duplicate wins.
+    """
+    columns = PriceColumns.from_records(
+        [
+            _record(3, "VEUR", "3.00"),
+            _record(1, "GBP", "1.10"),
+            _record(1, "VEUR", "1.00"),
+            _record(3, "VEUR", "3.50"),
+            _record(2, "VEUR", "2.00"),
+        ]
+    )
+
+    assert len(columns) == 4
+    assert set(columns.symbols()) == {"VEUR", "GBP"}
+    assert list(PriceColumns.values(columns.series("VEUR"))) == [1.0, 2.0, 3.5]
+
+    record = columns.as_of("VEUR", date(2024, 1, 2))
+    assert record.value == Decimal("2.00")
+    assert str(record) == "P 2024-01-02 VEUR 2.00 EUR"
+    assert columns.as_of("VEUR", date(2023, 12, 31)) is None
+    assert columns.latest("VEUR").value == Decimal("3.50")
+
+    rows = columns.between("VEUR", date(2024, 1, 2), date(2024, 1, 3))
+    assert list(PriceColumns.datetimes(rows)) == [
+        np.datetime64("2024-01-02"),
+        np.datetime64("2024-01-03"),
+    ]
+    assert rows.base is not None
+
+
+def test_empty():
+    """
+    An empty store answers the queries.
+    """
+    columns = PriceColumns.from_records([])
+
+    assert len(columns) == 0
+    assert columns.as_of("VEUR", date(2024, 1, 1)) is None
+    assert len(columns.between("VEUR", date(2024, 1, 1), date(2024, 1, 2))) == 0
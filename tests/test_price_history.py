@@ -0,0 +1,73 @@
+"""
+Test the price history store
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+from alens.pricedl.price_flat_file import PriceFlatFile, PriceRecord
+from alens.pricedl.price_history import PriceHistory
+
+
+def _record(symbol: str, day: int, value: str) -> PriceRecord:
+    return PriceRecord(datetime(2024, 1, day), symbol, Decimal(value), "EUR")
+
+
+def test_history_keeps_all_records():
+    """
+    All the records are kept, one per symbol and date/time, in date order.
+    """
+    history = PriceHistory()
+    history.add(_record("A", 3, "3"))
+    history.add(_record("A", 1, "1"))
+    history.add(_record("B", 2, "2"))
+    # Replaces the existing record.
+    history.add(_record("A", 3, "3.5"))
+
+    assert len(history) == 3
+    assert [str(r) for r in history] == [
+        "P 2024-01-01 A 1 EUR",
+        "P 2024-01-02 B 2 EUR",
+        "P 2024-01-03 A 3.5 EUR",
+    ]
+    assert history.latest["A"].value == Decimal("3.5")
+    assert history.series("A").as_of(datetime(2024, 1, 2)).value == Decimal("1")
+    assert history.series("A").as_of(datetime(2023, 12, 31)) is None
+
+
+def test_latest_view():
+    """
+    The latest view maps the symbols to their latest record.
+    """
+    history = PriceHistory()
+    history.latest["A"] = _record("A", 2, "2")
+    history.latest["A"] = _record("A", 1, "1")
+
+    assert len(history.latest) == 1
+    assert history.latest["A"].value == Decimal("2")
+    assert "B" not in history.latest
+
+    del history.latest["A"]
+    assert len(history) == 0
+
+
+def test_file_keeps_history(tmp_path):
+    """
+    Older prices in the file survive loading and saving.
+    """
+    file_path = tmp_path / "prices.txt"
+    file_path.write_text(
+        "P 2024-01-01 A 1 EUR\nP 2024-01-02 A 2 EUR\nP 2024-01-01 B 5 EUR\n",
+        encoding="utf-8",
+    )
+
+    price_file = PriceFlatFile.load(file_path)
+    price_file.prices["A"] = _record("A", 3, "3")
+    price_file.save()
+
+    assert file_path.read_text(encoding="utf-8").splitlines() == [
+        "P 2024-01-01 A 1 EUR",
+        "P 2024-01-01 B 5 EUR",
+        "P 2024-01-02 A 2 EUR",
+        "P 2024-01-03 A 3 EUR",
+    ]
@@ -0,0 +1,73 @@
+"""
+Test the point-in-time price lookup.
+"""
+
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+from alens.pricedl.price_index import PriceIndex, get_index_path, get_price
+
+PRICES = (
+    "P 2024-01-03 VEUR 3.00 EUR\n"
+    "P 2024-01-01 VEUR 1.00 EUR\n"
+    "P 2024-01-02 12:00:00 VEUR 2.00 EUR\n"
+    "not a price\n"
+    "P 2024-01-02 GBP 1.10 EUR\n"
+    "P 2024-01-03 VEUR 3.50 EUR\n"
+)
+
+
+def test_lookup(tmp_path):
+    """
+    The price in effect on a day is found through the index, which is saved.
+    """
+    prices_path = tmp_path / "prices.txt"
+    prices_path.write_text(PRICES, encoding="utf-8")
+
+    assert get_price(prices_path, "VEUR", date(2024, 1, 2)).value == Decimal("2.00")
+    assert get_index_path(prices_path).exists()
+
+    assert get_price(prices_path, "VEUR", date(2023, 12, 31)) is None
+    assert get_price(prices_path, "VEUR", datetime(2024, 1, 2)).value == Decimal(
+        "1.00"
+    )
+    # The last line for a date wins.
+    assert get_price(prices_path, "VEUR").value == Decimal("3.50")
+    assert get_price(prices_path, "AUD") is None
+
+    index = PriceIndex.open(prices_path)
+    assert set(index.symbols()) == {"VEUR", "GBP"}
+    assert index._toc, "The saved index is used"
+
+
+def test_rebuild_on_change(tmp_path):
+    """
+    The index is rebuilt when the price file changes.
+    """
+    prices_path = tmp_path / "prices.txt"
+    prices_path.write_text(PRICES, encoding="utf-8")
+    assert get_price(prices_path, "VEUR").value == Decimal("3.50")
+
+    with open(prices_path, "a", encoding="utf-8") as f:
+        f.write("P 2024-01-04 VEUR 4.00 EUR\n")
+    stat = prices_path.stat()
+    os.utime(prices_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    assert get_price(prices_path, "VEUR").value == Decimal("4.00")
+
+
+def test_skip_malformed_line(tmp_path):
+    """
+    A malformed price line is skipped and the price before it is returned.
+    """
+    prices_path = tmp_path / "prices.txt"
+    prices_path.write_text(
+        PRICES + "P 2024-01-04 ABC 9.50 EUR\nP 2024-01-05 ABC 1O.5 EUR\n",
+        encoding="utf-8",
+    )
+
+    record = get_price(prices_path, "ABC")
+    assert record.value == Decimal("9.50")
+    assert record.symbol == "ABC"
+    assert get_price(prices_path, "ABC", date(2024, 1, 3)) is None
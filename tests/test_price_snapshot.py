@@ -0,0 +1,76 @@
+"""
+Test the binary snapshot of the price file.
+"""
+
+from decimal import Decimal
+
+from alens.pricedl import price_flat_file
+from alens.pricedl.price_flat_file import PriceFlatFile
+from alens.pricedl.price_snapshot import SnapshotPriceFile, get_snapshot_path
+
+PRICES = (
+    "P 2024-01-01 VEUR 1.00 EUR\n"
+    "P 2024-01-02 12:00:00 VEUR 2.00 EUR\n"
+    "P 2024-01-02 GBP 1.10 USD\n"
+)
+
+
+def _forbid_parsing(monkeypatch):
+    def fail(line):
+        raise AssertionError(f"Parsed: {line}")
+
+    monkeypatch.setattr(price_flat_file, "_parse_line", fail)
+
+
+def test_unchanged_file_is_not_parsed(tmp_path, monkeypatch):
+    """
+    The second load restores the records from the snapshot.
+    """
+    prices_path = tmp_path / "prices.txt"
+    prices_path.write_text(PRICES, encoding="utf-8")
+
+    first = SnapshotPriceFile.load(prices_path)
+    assert get_snapshot_path(prices_path).exists()
+
+    _forbid_parsing(monkeypatch)
+    second = SnapshotPriceFile.load(prices_path)
+
+    assert [str(r) for r in second.history] == [str(r) for r in first.history]
+    assert second.prices["GBP"].currency == "USD"
+
+
+def test_appended_tail_is_parsed(tmp_path, capsys):
+    """
+    Only the appended lines are parsed, with their line numbers in warnings.
+    """
+    prices_path = tmp_path / "prices.txt"
+    prices_path.write_text(PRICES, encoding="utf-8")
+    SnapshotPriceFile.load(prices_path)
+
+    with open(prices_path, "a", encoding="utf-8") as f:
+        f.write("P 2024-01-03 VEUR 3.00 EUR\nbroken\n")
+
+    prices = SnapshotPriceFile.load(prices_path)
+
+    assert prices.prices["VEUR"].value == Decimal("3.00")
+    assert len(prices.history) == 4
+    assert "malformed line 5" in capsys.readouterr().out
+
+
+def test_rewritten_file_is_reloaded(tmp_path, monkeypatch):
+    """
+    A changed file, even of the same size, invalidates the snapshot.
+    Saving refreshes the snapshot.
+    """
+    prices_path = tmp_path / "prices.txt"
+    prices_path.write_text(PRICES, encoding="utf-8")
+    SnapshotPriceFile.load(prices_path)
+
+    prices_path.write_text(PRICES.replace("1.10", "9.90"), encoding="utf-8")
+    prices = SnapshotPriceFile.load(prices_path)
+    assert prices.prices["GBP"].value == Decimal("9.90")
+
+    prices.add(PriceFlatFile.load(prices_path).history)
+    prices.save()
+    _forbid_parsing(monkeypatch)
+    assert SnapshotPriceFile.load(prices_path).prices["GBP"].value == Decimal("9.90")
@@ -0,0 +1,43 @@
+'''
+Tests for the Quote facade and the downloader registry.
+'''
+from alens.pricedl.config import PriceDbConfig
+from alens.pricedl.quote import DownloaderRegistry, Quote
+
+
+def _config(data: dict) -> PriceDbConfig:
+    cfg = PriceDbConfig()
+    cfg.config_data = data
+    return cfg
+
+
+def test_registry_reuses_downloaders():
+    '''
+    The same downloader, with the same session, is used for all the symbols
+    of an updater.
+    '''
+    config = _config({"updaters": {"yahoo_finance": {"pool_maxsize": 3}}})
+
+    with DownloaderRegistry(config) as registry:
+        first = Quote(registry=registry)
+        first.set_source("yahoo_finance")
+        second = Quote(registry=registry)
+        second.set_source("yahoo_finance")
+
+        downloader = first.get_downloader()
+        assert second.get_downloader() is downloader
+
+        adapter = downloader.session.get_adapter("https://query1.finance.yahoo.com")
+        assert adapter._pool_maxsize == 3
+
+
+def test_unknown_downloader():
+    '''
+    Unknown updaters are rejected.
+    '''
+    registry = DownloaderRegistry(_config({}))
+    try:
+        registry.get("unknown")
+        assert False, "expected an error"
+    except ValueError:
+        pass
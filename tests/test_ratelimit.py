@@ -0,0 +1,60 @@
+'''
+Tests for the rate limiter.
+'''
+from alens.pricedl.ratelimit import RateLimiter, parse_retry_after
+
+
+class FakeClock:
+    '''
+    Clock that advances only when sleeping.
+    '''
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_rate():
+    '''
+    After the burst, the requests are spaced by the rate.
+    '''
+    clock = FakeClock()
+    limiter = RateLimiter(rate=2, burst=2, clock=clock, sleep=clock.sleep)
+
+    for _ in range(6):
+        limiter.acquire()
+
+    # 2 immediately, then 4 more at 2 per second.
+    assert clock.now == 2.0
+
+
+def test_backoff_and_recovery():
+    '''
+    Throttling halves the rate and honors Retry-After. The rate then recovers.
+    '''
+    clock = FakeClock()
+    limiter = RateLimiter(rate=4, burst=1, clock=clock, sleep=clock.sleep)
+
+    limiter.on_throttled(retry_after=10)
+    assert limiter.rate == 2
+
+    limiter.acquire()
+    assert clock.now >= 10
+
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.rate == 4
+
+
+def test_parse_retry_after():
+    '''
+    Retry-After is either seconds or an HTTP date.
+    '''
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
@@ -0,0 +1,95 @@
+'''
+Tests for the retries and the circuit breaker.
+'''
+import pytest
+
+from alens.pricedl.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    call_with_retries,
+)
+
+
+class Flaky:
+    '''
+    Fails the given number of times, then succeeds.
+    '''
+    def __init__(self, failures, error=ConnectionError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error("failed")
+        return "ok"
+
+
+def test_retries_transient_errors():
+    '''
+    Transient errors are retried.
+    '''
+    call = Flaky(2)
+    result = call_with_retries(call, RetryPolicy(3, base_delay=0), CircuitBreaker("test"))
+
+    assert result == "ok"
+    assert call.calls == 3
+
+
+def test_no_retry_on_other_errors():
+    '''
+    Errors that would repeat are not retried.
+    '''
+    call = Flaky(1, ValueError)
+    with pytest.raises(ValueError):
+        call_with_retries(call, RetryPolicy(3, base_delay=0), CircuitBreaker("test"))
+
+    assert call.calls == 1
+
+
+def test_circuit_opens():
+    '''
+    After consecutive failures, the calls fail fast until the reset timeout.
+    '''
+    now = [0.0]
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60,
+                             clock=lambda: now[0])
+    policy = RetryPolicy(1)
+    call = Flaky(100)
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            call_with_retries(call, policy, breaker)
+
+    with pytest.raises(CircuitOpenError):
+        call_with_retries(call, policy, breaker)
+    assert call.calls == 2
+
+    # After the timeout, a successful trial closes the circuit.
+    now[0] = 61
+    call.failures = 0
+    assert call_with_retries(call, policy, breaker) == "ok"
+    assert not breaker.is_open
+
+
+def test_half_open_trial_retries():
+    '''
+    A transient error in the half-open trial is retried, and the trial closes
+    the circuit when it succeeds.
+    '''
+    now = [0.0]
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60,
+                             clock=lambda: now[0])
+    call = Flaky(1)
+
+    with pytest.raises(ConnectionError):
+        call_with_retries(call, RetryPolicy(1), breaker)
+    assert breaker.is_open
+
+    now[0] = 61
+    call.calls = 0
+    assert call_with_retries(call, RetryPolicy(3, base_delay=0), breaker) == "ok"
+    assert call.calls == 2
+    assert not breaker.is_open
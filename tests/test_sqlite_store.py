@@ -0,0 +1,63 @@
+"""
+Test the SQLite price store.
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+from alens.pricedl.price_flat_file import PriceFlatFile, PriceRecord
+from alens.pricedl.sqlite_store import SqlitePriceStore
+
+
+def _record(day: int, symbol: str, value: str) -> PriceRecord:
+    return PriceRecord(datetime(2024, 1, day), symbol, Decimal(value), "EUR")
+
+
+def test_upsert_and_query(tmp_path):
+    """
+    Prices are upserted by symbol and date/time, and queried at a point in time.
+    """
+    with SqlitePriceStore(tmp_path / "prices.db") as store:
+        store.add([_record(1, "VEUR", "1.00"), _record(3, "VEUR", "3.00")])
+        store.append([_record(3, "VEUR", "3.50"), _record(2, "GBP", "1.10")])
+
+        assert len(store) == 3
+        assert store.prices["VEUR"].value == Decimal("3.50")
+        assert set(store.prices) == {"VEUR", "GBP"}
+        assert store.as_of("VEUR", datetime(2024, 1, 2)).value == Decimal("1.00")
+        assert store.as_of("VEUR", datetime(2023, 12, 31)) is None
+        assert "AUD" not in store.prices
+        assert [d.day for d in store.dates("VEUR")] == [1, 3]
+
+    # Committed, with WAL.
+    with SqlitePriceStore(tmp_path / "prices.db") as store:
+        assert len(store) == 3
+        mode = store._connection.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+
+
+def test_import_and_export(tmp_path):
+    """
+    The price file can be imported, and the prices exported back in Ledger format.
+    """
+    source = tmp_path / "prices.txt"
+    source.write_text(
+        "P 2024-01-02 VEUR 2.00 EUR\nP 2024-01-01 12:00:00 GBP 1.10 EUR\n",
+        encoding="utf-8",
+    )
+
+    with SqlitePriceStore(tmp_path / "prices.db") as store:
+        assert store.import_file(source) == 2
+        store.append([_record(3, "VEUR", "3.00")])
+
+        target = tmp_path / "exported.txt"
+        assert store.export(target) == 3
+
+    assert target.read_text(encoding="utf-8") == (
+        "P 2024-01-01 12:00:00 GBP 1.10 EUR\n"
+        "P 2024-01-02 VEUR 2.00 EUR\n"
+        "P 2024-01-03 VEUR 3.00 EUR\n"
+    )
+    assert PriceFlatFile.load(target).as_of("VEUR", date(2024, 1, 2)).value == Decimal(
+        "2.00"
+    )
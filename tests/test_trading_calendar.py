@@ -0,0 +1,98 @@
+'''
+Tests for the trading calendars.
+'''
+from datetime import date, datetime
+
+from alens.pricedl.trading_calendar import (
+    easter_sunday,
+    get_market,
+    has_session_since,
+    is_price_current,
+    is_session,
+    last_session,
+    session_gaps,
+)
+
+
+def test_easter():
+    '''
+    Easter dates
+    '''
+    assert easter_sunday(2024) == date(2024, 3, 31)
+    assert easter_sunday(2025) == date(2025, 4, 20)
+
+
+def test_holidays():
+    '''
+    Regular holidays and weekends
+    '''
+    # Thanksgiving
+    assert not is_session("NYSE", date(2024, 11, 28))
+    # Good Friday
+    assert not is_session("XETRA", date(2024, 3, 29))
+    # Boxing Day substitute
+    assert not is_session("LSE", date(2022, 12, 27))
+    # Anzac Day on a weekday
+    assert not is_session("ASX", date(2024, 4, 25))
+    assert is_session("ASX", date(2024, 4, 26))
+    assert not is_session("EURONEXT", date(2024, 6, 1))
+    # New Year
+    assert not is_session("NYSE", date(2024, 1, 1))
+    assert is_session("NYSE", date(2024, 1, 2))
+
+
+def test_last_session():
+    '''
+    The last session looks back over weekends, holidays and the year boundary.
+    '''
+    assert last_session("NYSE", date(2024, 1, 1)) == date(2023, 12, 29)
+    assert last_session("XETRA", date(2024, 12, 29)) == date(2024, 12, 27)
+
+
+def test_has_session_since():
+    '''
+    A price from Friday is current over the weekend.
+    '''
+    assert not has_session_since("XETRA", date(2024, 6, 7), date(2024, 6, 9))
+    assert has_session_since("XETRA", date(2024, 6, 7), date(2024, 6, 10))
+    assert get_market("VANGUARD") == "ASX"
+    assert get_market("CURRENCY") is None
+
+
+def test_session_gaps():
+    '''
+    The missing sessions are coalesced into ranges across the closed days.
+    '''
+    # Friday 2024-03-22 and Tuesday 2024-04-02 are stored. Good Friday and
+    # Easter Monday are closed on Xetra.
+    days = [date(2024, 3, 22), date(2024, 3, 26), date(2024, 4, 3)]
+
+    gaps = session_gaps("XETRA", days, date(2024, 3, 22), date(2024, 4, 5))
+
+    assert gaps == [
+        (date(2024, 3, 25), date(2024, 3, 25)),
+        (date(2024, 3, 27), date(2024, 4, 2)),
+        (date(2024, 4, 4), date(2024, 4, 5)),
+    ]
+
+
+def test_intraday_price_is_not_current():
+    '''
+    A price stored during today's session is downloaded again, also after the
+    close. The closing price is current until the next session.
+    '''
+    # Wednesday 2024-06-05 on the ASX.
+    intraday = datetime(2024, 6, 5, 12, 30)
+    closing = datetime(2024, 6, 5, 16, 10)
+
+    assert not is_price_current("ASX", intraday, datetime(2024, 6, 5, 13, 0))
+    assert not is_price_current("ASX", intraday, datetime(2024, 6, 5, 18, 0))
+    assert not is_price_current("ASX", intraday, datetime(2024, 6, 8, 10, 0))
+    assert not is_price_current("ASX", closing, datetime(2024, 6, 5, 15, 0))
+    assert is_price_current("ASX", closing, datetime(2024, 6, 5, 18, 0))
+    # Friday's close is current over the weekend, not on Monday.
+    friday = datetime(2024, 6, 7, 16, 5)
+    assert is_price_current("ASX", friday, datetime(2024, 6, 9, 12, 0))
+    assert not is_price_current("ASX", friday, datetime(2024, 6, 11, 9, 0))
+    # A date without a time is the closing price.
+    assert is_price_current("ASX", datetime(2024, 6, 7), datetime(2024, 6, 8, 9, 0))
@@ -2,6 +2,10 @@
 Test Yahoo Finance API
 '''
 
+from datetime import date
+
+import requests
+
 from alens.pricedl.model import SecuritySymbol
 from alens.pricedl.quotes.yahoo_finance_downloader import YahooFinanceDownloader
 
@@ -20,3 +24,158 @@ def test_dl():
     assert actual.symbol.mnemonic == "VHY"
     assert actual.symbol.namespace == "ASX"
     assert actual.date is not None
+
+
+def test_parse_quote_response():
+    '''
+    Parse the multi-symbol quote response.
+    '''
+    dl = YahooFinanceDownloader()
+    body = {
+        "quoteResponse": {
+            "result": [
+                {
+                    "symbol": "VHY.AX",
+                    "currency": "AUD",
+                    "regularMarketPrice": 70.1,
+                    "regularMarketTime": 1700000000,
+                    "gmtOffSetMilliseconds": 39600000,
+                },
+                # Delisted, no price.
+                {"symbol": "A2B.AX"},
+            ],
+            "error": None,
+        }
+    }
+
+    actual = dl.get_prices_from_quote_json(body)
+
+    assert list(actual) == ["VHY.AX"]
+    assert str(actual["VHY.AX"].value) == "70.1"
+    assert actual["VHY.AX"].currency == "AUD"
+    assert actual["VHY.AX"].date.isoformat() == "2023-11-15"
+    assert dl.get_yahoo_symbol(SecuritySymbol("ASX", "VHY")) == "VHY.AX"
+    assert dl.get_yahoo_symbol(SecuritySymbol("NYSE", "OPI")) == "OPI"
+
+
+def test_parse_history_response():
+    '''
+    Parse the daily closes from the chart response, skipping the empty days.
+    '''
+    dl = YahooFinanceDownloader()
+    body = {
+        "chart": {
+            "result": [
+                {
+                    "meta": {"currency": "AUD", "gmtoffset": 36000, "priceHint": 2},
+                    "timestamp": [1704236400, 1704322800, 1704409200],
+                    "indicators": {"quote": [{"close": [70.1200001, None, 70.5]}]},
+                }
+            ],
+            "error": None,
+        }
+    }
+
+    actual = dl.get_history_from_json(body)
+
+    assert [p.date.isoformat() for p in actual] == ["2024-01-03", "2024-01-05"]
+    assert [str(p.value) for p in actual] == ["70.12", "70.5"]
+    assert all(p.currency == "AUD" and p.time is None for p in actual)
+
+
+class FakeResponse:
+    '''
+    A response with the status and JSON body.
+    '''
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self._body = body
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        raise requests.HTTPError(f"{self.status_code}", response=self)
+
+
+class FakeSession:
+    '''
+    Refuses the quote endpoint, as Yahoo does without the crumb, and answers
+    the chart endpoint.
+    '''
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        if "/v7/finance/quote" in url:
+            return FakeResponse(401)
+        if url.endswith("A2B.AX"):
+            return FakeResponse(404)
+        meta = {"regularMarketPrice": 70.1, "currency": "AUD",
+                "regularMarketTime": 1700000000, "gmtoffset": 39600}
+        return FakeResponse(200, {"chart": {"result": [{"meta": meta}], "error": None}})
+
+
+def test_quote_refused_falls_back_to_chart():
+    '''
+    When the quote endpoint refuses the request, the prices come from the
+    chart endpoint, one symbol at a time, for the rest of the run.
+    '''
+    dl = YahooFinanceDownloader(batch_size=2)
+    dl.session = FakeSession()
+    symbols = [SecuritySymbol("ASX", s) for s in ("VHY", "A2B", "VAS")]
+
+    actual = dl.download_many(symbols, "AUD")
+
+    assert [p.symbol.mnemonic for p in actual] == ["VHY", "VAS"]
+    assert str(actual[0].value) == "70.1"
+    # The quote endpoint is tried only once.
+    assert sum("/v7/" in url for url in dl.session.urls) == 1
+
+
+class HistorySession:
+    '''
+    Serves the ASX bars of 2024-01-02 and 2024-01-03, and records the request.
+    '''
+    def get(self, url, params=None, **kwargs):
+        self.params = params
+        meta = {"currency": "AUD", "gmtoffset": 36000, "priceHint": 2}
+        body = {"chart": {"result": [{
+            "meta": meta,
+            # 2024-01-02 and 2024-01-03, 09:00 at UTC+10 = 23:00 UTC the day before.
+            "timestamp": [1704150000, 1704236400],
+            "indicators": {"quote": [{"close": [70.0, 70.5]}]},
+        }], "error": None}}
+        return FakeResponse(200, body)
+
+
+def test_history_range_east_of_utc():
+    '''
+    The ASX bar of the first day is stamped on the previous UTC day, and is
+    still included. The extra day requested is left out.
+    '''
+    dl = YahooFinanceDownloader()
+    dl.session = HistorySession()
+    day = date(2024, 1, 3)
+
+    actual = dl.download_history(SecuritySymbol("ASX", "VHY"), "AUD", day, day)
+
+    assert [p.date for p in actual] == [day]
+    assert dl.session.params["period1"] < 1704236400
+
+
+def test_history_from_epoch():
+    '''
+    The full history starts at the epoch, not the day before.
+    '''
+    dl = YahooFinanceDownloader()
+    dl.session = HistorySession()
+
+    actual = dl.download_history(
+        SecuritySymbol("ASX", "VHY"), "AUD", date(1970, 1, 1), date(2024, 1, 3)
+    )
+
+    assert dl.session.params["period1"] == 0
+    assert len(actual) == 2